@@ -0,0 +1,161 @@
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import select
+
+from models import db, all_ratings
+import shards
+
+# Columnar rating analytics
+#
+# Aggregate questions are answered from an in-process snapshot of
+# ratings JOIN screening_rooms held as NumPy arrays, so histograms and
+# percentiles never touch the OLTP tables once the snapshot is built.
+# NumPy is imported on first use to keep it off the worker boot path.
+
+RATING_MIN = 1
+RATING_MAX = 5
+RATING_BINS = RATING_MAX - RATING_MIN + 1
+PERCENTILES = (25, 50, 75, 90)
+GROUP_BY_CHOICES = ("movie", "club", "month")
+MISSING_ID = -1
+
+
+class RatingsSnapshot:
+    def __init__(self, movie_id, club_id, author_id, rating, timestamp):
+        self.movie_id = movie_id
+        self.club_id = club_id
+        self.author_id = author_id
+        self.rating = rating
+        self.timestamp = timestamp
+        self.built_at = time.monotonic()
+        self.generated_at = datetime.utcnow()
+
+    def __len__(self):
+        return len(self.rating)
+
+    @classmethod
+    def load(cls):
+        import numpy as np
+
+        ratings = all_ratings()
+        stmt = select(
+            ratings.c.screening_room_id,
+            ratings.c.author_id,
+            ratings.c.rating,
+            ratings.c.timestamp,
+        ).where(ratings.c.rating.between(RATING_MIN, RATING_MAX))
+        # Ratings are read from every shard and matched to rooms here
+        rooms = shards.rooms()
+        rows = []
+        for part in shards.scatter(lambda: db.session.execute(stmt).all()):
+            for room_id, author_id, rating, timestamp in part:
+                if room_id in rooms:
+                    club_id, movie_id = rooms[room_id]
+                    rows.append((movie_id, club_id, author_id, rating, timestamp))
+        movie_ids, club_ids, author_ids, ratings, timestamps = (
+            zip(*rows) if rows else ((), (), (), (), ())
+        )
+
+        def id_column(values):
+            return np.fromiter(
+                (MISSING_ID if v is None else v for v in values),
+                dtype=np.int64,
+                count=len(values),
+            )
+
+        return cls(
+            movie_id=id_column(movie_ids),
+            club_id=id_column(club_ids),
+            author_id=id_column(author_ids),
+            rating=np.fromiter(ratings, dtype=np.int8, count=len(ratings)),
+            timestamp=np.array(timestamps, dtype="datetime64[s]"),
+        )
+
+    def is_stale(self, ttl):
+        return time.monotonic() - self.built_at > ttl
+
+    def group_keys(self, group_by):
+        if group_by == "movie":
+            return self.movie_id
+        if group_by == "club":
+            return self.club_id
+        if group_by == "month":
+            return self.timestamp.astype("datetime64[M]")
+        raise ValueError(f"Unknown group_by '{group_by}'")
+
+    def summarize(self, group_by):
+        import numpy as np
+
+        keys, inverse = np.unique(self.group_keys(group_by), return_inverse=True)
+        n_groups = len(keys)
+
+        counts = np.bincount(inverse, minlength=n_groups)
+        sums = np.bincount(inverse, weights=self.rating, minlength=n_groups)
+        histogram = np.bincount(
+            inverse * RATING_BINS + (self.rating - RATING_MIN),
+            minlength=n_groups * RATING_BINS,
+        ).reshape(n_groups, RATING_BINS)
+
+        # Ratings are discrete, so nearest-rank percentiles fall straight
+        # out of the cumulative histogram for every group at once.
+        cumulative = np.cumsum(histogram, axis=1)
+        percentiles = {}
+        for p in PERCENTILES:
+            rank = np.maximum(np.ceil(counts * p / 100.0), 1)
+            percentiles[p] = (cumulative < rank[:, None]).sum(axis=1) + RATING_MIN
+
+        groups = []
+        for i, key in enumerate(keys):
+            groups.append(
+                {
+                    "key": _key_to_json(key, group_by),
+                    "count": int(counts[i]),
+                    "average": round(float(sums[i] / counts[i]), 2),
+                    "histogram": {
+                        str(value): int(histogram[i, value - RATING_MIN])
+                        for value in range(RATING_MIN, RATING_MAX + 1)
+                    },
+                    "percentiles": {
+                        f"p{p}": int(values[i]) for p, values in percentiles.items()
+                    },
+                }
+            )
+        return groups
+
+
+def _key_to_json(key, group_by):
+    if group_by == "month":
+        import numpy as np
+
+        return None if np.isnat(key) else str(key)
+    key = int(key)
+    return None if key == MISSING_ID else key
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_snapshot():
+    global _snapshot
+    ttl = current_app.config.get("ANALYTICS_SNAPSHOT_TTL", 300)
+    snapshot = _snapshot
+    if snapshot is not None and not snapshot.is_stale(ttl):
+        return snapshot
+    with _snapshot_lock:
+        if _snapshot is None or _snapshot.is_stale(ttl):
+            _snapshot = RatingsSnapshot.load()
+        return _snapshot
+
+
+def rating_distribution(group_by):
+    snapshot = get_snapshot()
+    return {
+        "group_by": group_by,
+        "generated_at": snapshot.generated_at.isoformat(),
+        "total": len(snapshot),
+        "groups": snapshot.summarize(group_by),
+    }
@@ -1,13 +1,40 @@
 # #!/usr/bin/env python3
 
-from flask import request, session, make_response, jsonify, render_template
-from flask_restful import Resource, reqparse
+from flask import (
+    Blueprint,
+    request,
+    session,
+    make_response,
+    jsonify,
+    render_template,
+    Response,
+    stream_with_context,
+)
+from flask_restful import Api, Resource
 from functools import wraps
-from marshmallow import Schema, fields, validate, ValidationError
-from sqlalchemy import or_, and_, not_
+from datetime import datetime
+from marshmallow import Schema, fields, validate
+from sqlalchemy import or_, and_, not_, select, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
 
 # Local imports
-from models import db, Movie, Genre, Role, User, Club, ScreeningRoom, Post, Rating
+from models import (
+    db,
+    Movie,
+    Genre,
+    Role,
+    User,
+    Club,
+    ScreeningRoom,
+    Post,
+    Rating,
+    Change,
+    Job,
+    ArchivedPost,
+    ArchivedRating,
+    RequestProfile,
+)
 from schemas import (
     MovieSchema,
     UserSchema,
@@ -21,8 +48,32 @@ from schemas import (
     ScreeningRoomPostSchema,
     RatingPostSchema,
     PostPostSchema,
+    get_dumper,
 )
-from config import app, api
+from config import create_app
+from analytics import GROUP_BY_CHOICES, rating_distribution
+from export import EXPORTS, EXPORT_FORMATS, generate_export
+import search
+import conditional
+import cache
+from recommendations import recommend
+import discovery
+import readmodels
+import trending
+import jobs
+import deletes
+import archive
+import shards
+import profiler
+import timing
+import creates
+import listing
+from throttle import throttled, client_ip, json_field, failed, get_limiter
+
+# Routes are recorded here and bound to an app by config.create_app()
+site = Blueprint("site", __name__)
+api = Api()
+api.representation("application/json")(timing.output_json)
 
 
 # Control access via user roles
@@ -57,10 +108,30 @@ def mod_required(f):
 
 
 def user_has_role(user_id, role_name):
-    user = User.query.filter_by(id=user_id).first()
-    if user and user.role and user.role.name == role_name:
-        return True
-    return False
+    with timing.phase("auth"):
+        user = User.query.filter_by(id=user_id).first()
+        if user and user.role and user.role.name == role_name:
+            return True
+        return False
+
+
+@site.before_app_request
+def start_profile():
+    if profiler.wanted(
+        lambda: bool(session.get("user_id"))
+        and user_has_role(session["user_id"], "admin")
+    ):
+        profiler.start()
+
+
+@site.after_app_request
+def stop_profile(response):
+    return profiler.stop(response)
+
+
+@site.teardown_app_request
+def discard_profile(exc):
+    profiler.discard()
 
 
 # @app.before_request
@@ -92,14 +163,18 @@ class AssignRoleResource(Resource):
             return {"message": "User or Role not found"}, 404
 
         user.role = role
+        Change.record("user", user.id, "update")
         db.session.commit()
 
         return {"message": f"Role {role.name} assigned to user {user.username}"}, 200
 
 
 class SignupResource(Resource):
+    @throttled(("signup_ip", client_ip))
     def post(self):
         request_json = request.get_json()
+        if not isinstance(request_json, dict):
+            return {"msg": "Request body must be a JSON object"}, 400
 
         username = request_json.get("username")
         email = request_json.get("email")
@@ -117,6 +192,8 @@ class SignupResource(Resource):
 
         # Add the new user to the database
         db.session.add(new_user)
+        db.session.flush()
+        Change.record("user", new_user.id, "create")
         db.session.commit()
         session["user_id"] = new_user.id
         # Optionally, you can generate an access token and return it upon signup
@@ -126,8 +203,15 @@ class SignupResource(Resource):
 
 
 class LoginResource(Resource):
+    @throttled(
+        ("login_ip", client_ip),
+        # Only failed logins count against an account
+        ("login_username", json_field("username"), failed),
+    )
     def post(self):
         request_json = request.get_json()
+        if not isinstance(request_json, dict):
+            return {"msg": "Request body must be a JSON object"}, 400
 
         username = request_json.get("username")
         password = request_json.get("password")
@@ -138,8 +222,7 @@ class LoginResource(Resource):
 
         # access_token = create_access_token(identity=user.id)
         # session["user_id"] = user.id
-        user_schema = UserSchema()
-        serialized_user = user_schema.dump(user)
+        serialized_user = get_dumper(UserSchema)(user)
 
         user_id = user.id
 
@@ -152,8 +235,7 @@ class CheckSession(Resource):
     def get(self):
         user = User.query.filter(User.id == session.get("user_id")).first()
         if user:
-            user_schema = UserSchema()
-            serialized_user = user_schema.dump(user)
+            serialized_user = get_dumper(UserSchema)(user)
             return serialized_user
         else:
             return {"message": "401: Not Authorized"}, 401
@@ -172,6 +254,24 @@ api.add_resource(CheckSession, "/check_session")
 api.add_resource(Logout, "/logout")
 
 
+class ThrottleStats(Resource):
+    @admin_required
+    def get(self):
+        return make_response(jsonify(get_limiter().stats()), 200)
+
+
+api.add_resource(ThrottleStats, "/throttle/stats")
+
+
+class CacheStats(Resource):
+    @admin_required
+    def get(self):
+        return make_response(jsonify(cache.get_cache().stats()), 200)
+
+
+api.add_resource(CacheStats, "/cache/stats")
+
+
 class ChangeEmail(Resource):
     def post(self):
         user_id = session.get("user_id")
@@ -186,6 +286,7 @@ class ChangeEmail(Resource):
             return {"msg": "User not found"}, 404
 
         user.email = new_email
+        Change.record("user", user.id, "update")
         db.session.commit()
 
         return {"msg": "Email changed successfully"}, 200
@@ -220,16 +321,62 @@ api.add_resource(ChangeEmail, "/update-email")
 # API Routes
 
 
-@app.route("/")
+@site.route("/")
 def index():
     return render_template("index.html")
 
 
-@app.errorhandler(404)
+@site.app_errorhandler(404)
 def not_found(e):
     return render_template("index.html")
 
 
+def detail_document(kind, model, schema_cls, id):
+    """Serialized detail body and validators, served from the detail cache."""
+
+    def load():
+        obj = db.session.get(model, id)
+        if obj is None:
+            return None
+        return {
+            "body": jsonify(get_dumper(schema_cls)(obj)).get_data(as_text=True),
+            "headers": conditional.validators(obj),
+        }
+
+    return cache.cached(kind, id, load)
+
+
+def post_page_args():
+    parser = timing.RequestParser()
+    parser.add_argument(
+        "cursor", type=str, help="Cursor from a previous page", location="args"
+    )
+    parser.add_argument(
+        "limit", type=int, help="Maximum number of posts", location="args"
+    )
+    return parser.parse_args()
+
+
+def list_view_args():
+    parser = timing.RequestParser()
+    parser.add_argument(
+        "view",
+        type=str,
+        default="full",
+        choices=listing.VIEWS,
+        help="List as one of: full, summary (streamed flat rows)",
+        location="args",
+    )
+    return parser.parse_args()
+
+
+def deleted_response(name, job):
+    """200 when the delete finished inline, 202 while a purge job runs."""
+    if job is None:
+        return {"message": f"{name} deleted successfully"}, 200
+    return {"message": f"{name} scheduled for deletion", "job_id": job.id}, 202
+
+
 class Movies(Resource):
     # def get(self):
     #     movies = Movie.query.all()
@@ -237,7 +384,7 @@ class Movies(Resource):
     #     movies_data = movie_schema.dump(movies)
     #     return make_response(jsonify(movies_data), 200)
     def __init__(self):
-        self.reqparse = reqparse.RequestParser()
+        self.reqparse = timing.RequestParser()
         self.reqparse.add_argument(
             "q", type=str, help="Search term for movies", location="args"
         )
@@ -248,12 +395,11 @@ class Movies(Resource):
         search_term = args.get("q", None)
 
         if search_term:
-            movies = Movie.query.filter(Movie.title.ilike(f"%{search_term}%")).all()
+            movies = readmodels.movies(Movie.title.ilike(f"%{search_term}%"))
         else:
-            movies = Movie.query.all()
+            movies = readmodels.movies()
 
-        movie_schema = MovieSchema(many=True)
-        movies_data = movie_schema.dump(movies)
+        movies_data = get_dumper(MovieSchema, many=True)(movies)
         return make_response(jsonify(movies_data), 200)
 
     ### make admin only
@@ -263,6 +409,8 @@ class Movies(Resource):
         try:
             new_movie = movie_schema.load(data)
             db.session.add(new_movie)
+            db.session.flush()
+            Change.record("movie", new_movie.id, "create")
             db.session.commit()
             return movie_schema.dump(new_movie), 201
         except Exception as e:
@@ -283,15 +431,12 @@ class SimilarMoviesByGenre(Resource):
 
         # Get other movies with the same genre(s)
         filters = [Movie.genres.any(id=genre.id) for genre in movie_genres[:2]]
-        similar_movies = (
-            Movie.query.filter(and_(*filters), not_(Movie.id == movie_id))
-            .limit(6)
-            .all()
+        similar_movies = readmodels.movies(
+            and_(*filters), not_(Movie.id == movie_id), limit=6
         )
 
         # Serialize the data
-        movie_schema = MovieSchema(many=True)
-        similar_movies_data = movie_schema.dump(similar_movies)
+        similar_movies_data = get_dumper(MovieSchema, many=True)(similar_movies)
 
         return similar_movies_data, 200
 
@@ -310,10 +455,23 @@ api.add_resource(AvgRatingByMovieId, "/movies/<int:movie_id>/average-rating")
 
 class PostsByMovieId(Resource):
     def get(self, movie_id):
-        posts = Movie.get_posts_for_movie(movie_id)
-        post_schema = PostSchema(many=True)
-        posts_data = post_schema.dump(posts)
-        return {"movie_id": movie_id, "posts": posts_data}
+        args = post_page_args()
+        rooms = db.session.scalars(
+            select(ScreeningRoom.id).where(ScreeningRoom.movie_id == movie_id)
+        ).all()
+        try:
+            posts, next_cursor = archive.page(
+                Post,
+                ArchivedPost,
+                lambda model: model.screening_room_id.in_(rooms),
+                cursor=args.get("cursor"),
+                limit=args.get("limit"),
+                on=shards.of_rooms(rooms),
+            )
+        except archive.CursorError as e:
+            return make_response({"error": str(e)}, 400)
+        posts_data = get_dumper(PostSchema, many=True)(posts)
+        return {"movie_id": movie_id, "posts": posts_data, "next_cursor": next_cursor}
 
 
 api.add_resource(PostsByMovieId, "/movies/<int:movie_id>/posts")
@@ -321,12 +479,10 @@ api.add_resource(PostsByMovieId, "/movies/<int:movie_id>/posts")
 
 class MoviesById(Resource):
     def get(self, id):
-        movie = Movie.query.filter_by(id=id).first()
-        if not movie:
+        entry = detail_document("movie", Movie, MovieSchema, id)
+        if entry is None:
             return make_response({"error": "Movie not found"}, 404)
-        movie_schema = MovieSchema()
-        movie_data = movie_schema.dump(movie)
-        return make_response(jsonify(movie_data), 200)
+        return conditional.cached_response(entry["body"], entry["headers"])
 
     ### make admin only
     def patch(self, id):
@@ -334,12 +490,25 @@ class MoviesById(Resource):
         movie = Movie.query.get(id)
         if not movie:
             return make_response({"error": "Movie not found"}, 404)
+        failed = conditional.precondition_failed(movie)
+        if failed:
+            return failed
         data = request.json
         movie_schema = MovieSchema()
         try:
             updated_movie = movie_schema.load(data, instance=movie, partial=True)
+            Change.record("movie", movie.id, "update")
+            conditional.touch_embedding(updated_movie)
+            cache.invalidate_related(updated_movie)
             db.session.commit()
-            return movie_schema.dump(updated_movie), 200
+            return (
+                movie_schema.dump(updated_movie),
+                200,
+                conditional.validators(updated_movie),
+            )
+        except StaleDataError:
+            db.session.rollback()
+            return conditional.stale_write()
         except Exception as e:
             db.session.rollback()
             return make_response({"error": e.__str__()}, 400)
@@ -350,25 +519,27 @@ class MoviesById(Resource):
         movie = Movie.query.get(id)
         if not movie:
             return make_response({"error": "Movie not found"}, 404)
-        db.session.delete(movie)
+        cache.invalidate_related(movie)
+        Change.record("movie", id, "delete")
+        job = deletes.remove("movie", id)
         db.session.commit()
-        return {"message": "Movie deleted successfully"}, 200
+        return deleted_response("Movie", job)
 
 
 class GenresById(Resource):
     def get(self, id):
-        genre = Genre.query.filter_by(id=id).first()
-        if genre is None:
+        entry = detail_document("genre", Genre, GenreSchema, id)
+        if entry is None:
             return make_response({"error": "Genre not found"}, 404)
-        genre_schema = GenreSchema()
-        genre_data = genre_schema.dump(genre)
-        return make_response(jsonify(genre_data), 200)
+        return conditional.cached_response(entry["body"], entry["headers"])
 
     def delete(self, id):
         genre = Genre.query.get(id)
         if not genre:
             return make_response({"error": "Genre not found"}, 404)
+        cache.invalidate_related(genre)
         db.session.delete(genre)
+        Change.record("genre", id, "delete")
         db.session.commit()
         return {"message": "Genre deleted successfully"}, 200
 
@@ -376,9 +547,10 @@ class GenresById(Resource):
 class Users(Resource):
     @admin_required
     def get(self):
+        if list_view_args()["view"] == "summary":
+            return listing.summary_response("users")
         users = User.query.all()
-        user_schema = UserSchema(many=True)
-        users_data = user_schema.dump(users)
+        users_data = get_dumper(UserSchema, many=True)(users)
         return make_response(jsonify(users_data), 200)
 
     # signup is what posts new users -- don't need below
@@ -398,24 +570,41 @@ class Users(Resource):
 class UsersById(Resource):
     @admin_required
     def get(self, id):
+        cached = conditional.not_modified(User, id)
+        if cached:
+            return cached
         user = User.query.filter_by(id=id).first()
         if user is None:
             return make_response({"error": "User not found"}, 404)
-        user_schema = UserSchema(exclude=("clubs.screening_rooms", "clubs.members"))
-        user_data = user_schema.dump(user)
-        return make_response(jsonify(user_data), 200)
+        user_data = get_dumper(
+            UserSchema, exclude=("clubs.screening_rooms", "clubs.members")
+        )(user)
+        return make_response(jsonify(user_data), 200, conditional.validators(user))
 
     def patch(self, id):
         # need to be changed for roles?
         user = User.query.get(id)
         if not user:
             return make_response({"error": "User not found"}, 404)
+        failed = conditional.precondition_failed(user)
+        if failed:
+            return failed
         data = request.json
         user_schema = UserSchema()
         try:
             updated_user = user_schema.load(data, instance=user, partial=True)
+            Change.record("user", user.id, "update")
+            conditional.touch_embedding(updated_user)
+            cache.invalidate_related(updated_user)
             db.session.commit()
-            return user_schema.dump(updated_user), 200
+            return (
+                user_schema.dump(updated_user),
+                200,
+                conditional.validators(updated_user),
+            )
+        except StaleDataError:
+            db.session.rollback()
+            return conditional.stale_write()
         except Exception as e:
             db.session.rollback()
             return make_response({"error": e.__str__()}, 400)
@@ -447,9 +636,11 @@ class UsersById(Resource):
         user = User.query.get(id)
         if not user:
             return make_response({"error": "User not found"}, 404)
-        db.session.delete(user)
+        cache.invalidate_related(user)
+        Change.record("user", id, "delete")
+        job = deletes.remove("user", id)
         db.session.commit()
-        return {"message": "User deleted successfully"}, 200
+        return deleted_response("User", job)
 
 
 class Roles(Resource):
@@ -457,8 +648,7 @@ class Roles(Resource):
     @admin_required
     def get(self):
         roles = Role.query.all()
-        role_schema = RoleSchema(many=True)
-        roles_data = role_schema.dump(roles)
+        roles_data = get_dumper(RoleSchema, many=True)(roles)
         return make_response(jsonify(roles_data), 200)
 
     # def post(self):
@@ -476,27 +666,33 @@ class Roles(Resource):
 
 class Clubs(Resource):
     def get(self):
+        if list_view_args()["view"] == "summary":
+            # Directory listing straight from the counter columns
+            return listing.summary_response("clubs")
+
         clubs = Club.query.all()
-        club_schema = ClubSchema(many=True)
-        clubs_data = club_schema.dump(clubs)
+        clubs_data = get_dumper(ClubSchema, many=True)(clubs)
         return make_response(jsonify(clubs_data), 200)
 
     ### user who posts new club needs to be set as owner
     def post(self):
-        data = request.json
-        # Validate incoming data
         try:
-            validated_data = ClubPostSchema().load(data)
-        except ValidationError as e:
-            return make_response({"error": e.messages}, 400)
+            values = creates.load(ClubPostSchema, request.json)
+        except creates.CreateError as e:
+            return make_response({"error": e.message}, e.status)
 
-        # Process the validated data
-        club_schema = ClubSchema()
         try:
-            new_club = club_schema.load(validated_data)
+            new_club = Club(**values)
             db.session.add(new_club)
+            db.session.flush()
+            shards.place(new_club.id)
+            Change.record("club", new_club.id, "create")
             db.session.commit()
-            return club_schema.dump(new_club), 201
+            return get_dumper(ClubSchema)(new_club), 201
+        except IntegrityError as e:
+            db.session.rollback()
+            message, status = creates.integrity_error(e)
+            return make_response({"error": message}, status)
         except Exception as e:
             db.session.rollback()
             return make_response({"error": str(e)}, 400)
@@ -520,7 +716,18 @@ class AddUserToClub(Resource):
         if not club or not user:
             return {"error": "Club or User not found"}, 404
 
+        if user in club.members:
+            return {
+                "error": f"User {user_id} is already a member of club {club_id}"
+            }, 400
+
         club.members.append(user)
+        Change.record("membership", club.id, "create", ref_id=user.id)
+        Club.touch(club.id)
+        Club.adjust_counts(club.id, members=1)
+        discovery.add_member(club.id, user.id)
+        User.touch(user.id)
+        cache.invalidate("club", club.id)
         db.session.commit()
 
         return {"message": f"User {user_id} added to club {club_id}"}, 200
@@ -542,6 +749,12 @@ class RemoveUserFromClub(Resource):
 
         if user in club.members:
             club.members.remove(user)
+            Change.record("membership", club.id, "delete", ref_id=user.id)
+            Club.touch(club.id)
+            Club.adjust_counts(club.id, members=-1)
+            discovery.remove_member(club.id, user.id)
+            User.touch(user.id)
+            cache.invalidate("club", club.id)
             db.session.commit()
             return {"message": f"User {user_id} removed from club {club_id}"}, 200
         else:
@@ -554,25 +767,35 @@ api.add_resource(RemoveUserFromClub, "/clubs/<int:club_id>/remove_user")
 
 class ClubsById(Resource):
     def get(self, id):
-        club = Club.query.filter_by(id=id).first()
-        if club is None:
+        entry = detail_document("club", Club, ClubSchema, id)
+        if entry is None:
             return make_response({"error": "Club not found"}, 404)
-        # return make_response(club.to_dict(), 200)
-        club_schema = ClubSchema()
-        club_data = club_schema.dump(club)
-        return make_response(jsonify(club_data), 200)
+        return conditional.cached_response(entry["body"], entry["headers"])
 
     ### make club owner only
     def patch(self, id):
         club = Club.query.get(id)
         if not club:
             return make_response({"error": "Club not found"}, 404)
+        failed = conditional.precondition_failed(club)
+        if failed:
+            return failed
         data = request.json
         club_schema = ClubSchema()
         try:
             updated_club = club_schema.load(data, instance=club, partial=True)
+            Change.record("club", club.id, "update")
+            conditional.touch_embedding(updated_club)
+            cache.invalidate_related(updated_club)
             db.session.commit()
-            return club_schema.dump(updated_club), 200
+            return (
+                club_schema.dump(updated_club),
+                200,
+                conditional.validators(updated_club),
+            )
+        except StaleDataError:
+            db.session.rollback()
+            return conditional.stale_write()
         except Exception as e:
             db.session.rollback()
             return make_response({"error": e.__str__()}, 400)
@@ -582,33 +805,46 @@ class ClubsById(Resource):
         club = Club.query.get(id)
         if not club:
             return make_response({"error": "Club not found"}, 404)
-        db.session.delete(club)
+        cache.invalidate_related(club)
+        # Out of suggestions straight away; the rows cascade at purge
+        discovery.remove_club(id)
+        Change.record("club", id, "delete")
+        job = deletes.remove("club", id)
         db.session.commit()
-        return {"message": "Club deleted successfully"}, 200
+        return deleted_response("Club", job)
 
 
 class ScreeningRooms(Resource):
     # @user_required
     def get(self):
+        if list_view_args()["view"] == "summary":
+            return listing.summary_response("rooms")
         rooms = ScreeningRoom.query.all()
-        room_schema = ScreeningRoomSchema(many=True)
-        rooms_data = room_schema.dump(rooms)
+        rooms_data = get_dumper(ScreeningRoomSchema, many=True)(rooms)
         return make_response(jsonify(rooms_data), 200)
 
     ### make club owner only
     def post(self):
-        data = request.json
         try:
-            validated_data = ScreeningRoomPostSchema().load(data)
-        except ValidationError as e:
-            return make_response({"error": e.messages}, 400)
+            values = creates.load(ScreeningRoomPostSchema, request.json)
+        except creates.CreateError as e:
+            return make_response({"error": e.message}, e.status)
 
-        screening_room_schema = ScreeningRoomSchema()
         try:
-            new_screening_room = screening_room_schema.load(validated_data)
+            new_screening_room = ScreeningRoom(**values)
             db.session.add(new_screening_room)
+            db.session.flush()
+            Change.record("room", new_screening_room.id, "create")
+            Club.touch(new_screening_room.club_id)
+            Club.adjust_counts(new_screening_room.club_id, rooms=1)
+            Movie.touch(new_screening_room.movie_id)
+            cache.invalidate_related(new_screening_room)
             db.session.commit()
-            return screening_room_schema.dump(new_screening_room), 201
+            return get_dumper(ScreeningRoomSchema)(new_screening_room), 201
+        except IntegrityError as e:
+            db.session.rollback()
+            message, status = creates.integrity_error(e)
+            return make_response({"error": message}, status)
         except Exception as e:
             db.session.rollback()
             return make_response({"error": str(e)}, 400)
@@ -617,29 +853,29 @@ class ScreeningRooms(Resource):
 class AddRoomToClub(Resource):
     def post(self, club_id):
         data = request.json
+        if isinstance(data, dict):
+            # The club comes from the URL
+            data = dict(data, club_id=club_id)
         try:
-            validated_data = ScreeningRoomPostSchema().load(data)
-        except ValidationError as e:
-            return make_response({"error": e.messages}, 400)
-
-        club = Club.query.get(club_id)
-        if not club:
-            return make_response({"error": "Club not found"}, 404)
+            values = creates.load(ScreeningRoomPostSchema, data)
+        except creates.CreateError as e:
+            return make_response({"error": e.message}, e.status)
 
-        movie_id = validated_data.get("movie_id")
-        movie = Movie.query.get(movie_id)
-        if movie is None:
-            return jsonify({"error": "Movie not found"}), 404
-
-        screening_room_schema = ScreeningRoomSchema()
         try:
-            new_screening_room = ScreeningRoom(
-                club_id=club_id,
-                movie_id=validated_data["movie_id"],
-            )
+            new_screening_room = ScreeningRoom(**values)
             db.session.add(new_screening_room)
+            db.session.flush()
+            Change.record("room", new_screening_room.id, "create")
+            Club.touch(new_screening_room.club_id)
+            Club.adjust_counts(new_screening_room.club_id, rooms=1)
+            Movie.touch(new_screening_room.movie_id)
+            cache.invalidate_related(new_screening_room)
             db.session.commit()
-            return screening_room_schema.dump(new_screening_room), 201
+            return get_dumper(ScreeningRoomSchema)(new_screening_room), 201
+        except IntegrityError as e:
+            db.session.rollback()
+            message, status = creates.integrity_error(e)
+            return make_response({"error": message}, status)
         except Exception as e:
             db.session.rollback()
             return make_response({"error": str(e)}, 400)
@@ -651,25 +887,56 @@ api.add_resource(AddRoomToClub, "/clubs/<int:club_id>/screening_rooms/new")
 class ScreeningRoomsById(Resource):
     # @user_required --- not working with frontend properly
     def get(self, id):
-        room = ScreeningRoom.query.filter_by(id=id).first()
-        if room is None:
+        # The document embeds the room's posts and ratings
+        shards.route_room(id)
+        entry = detail_document("room", ScreeningRoom, ScreeningRoomSchema, id)
+        if entry is None:
             return make_response({"error": "Screening room not found"}, 404)
-        # return make_response(club.to_dict(), 200)
-        room_schema = ScreeningRoomSchema()
-        room_data = room_schema.dump(room)
-        return make_response(jsonify(room_data), 200)
+        return conditional.cached_response(entry["body"], entry["headers"])
 
     ### make club owner only
     def patch(self, id):
         room = ScreeningRoom.query.get(id)
         if not room:
             return make_response({"error": "Screening room not found"}, 404)
+        failed = conditional.precondition_failed(room)
+        if failed:
+            return failed
         data = request.json
         room_schema = ScreeningRoomSchema()
+        old_club_id, old_movie_id = room.club_id, room.movie_id
+        shards.route_room(id)
         try:
             updated_room = room_schema.load(data, instance=room, partial=True)
+            if shards.of_club(updated_room.club_id) != shards.of_club(old_club_id):
+                db.session.rollback()
+                return make_response(
+                    {"error": "Rooms can only move between clubs on the same shard"},
+                    400,
+                )
+            Change.record("room", room.id, "update")
+            Club.touch(old_club_id, updated_room.club_id)
+            if updated_room.club_id != old_club_id:
+                room_posts = updated_room.posts.count() + db.session.scalar(
+                    select(func.count()).where(
+                        ArchivedPost.screening_room_id == updated_room.id
+                    )
+                )
+                Club.adjust_counts(old_club_id, rooms=-1, posts=-room_posts)
+                Club.adjust_counts(updated_room.club_id, rooms=1, posts=room_posts)
+            Movie.touch(old_movie_id, updated_room.movie_id)
+            cache.invalidate("club", old_club_id)
+            cache.invalidate("movie", old_movie_id)
+            cache.invalidate_related(updated_room)
             db.session.commit()
-            return room_schema.dump(updated_room), 200
+            return (
+                room_schema.dump(updated_room),
+                200,
+                conditional.validators(updated_room),
+            )
+        except StaleDataError:
+            db.session.rollback()
+            return conditional.stale_write()
         except Exception as e:
             db.session.rollback()
             return make_response({"error": e.__str__()}, 400)
@@ -679,80 +946,281 @@ class ScreeningRoomsById(Resource):
         room = ScreeningRoom.query.get(id)
         if not room:
             return make_response({"error": "Screening room not found"}, 404)
-        db.session.delete(room)
+        Club.touch(room.club_id)
+        Movie.touch(room.movie_id)
+        cache.invalidate_related(room)
+        Change.record("room", id, "delete")
+        job = deletes.remove("room", id)
         db.session.commit()
-        return {"message": "Screening room deleted successfully"}, 200
+        return deleted_response("Screening room", job)
+
+
+class RoomPosts(Resource):
+    # The room document embeds its recent posts; this pages further back
+    def get(self, room_id):
+        args = post_page_args()
+        try:
+            posts, next_cursor = archive.page(
+                Post,
+                ArchivedPost,
+                lambda model: model.screening_room_id == room_id,
+                cursor=args.get("cursor"),
+                limit=args.get("limit"),
+                on=[shards.of_room(room_id)],
+            )
+        except archive.CursorError as e:
+            return make_response({"error": str(e)}, 400)
+        posts_data = get_dumper(PostSchema, many=True)(posts)
+        return make_response(
+            jsonify(
+                {"room_id": room_id, "posts": posts_data, "next_cursor": next_cursor}
+            ),
+            200,
+        )
+
+
+api.add_resource(RoomPosts, "/rooms/<int:room_id>/posts")
 
 
 class UserPosts(Resource):
     def get(self, user_id):
-        # Fetch posts associated with the given user_id
-        posts = Post.query.filter_by(author_id=user_id).all()
-        # Serialize the posts using PostSchema
-        post_schema = PostSchema(many=True)
-        posts_data = post_schema.dump(posts)
-        # Return the serialized posts data
-        return make_response(jsonify(posts_data), 200)
+        # Newest first; older pages come from the archive
+        args = post_page_args()
+        try:
+            posts, next_cursor = archive.page(
+                Post,
+                ArchivedPost,
+                lambda model: model.author_id == user_id,
+                cursor=args.get("cursor"),
+                limit=args.get("limit"),
+            )
+        except archive.CursorError as e:
+            return make_response({"error": str(e)}, 400)
+        posts_data = get_dumper(PostSchema, many=True)(posts)
+        return make_response(
+            jsonify(
+                {"user_id": user_id, "posts": posts_data, "next_cursor": next_cursor}
+            ),
+            200,
+        )
 
 
 api.add_resource(UserPosts, "/users/<int:user_id>/posts")
 
 
+class UserRecommendations(Resource):
+    def __init__(self):
+        self.reqparse = timing.RequestParser()
+        self.reqparse.add_argument(
+            "limit",
+            type=int,
+            default=20,
+            choices=range(1, 101),
+            help="limit must be between 1 and 100",
+            location="args",
+        )
+        super(UserRecommendations, self).__init__()
+
+    def get(self, user_id):
+        args = self.reqparse.parse_args()
+        if db.session.get(User, user_id) is None:
+            return make_response({"error": "User not found"}, 404)
+
+        # Ranked from the precomputed movie_neighbors table
+        scored = recommend(user_id, limit=args["limit"])
+        movies = {
+            movie.id: movie
+            for movie in Movie.query.filter(Movie.id.in_([m for m, _ in scored]))
+        }
+        dump = get_dumper(
+            MovieSchema, only=("id", "title", "poster_image", "release_date")
+        )
+        results = [
+            {"movie": dump(movies[movie_id]), "score": round(score, 4)}
+            for movie_id, score in scored
+            if movie_id in movies
+        ]
+        return make_response(jsonify({"user_id": user_id, "results": results}), 200)
+
+
+api.add_resource(UserRecommendations, "/users/<int:user_id>/recommendations")
+
+
+class SuggestedClubs(Resource):
+    def __init__(self):
+        self.reqparse = timing.RequestParser()
+        self.reqparse.add_argument(
+            "limit",
+            type=int,
+            default=10,
+            choices=range(1, 51),
+            help="limit must be between 1 and 50",
+            location="args",
+        )
+        super(SuggestedClubs, self).__init__()
+
+    def get(self, user_id):
+        args = self.reqparse.parse_args()
+        if db.session.get(User, user_id) is None:
+            return make_response({"error": "User not found"}, 404)
+
+        # Near neighbors of the user's clubs from the LSH buckets
+        scored = discovery.suggest(user_id, limit=args["limit"])
+        clubs = readmodels.club_summaries([club_id for club_id, _ in scored])
+        results = [
+            {"club": clubs[club_id]._asdict(), "similarity": round(similarity, 4)}
+            for club_id, similarity in scored
+            if club_id in clubs
+        ]
+        return make_response(jsonify({"user_id": user_id, "results": results}), 200)
+
+
+api.add_resource(SuggestedClubs, "/users/<int:user_id>/suggested-clubs")
+
+
 class Posts(Resource):
     # @user_required
     def get(self):
-        posts = Post.query.all()
-        post_schema = PostSchema(many=True)
-        posts_data = post_schema.dump(posts)
+        if list_view_args()["view"] == "summary":
+            return listing.summary_response("posts")
+        posts = archive.scan(Post, ArchivedPost)
+        posts_data = get_dumper(PostSchema, many=True)(posts)
         return make_response(jsonify(posts_data), 200)
 
     def post(self):
-        data = request.json
         try:
-            validated_data = PostPostSchema().load(data)
-        except ValidationError as e:
-            return make_response({"error": e.messages}, 400)
+            values = creates.load(PostPostSchema, request.json)
+        except creates.CreateError as e:
+            return make_response({"error": e.message}, e.status)
 
-        post_schema = PostSchema()
+        shards.route_room(values["screening_room_id"])
         try:
-            new_post = post_schema.load(validated_data)
+            new_post = Post(**values)
             db.session.add(new_post)
+            db.session.flush()
+            search.index_post(new_post.id, new_post.content)
+            Change.record("post", new_post.id, "create")
+            ScreeningRoom.touch(new_post.screening_room_id)
+            Club.adjust_post_count(new_post.screening_room_id, 1)
+            trending.record("post", new_post.screening_room_id)
+            cache.invalidate("room", new_post.screening_room_id)
+            User.touch(new_post.author_id)
             db.session.commit()
-            return post_schema.dump(new_post), 201
+            return get_dumper(PostSchema)(new_post), 201
+        except IntegrityError as e:
+            db.session.rollback()
+            message, status = creates.integrity_error(e)
+            return make_response({"error": message}, status)
         except Exception as e:
             db.session.rollback()
             return make_response({"error": str(e)}, 400)
 
 
+class PostSearch(Resource):
+    def __init__(self):
+        self.reqparse = timing.RequestParser()
+        self.reqparse.add_argument(
+            "q", type=str, required=True, help="Search term for posts", location="args"
+        )
+        self.reqparse.add_argument(
+            "club", type=int, help="Only search posts in this club", location="args"
+        )
+        self.reqparse.add_argument(
+            "movie", type=int, help="Only search posts about this movie", location="args"
+        )
+        self.reqparse.add_argument(
+            "cursor", type=str, help="Cursor from a previous page", location="args"
+        )
+        self.reqparse.add_argument(
+            "limit", type=int, help="Maximum number of results", location="args"
+        )
+        super(PostSearch, self).__init__()
+
+    def get(self):
+        args = self.reqparse.parse_args()
+        try:
+            results = search.search_posts(
+                args["q"],
+                club_id=args.get("club"),
+                movie_id=args.get("movie"),
+                cursor=args.get("cursor"),
+                limit=args.get("limit"),
+            )
+        except search.SearchQueryError as e:
+            return make_response({"error": str(e)}, 400)
+        return make_response(jsonify(results), 200)
+
+
+api.add_resource(PostSearch, "/posts/search")
+
+
 class PostsById(Resource):
     # @user_required
     def get(self, id):
+        shards.locate(Post, id)
+        cached = conditional.not_modified(Post, id)
+        if cached:
+            return cached
         post = Post.query.filter_by(id=id).first()
         if post is None:
             return make_response({"error": "Post not found"}, 404)
-        post_schema = PostSchema()
-        post_data = post_schema.dump(post)
-        return make_response(jsonify(post_data), 200)
+        post_data = get_dumper(PostSchema)(post)
+        return make_response(jsonify(post_data), 200, conditional.validators(post))
 
     def patch(self, id):
+        shards.locate(Post, id)
         post = Post.query.get(id)
         if not post:
             return make_response({"error": "Post not found"}, 404)
+        failed = conditional.precondition_failed(post)
+        if failed:
+            return failed
         data = request.json
         post_schema = PostSchema()
+        old_room_id, old_author_id = post.screening_room_id, post.author_id
         try:
             updated_post = post_schema.load(data, instance=post, partial=True)
+            if shards.of_room(updated_post.screening_room_id) != shards.of_room(
+                old_room_id
+            ):
+                db.session.rollback()
+                return make_response(
+                    {"error": "Posts can only move between rooms on the same shard"},
+                    400,
+                )
+            search.index_post(updated_post.id, updated_post.content)
+            Change.record("post", post.id, "update")
+            ScreeningRoom.touch(old_room_id, updated_post.screening_room_id)
+            if updated_post.screening_room_id != old_room_id:
+                Club.adjust_post_count(old_room_id, -1)
+                Club.adjust_post_count(updated_post.screening_room_id, 1)
+            cache.invalidate("room", old_room_id, updated_post.screening_room_id)
+            User.touch(old_author_id, updated_post.author_id)
             db.session.commit()
-            return post_schema.dump(updated_post), 200
+            return (
+                post_schema.dump(updated_post),
+                200,
+                conditional.validators(updated_post),
+            )
+        except StaleDataError:
+            db.session.rollback()
+            return conditional.stale_write()
         except Exception as e:
             db.session.rollback()
             return make_response({"error": e.__str__()}, 400)
 
     def delete(self, id):
+        shards.locate(Post, id)
         post = Post.query.get(id)
         if not post:
             return make_response({"error": "Post not found"}, 404)
+        search.remove_post(post.id)
+        ScreeningRoom.touch(post.screening_room_id)
+        Club.adjust_post_count(post.screening_room_id, -1)
+        cache.invalidate("room", post.screening_room_id)
+        User.touch(post.author_id)
         db.session.delete(post)
+        Change.record("post", id, "delete")
         db.session.commit()
         return {"message": "Post deleted successfully"}, 200
 
@@ -760,62 +1228,374 @@ class PostsById(Resource):
 class Ratings(Resource):
     # @user_required
     def get(self):
-        ratings = Rating.query.all()
-        rating_schema = RatingSchema(many=True)
-        ratings_data = rating_schema.dump(ratings)
+        if list_view_args()["view"] == "summary":
+            return listing.summary_response("ratings")
+        ratings = archive.scan(Rating, ArchivedRating)
+        ratings_data = get_dumper(RatingSchema, many=True)(ratings)
         return make_response(jsonify(ratings_data), 200)
 
     def post(self):
-        data = request.json
         try:
-            validated_data = RatingPostSchema().load(data)
-        except ValidationError as e:
-            return make_response({"error": e.messages}, 400)
+            values = creates.load(RatingPostSchema, request.json)
+        except creates.CreateError as e:
+            return make_response({"error": e.message}, e.status)
 
-        rating_schema = RatingSchema()
+        shards.route_room(values["screening_room_id"])
         try:
-            new_rating = rating_schema.load(validated_data)
-            db.session.add(new_rating)
+            rating_id, created = Rating.upsert(**values)
+            Change.record("rating", rating_id, "create" if created else "update")
+            ScreeningRoom.touch(values["screening_room_id"])
+            cache.invalidate("room", values["screening_room_id"])
+            trending.record("rating", values["screening_room_id"])
+            User.touch(values["author_id"])
             db.session.commit()
-            return rating_schema.dump(new_rating), 201
+        except IntegrityError as e:
+            db.session.rollback()
+            message, status = creates.integrity_error(e)
+            return make_response({"error": message}, status)
         except Exception as e:
             db.session.rollback()
             return make_response({"error": str(e)}, 400)
 
+        rating = db.session.get(Rating, rating_id, populate_existing=True)
+        rating_data = get_dumper(RatingSchema)(rating)
+        rating_data["created"] = created
+        return rating_data, 201 if created else 200
+
 
 class RatingsById(Resource):
     # @user_required
     def get(self, id):
+        shards.locate(Rating, id)
+        cached = conditional.not_modified(Rating, id)
+        if cached:
+            return cached
         rating = Rating.query.filter_by(id=id).first()
         if rating is None:
             return make_response({"error": "Rating not found"}, 404)
-        rating_schema = RatingSchema()
-        rating_data = rating_schema.dump(rating)
-        return make_response(jsonify(rating_data), 200)
+        rating_data = get_dumper(RatingSchema)(rating)
+        return make_response(jsonify(rating_data), 200, conditional.validators(rating))
 
     def patch(self, id):
+        shards.locate(Rating, id)
         rating = Rating.query.get(id)
         if not rating:
             return make_response({"error": "Rating not found"}, 404)
+        failed = conditional.precondition_failed(rating)
+        if failed:
+            return failed
         data = request.json
         rating_schema = RatingSchema()
+        old_room_id, old_author_id = rating.screening_room_id, rating.author_id
         try:
             updated_rating = rating_schema.load(data, instance=rating, partial=True)
+            if shards.of_room(updated_rating.screening_room_id) != shards.of_room(
+                old_room_id
+            ):
+                db.session.rollback()
+                return make_response(
+                    {"error": "Ratings can only move between rooms on the same shard"},
+                    400,
+                )
+            Change.record("rating", rating.id, "update")
+            ScreeningRoom.touch(old_room_id, updated_rating.screening_room_id)
+            cache.invalidate("room", old_room_id, updated_rating.screening_room_id)
+            User.touch(old_author_id, updated_rating.author_id)
             db.session.commit()
-            return rating_schema.dump(updated_rating), 200
+            return (
+                rating_schema.dump(updated_rating),
+                200,
+                conditional.validators(updated_rating),
+            )
+        except StaleDataError:
+            db.session.rollback()
+            return conditional.stale_write()
         except Exception as e:
             db.session.rollback()
             return make_response({"error": e.__str__()}, 400)
 
     def delete(self, id):
+        shards.locate(Rating, id)
         rating = Rating.query.get(id)
         if not rating:
             return make_response({"error": "Rating not found"}, 404)
+        ScreeningRoom.touch(rating.screening_room_id)
+        cache.invalidate("room", rating.screening_room_id)
+        User.touch(rating.author_id)
         db.session.delete(rating)
+        Change.record("rating", id, "delete")
         db.session.commit()
         return {"message": "Rating deleted successfully"}, 200
 
 
+class RatingAnalytics(Resource):
+    def __init__(self):
+        self.reqparse = timing.RequestParser()
+        self.reqparse.add_argument(
+            "group_by",
+            type=str,
+            default="movie",
+            choices=GROUP_BY_CHOICES,
+            help="Group ratings by one of: movie, club, month",
+            location="args",
+        )
+        super(RatingAnalytics, self).__init__()
+
+    def get(self):
+        args = self.reqparse.parse_args()
+        return make_response(jsonify(rating_distribution(args["group_by"])), 200)
+
+
+api.add_resource(RatingAnalytics, "/analytics/ratings")
+
+
+class Trending(Resource):
+    def __init__(self):
+        self.reqparse = timing.RequestParser()
+        self.reqparse.add_argument(
+            "limit",
+            type=int,
+            default=10,
+            choices=range(1, 101),
+            help="limit must be between 1 and 100",
+            location="args",
+        )
+        super(Trending, self).__init__()
+
+    def get(self, kind):
+        args = self.reqparse.parse_args()
+        now = datetime.utcnow()
+        if kind == "movies":
+            scored = trending.top("movie", limit=args["limit"], now=now)
+            details = {
+                row.id: {"movie": dict(row._mapping)}
+                for row in db.session.execute(
+                    select(Movie.id, Movie.title, Movie.poster_image).where(
+                        Movie.id.in_([entry["id"] for entry in scored])
+                    )
+                )
+            }
+        else:
+            scored = trending.top("room", limit=args["limit"], now=now)
+            details = {
+                row.id: {
+                    "room": {"id": row.id},
+                    "club": {"id": row.club_id, "name": row.club_name},
+                    "movie": {"id": row.movie_id, "title": row.movie_title},
+                }
+                for row in db.session.execute(
+                    select(
+                        ScreeningRoom.id,
+                        ScreeningRoom.club_id,
+                        Club.name.label("club_name"),
+                        ScreeningRoom.movie_id,
+                        Movie.title.label("movie_title"),
+                    )
+                    .outerjoin(Club, ScreeningRoom.club_id == Club.id)
+                    .outerjoin(Movie, ScreeningRoom.movie_id == Movie.id)
+                    .where(ScreeningRoom.id.in_([entry["id"] for entry in scored]))
+                )
+            }
+
+        results = [
+            dict(
+                details[entry["id"]],
+                score=round(entry["score"], 4),
+                posts=entry["posts"],
+                ratings=entry["ratings"],
+            )
+            for entry in scored
+            if entry["id"] in details
+        ]
+        return make_response(
+            jsonify(
+                {
+                    "generated_at": now.isoformat(),
+                    "half_life_hours": trending.HALF_LIFE_HOURS,
+                    "window_hours": trending.WINDOW_HOURS,
+                    "results": results,
+                }
+            ),
+            200,
+        )
+
+
+api.add_resource(Trending, "/trending/<any(movies, rooms):kind>")
+
+
+class Export(Resource):
+    def __init__(self):
+        self.reqparse = timing.RequestParser()
+        self.reqparse.add_argument(
+            "format",
+            type=str,
+            default="ndjson",
+            choices=tuple(EXPORT_FORMATS),
+            help="Export format: ndjson or csv",
+            location="args",
+        )
+        self.reqparse.add_argument(
+            "since",
+            type=datetime.fromisoformat,
+            help="Only export rows created at or after this ISO 8601 timestamp",
+            location="args",
+        )
+        super(Export, self).__init__()
+
+    def get(self, entity):
+        if entity not in EXPORTS:
+            return make_response({"error": f"Unknown export '{entity}'"}, 404)
+        args = self.reqparse.parse_args()
+        since = args.get("since")
+        if since is not None and EXPORTS[entity]["since"] is None:
+            return make_response(
+                {"error": f"'{entity}' export does not support 'since'"}, 400
+            )
+
+        export_format = args["format"]
+        rows = generate_export(entity, export_format, since)
+        return Response(
+            stream_with_context(rows),
+            mimetype=EXPORT_FORMATS[export_format],
+            headers={
+                "Content-Disposition": f"attachment; filename={entity}.{export_format}"
+            },
+        )
+
+
+api.add_resource(Export, "/export/<string:entity>")
+
+
+class Changes(Resource):
+    def __init__(self):
+        self.reqparse = timing.RequestParser()
+        self.reqparse.add_argument(
+            "since",
+            type=int,
+            default=0,
+            help="Cursor returned by the previous sync",
+            location="args",
+        )
+        self.reqparse.add_argument(
+            "types",
+            type=str,
+            help="Comma-separated entity types to include",
+            location="args",
+        )
+        self.reqparse.add_argument(
+            "limit",
+            type=int,
+            default=500,
+            help="Maximum number of changes to return",
+            location="args",
+        )
+        super(Changes, self).__init__()
+
+    def get(self):
+        args = self.reqparse.parse_args()
+        cursor = args["since"]
+        limit = max(1, min(args["limit"], 1000))
+        entity_types = [t for t in (args.get("types") or "").split(",") if t]
+
+        # Fetch one extra row to tell the client whether to keep paging
+        changes = Change.since(cursor, entity_types, limit=limit + 1)
+        if changes is None:
+            # Older than the change log keeps; only a full resync catches up
+            return make_response(
+                {"error": "Cursor has expired; sync again from since=0"}, 410
+            )
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+
+        records = []
+        for change in changes:
+            record = {
+                "cursor": change.id,
+                "type": change.entity_type,
+                "id": change.entity_id,
+                "op": change.op,
+            }
+            if change.ref_id is not None:
+                record["ref_id"] = change.ref_id
+            records.append(record)
+
+        if changes:
+            cursor = changes[-1].id
+        return make_response(
+            jsonify({"changes": records, "cursor": cursor, "has_more": has_more}),
+            200,
+        )
+
+
+api.add_resource(Changes, "/changes")
+
+
+class Jobs(Resource):
+    @admin_required
+    def post(self):
+        data = request.get_json() or {}
+        name = data.get("name")
+        if not name:
+            return make_response({"error": "Job name is required"}, 400)
+        payload = data.get("payload") or {}
+        if not isinstance(payload, dict):
+            return make_response({"error": "'payload' must be an object"}, 400)
+        try:
+            job = jobs.enqueue(name, payload, dedupe_key=data.get("dedupe_key"))
+        except jobs.UnknownJobError as e:
+            return make_response({"error": str(e)}, 400)
+        db.session.commit()
+        return make_response(
+            jsonify(jobs.describe(job)), 202, {"Location": f"/jobs/{job.id}"}
+        )
+
+
+class JobsById(Resource):
+    @admin_required
+    def get(self, id):
+        job = db.session.get(Job, id)
+        if not job:
+            return make_response({"error": "Job not found"}, 404)
+        return make_response(jsonify(jobs.describe(job)), 200)
+
+
+api.add_resource(Jobs, "/jobs")
+api.add_resource(JobsById, "/jobs/<int:id>")
+
+
+class Profiles(Resource):
+    def __init__(self):
+        self.reqparse = timing.RequestParser()
+        self.reqparse.add_argument("endpoint", type=str, location="args")
+        self.reqparse.add_argument("limit", type=int, default=50, location="args")
+        self.reqparse.add_argument(
+            "format", choices=("json", "collapsed"), default="json", location="args"
+        )
+        super(Profiles, self).__init__()
+
+    @admin_required
+    def get(self):
+        args = self.reqparse.parse_args()
+        profiles = profiler.recent(args["endpoint"], max(1, min(args["limit"], 500)))
+        if args["format"] == "collapsed":
+            # All matching profiles as one flame graph
+            return Response(profiler.merged(profiles), mimetype="text/plain")
+        return make_response(jsonify([profiler.describe(p) for p in profiles]), 200)
+
+
+class ProfilesById(Resource):
+    @admin_required
+    def get(self, id):
+        profile = db.session.get(RequestProfile, id)
+        if not profile:
+            return make_response({"error": "Profile not found"}, 404)
+        return Response(profile.stacks or "", mimetype="text/plain")
+
+
+api.add_resource(Profiles, "/profiles")
+api.add_resource(ProfilesById, "/profiles/<int:id>")
+
+
 api.add_resource(Movies, "/movies")
 api.add_resource(MoviesById, "/movies/<int:id>")
 api.add_resource(GenresById, "/genres/<int:id>")
@@ -832,4 +1612,4 @@ api.add_resource(Ratings, "/ratings")
 api.add_resource(RatingsById, "/ratings/<int:id>")
 
 if __name__ == "__main__":
-    app.run(port=5555, debug=True)
+    create_app().run(port=5555, debug=True)
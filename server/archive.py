@@ -0,0 +1,215 @@
+import base64
+import json
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import select, insert, delete, func, union_all
+
+from models import db, User, ScreeningRoom, Post, Rating, ArchivedPost, ArchivedRating
+import cache
+import readmodels
+import search
+import shards
+
+# Hot/cold archive
+#
+# Posts and ratings older than ARCHIVE_AFTER_DAYS are moved, ids and all,
+# into posts_archive and ratings_archive by run(), in batches of
+# ARCHIVE_BATCH_SIZE, one transaction each. The hot tables then only hold
+# recent rows, which is what room documents, user profiles and most pages
+# read. A rating is dated by its last vote, so active votes stay hot.
+#
+# Club post counters, average ratings, analytics and recommendations count
+# both tiers, so archiving changes none of them. Archived posts leave the
+# search index. Room documents only embed hot rows, so each batch bumps the
+# version of the rooms (and authors) it moved rows out of and drops their
+# cached documents, in the transaction that moves them.
+#
+# A hot row whose id is already archived (ids handed out again by a
+# database without AUTOINCREMENT) is left where it is and counted as
+# skipped; the rest of its batch still moves.
+#
+# page() walks a listing newest first through the hot table and only
+# queries the archive once the hot rows run out. The cursor records which
+# tier it points into. Listings that span clubs read every shard and keep
+# the newest rows of all of them. scan() reads both tiers whole. Pages are
+# read models built from the selected columns, not mapped instances.
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+HOT = "hot"
+ARCHIVE = "archive"
+
+TIERS = ((Post, ArchivedPost), (Rating, ArchivedRating))
+
+
+class CursorError(ValueError):
+    pass
+
+
+def encode_cursor(tier, before_id):
+    raw = json.dumps([tier, before_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor):
+    try:
+        tier, before_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if tier not in (HOT, ARCHIVE):
+            raise ValueError(tier)
+        return tier, int(before_id)
+    except (ValueError, TypeError):
+        raise CursorError("Invalid cursor")
+
+
+def _newest(model, where, before_id, limit, on):
+    stmt = select(*readmodels.columns(model)).where(where)
+    if before_id is not None:
+        stmt = stmt.where(model.id < before_id)
+    stmt = stmt.order_by(model.id.desc()).limit(limit)
+    parts = shards.scatter(lambda: db.session.execute(stmt).all(), on)
+    if len(parts) == 1:
+        return parts[0]
+    rows = [row for part in parts for row in part]
+    return sorted(rows, key=lambda row: row.id, reverse=True)[:limit]
+
+
+def page(hot, cold, where, cursor=None, limit=PAGE_SIZE, on=None):
+    """One newest-first page of read models for where(model), and the next cursor.
+
+    where is called with hot and cold in turn. cold is only read once no
+    hot rows are left before the cursor. on limits the shards read.
+    """
+    limit = max(1, min(limit or PAGE_SIZE, MAX_PAGE_SIZE))
+    tier, before_id = decode_cursor(cursor) if cursor else (HOT, None)
+    # Hot rows come before cold ones, so a row's tier follows from its index
+    hot_count = 0
+    if tier == HOT:
+        rows = _newest(hot, where(hot), before_id, limit + 1, on)
+        hot_count = len(rows)
+        if len(rows) <= limit:
+            rows += _newest(cold, where(cold), None, limit + 1 - len(rows), on)
+    else:
+        rows = _newest(cold, where(cold), before_id, limit + 1, on)
+
+    if len(rows) <= limit:
+        return readmodels.build(hot, rows), None
+    last = rows[limit - 1]
+    return readmodels.build(hot, rows[:limit]), encode_cursor(
+        HOT if limit <= hot_count else ARCHIVE, last.id
+    )
+
+
+def scan(hot, cold, on=None):
+    """Read models of every live row of hot and cold, shard by shard, in id order."""
+    stmt = union_all(
+        select(*readmodels.columns(hot)), select(*readmodels.columns(cold))
+    ).order_by("id")
+    parts = shards.scatter(lambda: db.session.execute(stmt).all(), on)
+    return readmodels.build(hot, [row for part in parts for row in part])
+
+
+def _archived(hot, cold):
+    return select(cold.id).where(cold.id == hot.id).exists()
+
+
+def _skipped(hot, cold, cutoff):
+    return db.session.scalar(
+        select(func.count())
+        .select_from(hot)
+        .where(hot.timestamp < cutoff, _archived(hot, cold)),
+        execution_options={"include_deleted": True},
+    )
+
+
+def _touch_parents(hot, ids):
+    parents = db.session.execute(
+        select(hot.screening_room_id, hot.author_id).where(hot.id.in_(ids)).distinct(),
+        execution_options={"include_deleted": True},
+    ).all()
+    room_ids = {room_id for room_id, _ in parents}
+    ScreeningRoom.touch(*room_ids)
+    User.touch(*{author_id for _, author_id in parents})
+    cache.invalidate("room", *room_ids)
+
+
+def _move(hot, cold, cutoff, batch_size):
+    ids = db.session.scalars(
+        select(hot.id)
+        .where(hot.timestamp < cutoff, ~_archived(hot, cold))
+        .order_by(hot.id)
+        .limit(batch_size),
+        execution_options={"include_deleted": True},
+    ).all()
+    if not ids:
+        return 0
+    _touch_parents(hot, ids)
+    columns = [column.name for column in cold.__table__.columns]
+    db.session.execute(
+        insert(cold).from_select(
+            columns,
+            select(*(hot.__table__.c[name] for name in columns)).where(
+                hot.__table__.c.id.in_(ids)
+            ),
+        )
+    )
+    if hot is Post:
+        search.remove_posts(ids)
+    db.session.execute(
+        delete(hot).where(hot.id.in_(ids)).execution_options(synchronize_session=False)
+    )
+    return len(ids)
+
+
+def run(now=None, batch_size=None):
+    """Move posts and ratings older than the horizon into the archive.
+
+    Returns the number of rows moved per hot table, and under "skipped" the
+    number left behind because their id is already archived.
+    """
+    config = current_app.config
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=config["ARCHIVE_AFTER_DAYS"])
+    batch_size = batch_size or config["ARCHIVE_BATCH_SIZE"]
+    moved = {hot.__tablename__: 0 for hot, _ in TIERS}
+    skipped = {hot.__tablename__: 0 for hot, _ in TIERS}
+    for key in shards.keys():
+        with shards.using(key):
+            for hot, cold in TIERS:
+                while True:
+                    count = _move(hot, cold, cutoff, batch_size)
+                    db.session.commit()
+                    moved[hot.__tablename__] += count
+                    if count < batch_size:
+                        break
+                skipped[hot.__tablename__] += _skipped(hot, cold, cutoff)
+    for table, count in skipped.items():
+        if count:
+            current_app.logger.warning(
+                "archive: %d %s left hot, their ids are already archived",
+                count,
+                table,
+            )
+    moved["skipped"] = skipped
+    return moved
+
+
+cli = AppGroup("archive", help="Move old posts and ratings to the archive tables.")
+
+
+@cli.command("run")
+def run_command():
+    moved = run()
+    click.echo(
+        f"Archived {moved['posts']} posts and {moved['ratings']} ratings "
+        f"older than {current_app.config['ARCHIVE_AFTER_DAYS']} days"
+    )
+    skipped = moved["skipped"]
+    if any(skipped.values()):
+        click.echo(
+            f"Skipped {skipped['posts']} posts and {skipped['ratings']} ratings "
+            "whose ids are already archived"
+        )
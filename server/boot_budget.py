@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+# Measure how long a fresh interpreter takes to import the production app
+# (wsgi.py) and fail if the median is over budget.
+#
+#   python boot_budget.py [--budget-ms 900] [--runs 5] [--top 10]
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BUDGET_MS = 900
+
+TIMER = (
+    "import time; start = time.perf_counter(); import wsgi; "
+    "print((time.perf_counter() - start) * 1000)"
+)
+
+
+def time_boot():
+    output = subprocess.run(
+        [sys.executable, "-c", TIMER],
+        cwd=HERE,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def slowest_imports(top):
+    # -X importtime lines: "import time: self [us] | cumulative | name"
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import wsgi"],
+        cwd=HERE,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stderr
+    timings = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        # Direct imports of wsgi (one nesting level down), so nested modules
+        # are not counted twice
+        if name.startswith("   ") and not name.startswith("     "):
+            timings.append((int(cumulative) / 1000, name.strip()))
+    return sorted(timings, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check the app's cold-start import time against a budget"
+    )
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    samples = [time_boot() for _ in range(args.runs)]
+    median = statistics.median(samples)
+
+    print(f"cold start: median {median:.0f} ms over {args.runs} runs")
+    print(f"budget:     {args.budget_ms:.0f} ms")
+    print("slowest imports under wsgi:")
+    for cumulative_ms, name in slowest_imports(args.top):
+        print(f"  {cumulative_ms:8.1f} ms  {name}")
+
+    if median > args.budget_ms:
+        print("over budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
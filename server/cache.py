@@ -0,0 +1,294 @@
+import json
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from flask import current_app
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from models import db, Movie, Genre, User, Club, ScreeningRoom, Post, Rating
+import shards
+import metrics
+
+# Two-tier detail cache
+#
+# Serialized detail documents (body + validators) are kept in a bounded
+# per-process LRU in front of a shared store. A local hit is a dictionary
+# lookup; a local miss falls through to the shared store and only then to
+# the database. Writes queue the keys they affect on the session and the
+# keys are dropped from both tiers after the transaction commits.
+#
+# Dropping a key also bumps its generation in the shared store. A miss
+# notes the generation before loading and only stores what it loaded if
+# the generation is unchanged, so a reader that loaded pre-commit data
+# while a write committed cannot put it back after the invalidation.
+#
+# Other workers' local tiers are not told about invalidations; their
+# copies age out after CACHE_LOCAL_TTL seconds.
+
+PENDING_KEY = "cache_invalidate"
+# Generations outlive any load by far; an expired one reads as 0 again
+GENERATION_TTL = 86400
+
+
+class LocalBackend:
+    """In-process stand-in for the shared store (tests, single worker)."""
+
+    def __init__(self):
+        self._data = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value, expires = self._data.get(key, (None, 0))
+            if value is not None and expires < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def generation(self, key):
+        with self._lock:
+            return self._generations.get(key, 0)
+
+    def set(self, key, value, ttl, generation):
+        """Store value unless key was deleted since generation(key)."""
+        with self._lock:
+            if self._generations.get(key, 0) != generation:
+                return False
+            self._data[key] = (value, time.monotonic() + ttl)
+            return True
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+                self._generations[key] = self._generations.get(key, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RedisBackend:
+    SET_SCRIPT = """
+        if (tonumber(redis.call('GET', KEYS[2])) or 0) ~= tonumber(ARGV[3]) then
+            return 0
+        end
+        redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+        return 1
+    """
+
+    def __init__(self, url, prefix="detail:"):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError(
+                "CACHE_STORAGE_URI points at Redis but the 'redis' package "
+                "is not installed"
+            )
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+        self._set = self._client.register_script(self.SET_SCRIPT)
+
+    def _generation_key(self, key):
+        return f"{self.prefix}generation:{key}"
+
+    def get(self, key):
+        return self._client.get(self.prefix + key)
+
+    def generation(self, key):
+        return int(self._client.get(self._generation_key(key)) or 0)
+
+    def set(self, key, value, ttl, generation):
+        keys = [self.prefix + key, self._generation_key(key)]
+        return bool(self._set(keys=keys, args=[value, int(ttl), generation]))
+
+    def delete(self, *keys):
+        if not keys:
+            return
+        pipe = self._client.pipeline()
+        pipe.delete(*(self.prefix + key for key in keys))
+        for key in keys:
+            pipe.incr(self._generation_key(key))
+            pipe.expire(self._generation_key(key), GENERATION_TTL)
+        pipe.execute()
+
+    def clear(self):
+        for key in self._client.scan_iter(self.prefix + "*"):
+            self._client.delete(key)
+
+
+def create_backend(uri):
+    if uri.startswith("memory://"):
+        return LocalBackend()
+    if uri.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(uri)
+    raise ValueError(f"Unsupported CACHE_STORAGE_URI '{uri}'")
+
+
+class DetailCache:
+    def __init__(self, backend, max_entries=2048, local_ttl=30, shared_ttl=600):
+        self.backend = backend
+        self.max_entries = max_entries
+        self.local_ttl = local_ttl
+        self.shared_ttl = shared_ttl
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = defaultdict(int)
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counts[name] += n
+        metrics.count_cache(name, n)
+
+    def _get_local(self, key):
+        with self._lock:
+            item = self._local.get(key)
+            if item is None:
+                return None
+            entry, expires = item
+            if expires < time.monotonic():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            return entry
+
+    def _set_local(self, key, entry):
+        with self._lock:
+            self._local[key] = (entry, time.monotonic() + self.local_ttl)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+
+    def get_or_load(self, key, loader):
+        """Return the cached entry for key, calling loader() on a miss.
+
+        loader returns a JSON-serializable dict, or None when the object
+        does not exist; misses for missing objects are not cached.
+        """
+        entry = self._get_local(key)
+        if entry is not None:
+            self._count("local_hits")
+            return entry
+
+        raw = self.backend.get(key)
+        if raw is not None:
+            entry = json.loads(raw)
+            self._set_local(key, entry)
+            self._count("shared_hits")
+            return entry
+
+        self._count("misses")
+        generation = self.backend.generation(key)
+        entry = loader()
+        if entry is not None and self.backend.set(
+            key, json.dumps(entry), self.shared_ttl, generation
+        ):
+            self._set_local(key, entry)
+        return entry
+
+    def delete(self, keys):
+        keys = list(keys)
+        with self._lock:
+            for key in keys:
+                self._local.pop(key, None)
+        self.backend.delete(*keys)
+        self._count("invalidations", len(keys))
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+        self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counts)
+            stats["local_entries"] = len(self._local)
+        lookups = sum(stats.get(k, 0) for k in ("local_hits", "shared_hits", "misses"))
+        hits = stats.get("local_hits", 0) + stats.get("shared_hits", 0)
+        stats["hit_ratio"] = round(hits / lookups, 4) if lookups else None
+        return stats
+
+
+def get_cache():
+    cache = current_app.extensions.get("detail_cache")
+    if cache is None:
+        config = current_app.config
+        cache = DetailCache(
+            create_backend(config["CACHE_STORAGE_URI"]),
+            max_entries=config["CACHE_LOCAL_MAX_ENTRIES"],
+            local_ttl=config["CACHE_LOCAL_TTL"],
+            shared_ttl=config["CACHE_SHARED_TTL"],
+        )
+        current_app.extensions["detail_cache"] = cache
+    return cache
+
+
+def cache_key(kind, obj_id):
+    return f"{kind}:{obj_id}"
+
+
+def cached(kind, obj_id, loader):
+    if not current_app.config.get("CACHE_ENABLED", True):
+        return loader()
+    return get_cache().get_or_load(cache_key(kind, obj_id), loader)
+
+
+# Invalidation
+
+
+def invalidate(kind, *ids):
+    """Queue detail keys to be dropped once session commits."""
+    pending = db.session.info.setdefault(PENDING_KEY, set())
+    pending.update(cache_key(kind, obj_id) for obj_id in ids if obj_id is not None)
+
+
+def invalidate_related(obj):
+    """Queue every cached document that embeds part of obj.
+
+    Movie, club and room documents nest each other (room lists, club and
+    movie names) and member/author usernames, so a change to any of them
+    reaches the documents that show it. Rooms, posts and ratings are read
+    by foreign key so a pending patch invalidates the new parents too.
+    """
+    if isinstance(obj, Movie):
+        invalidate("movie", obj.id)
+        invalidate("room", *(room.id for room in obj.screening_rooms))
+        invalidate("club", *(room.club_id for room in obj.screening_rooms))
+    elif isinstance(obj, Club):
+        invalidate("club", obj.id)
+        invalidate("room", *(room.id for room in obj.screening_rooms))
+        invalidate("movie", *(room.movie_id for room in obj.screening_rooms))
+    elif isinstance(obj, ScreeningRoom):
+        invalidate("room", obj.id)
+        invalidate("club", obj.club_id)
+        invalidate("movie", obj.movie_id)
+    elif isinstance(obj, Genre):
+        invalidate("genre", obj.id)
+        invalidate("movie", *(movie.id for movie in obj.movies))
+    elif isinstance(obj, User):
+        invalidate("club", *(club.id for club in obj.clubs))
+        for model in (Post, Rating):
+            stmt = (
+                select(model.screening_room_id)
+                .where(model.author_id == obj.id)
+                .distinct()
+            )
+            for room_ids in shards.scatter(lambda: db.session.scalars(stmt).all()):
+                invalidate("room", *room_ids)
+    elif isinstance(obj, (Post, Rating)):
+        invalidate("room", obj.screening_room_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _drop_committed(session):
+    keys = session.info.pop(PENDING_KEY, None)
+    if keys and current_app.config.get("CACHE_ENABLED", True):
+        get_cache().delete(keys)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_rolled_back(session, previous_transaction):
+    session.info.pop(PENDING_KEY, None)
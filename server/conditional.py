@@ -0,0 +1,218 @@
+from datetime import timezone
+
+from flask import request, make_response
+from sqlalchemy import inspect, select, update, func
+from werkzeug.http import http_date, parse_date, quote_etag, unquote_etag
+
+from models import db, Movie, User, Club, ScreeningRoom, Post, Rating, club_members
+import cache
+import jobs
+import shards
+
+# Conditional requests
+#
+# Detail GETs answer If-None-Match / If-Modified-Since from a single-row
+# (version, updated_at) lookup before loading or serializing anything.
+# PATCH handlers honor If-Match against the same version so clients can
+# avoid lost updates without row locks.
+#
+# A document's version covers what it embeds from other rows: writes to a
+# nested collection touch the parent, and renaming a movie, club or user
+# touches every row whose document shows the old name. That fan-out can
+# reach thousands of rows, so the rename only bumps its own row and queues
+# a job for the rest; until a worker runs it, documents embedding the old
+# name may still answer 304 to their old ETag.
+
+# Renamed objects by the kind named in touch_embedded jobs
+KINDS = {"movie": Movie, "club": Club, "user": User}
+
+# Fields other documents embed, by model
+EMBEDDED_FIELDS = {
+    Movie: ("title", "poster_image"),
+    Club: ("name", "description"),
+    User: ("username",),
+}
+
+
+def etag_value(model, obj_id, version):
+    return f"{model.__tablename__}-{obj_id}-{version}"
+
+
+def _utc(dt):
+    if dt is None:
+        return None
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def validators(obj):
+    """Response headers describing the current version of obj."""
+    headers = {"ETag": quote_etag(etag_value(type(obj), obj.id, obj.version))}
+    if obj.updated_at is not None:
+        headers["Last-Modified"] = http_date(_utc(obj.updated_at))
+    return headers
+
+
+def not_modified(model, obj_id):
+    """Return a 304 response if the client's cached copy is still current."""
+    if not request.if_none_match and request.if_modified_since is None:
+        return None
+
+    row = (
+        db.session.query(model.version, model.updated_at)
+        .filter(model.id == obj_id)
+        .first()
+    )
+    if row is None:
+        return None
+
+    tag = etag_value(model, obj_id, row.version)
+    updated_at = _utc(row.updated_at)
+    if not _is_fresh(tag, updated_at):
+        return None
+
+    headers = {"ETag": quote_etag(tag)}
+    if updated_at is not None:
+        headers["Last-Modified"] = http_date(updated_at)
+    return make_response("", 304, headers)
+
+
+def _is_fresh(tag, updated_at):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(tag)
+    return (
+        updated_at is not None
+        and request.if_modified_since is not None
+        and updated_at.replace(microsecond=0) <= request.if_modified_since
+    )
+
+
+def cached_response(body, headers):
+    """Answer from a cached JSON body and the validators stored with it."""
+    tag, _ = unquote_etag(headers["ETag"])
+    updated_at = parse_date(headers.get("Last-Modified"))
+    if _is_fresh(tag, updated_at):
+        return make_response("", 304, headers)
+    response = make_response(body, 200, headers)
+    response.mimetype = "application/json"
+    return response
+
+
+def precondition_failed(obj):
+    """Return a 412 response if If-Match does not name obj's current version."""
+    if not request.if_match:
+        return None
+    if request.if_match.contains(etag_value(type(obj), obj.id, obj.version)):
+        return None
+    return stale_write()
+
+
+def stale_write():
+    return make_response(
+        {"error": "Resource was modified by another request; refetch and retry"},
+        412,
+    )
+
+
+# Renames
+
+
+def _touch(model, where):
+    db.session.execute(
+        update(model)
+        .where(where)
+        .values(version=model.version + 1, updated_at=func.now())
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _touch_authored(where, on):
+    """Touch the posts and ratings matching where(model) on shards on.
+
+    Returns the (author_id, screening_room_id) pairs they belong to.
+    """
+    pairs = set()
+    for key in on:
+        with shards.using(key):
+            for model in (Post, Rating):
+                pairs.update(
+                    db.session.execute(
+                        select(model.author_id, model.screening_room_id)
+                        .where(where(model))
+                        .distinct()
+                    ).all()
+                )
+                _touch(model, where(model))
+    return pairs
+
+
+def touch_embedding(obj):
+    """Queue a version bump of every document embedding a renamed obj.
+
+    Call before anything flushes the session, while obj's pending changes
+    still show; does nothing unless one of its EMBEDDED_FIELDS changed.
+    The job is committed with the rename, so it only runs once it shows.
+    """
+    state = inspect(obj)
+    names = EMBEDDED_FIELDS.get(type(obj), ())
+    if not any(state.attrs[name].history.has_changes() for name in names):
+        return
+    kind = next(kind for kind, model in KINDS.items() if isinstance(obj, model))
+    jobs.enqueue("conditional.touch_embedded", {"kind": kind, "obj_id": obj.id})
+
+
+def touch_embedded(kind, obj_id):
+    """Bump the version of, and drop from the cache, every document
+    embedding the movie, club or user obj_id.
+
+    Returns how many of each kind of parent document were touched.
+    """
+    if kind == "user":
+        # Club member lists, and the rooms, posts and ratings by the user
+        club_ids = db.session.scalars(
+            select(club_members.c.club_id).where(club_members.c.user_id == obj_id)
+        ).all()
+        _touch(Club, Club.id.in_(club_ids))
+        pairs = _touch_authored(lambda model: model.author_id == obj_id, shards.keys())
+        room_ids = {room_id for _, room_id in pairs}
+        _touch(ScreeningRoom, ScreeningRoom.id.in_(room_ids))
+        touched = {"clubs": club_ids, "rooms": room_ids}
+    else:
+        column = ScreeningRoom.movie_id if kind == "movie" else ScreeningRoom.club_id
+        rooms = db.session.execute(
+            select(
+                ScreeningRoom.id, ScreeningRoom.movie_id, ScreeningRoom.club_id
+            ).where(column == obj_id)
+        ).all()
+        room_ids = [room.id for room in rooms]
+        _touch(ScreeningRoom, ScreeningRoom.id.in_(room_ids))
+        if kind == "movie":
+            # Club room lists, and posts and ratings (and their authors'
+            # profiles) showing the movie title
+            club_ids = {room.club_id for room in rooms}
+            _touch(Club, Club.id.in_(club_ids))
+            pairs = _touch_authored(
+                lambda model: model.screening_room_id.in_(room_ids),
+                shards.of_rooms(room_ids),
+            )
+            _touch(User, User.id.in_({author_id for author_id, _ in pairs}))
+            touched = {"clubs": club_ids, "rooms": room_ids}
+        else:
+            # Movie room lists and member profiles showing the club
+            movie_ids = {room.movie_id for room in rooms}
+            _touch(Movie, Movie.id.in_(movie_ids))
+            _touch(
+                User,
+                User.id.in_(
+                    select(club_members.c.user_id).where(
+                        club_members.c.club_id == obj_id
+                    )
+                ),
+            )
+            touched = {"movies": movie_ids, "rooms": room_ids}
+
+    # Documents cached since the rename still carry the old version
+    for plural, ids in touched.items():
+        cache.invalidate(plural[:-1], *ids)
+    return {plural: len(ids) for plural, ids in touched.items()}
@@ -1,45 +1,176 @@
 #!/usr/bin/env python3
 
-from flask import Flask, jsonify, request, make_response
+from flask import Flask
 from flask_marshmallow import Marshmallow
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from flask_bcrypt import Bcrypt
-from flask_jwt_extended import (
-    JWTManager,
-    jwt_required,
-    create_access_token,
-    get_jwt_identity,
-)
-from flask_migrate import Migrate
-from flask_restful import Api
+from flask_jwt_extended import JWTManager
 from flask_cors import CORS
+from sqlalchemy import inspect
+from sqlalchemy.sql.util import find_tables
 import os
 
-# from flask_jwt_extended import JWTManager, jwt_required, create_access_token
+# session.info key naming the shard (a SQLALCHEMY_BINDS key, None for the
+# primary database) that posts and ratings are read from and written to
+SHARD_KEY = "shard"
 
-app = Flask(__name__)
-# app = Flask(
-#     __name__,
-#     static_url_path="",
-#     static_folder="../client/build",
-#     template_folder="../client/build",
-# )
-# need to make this private
-app.secret_key = "ErrD76SEpKMDMcq71y4WfqnsZRDogwU3yZs6dKr0S2M4tHaA0KksY585UWR3psX"
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///filmclub.db"
-# app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URI")
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-app.json.compact = False
 
-bcrypt = Bcrypt(app)
-jwt = JWTManager(app)
+class RoutingSession(Session):
+    # Tables marked info={"sharded": True} live in every shard database.
+    # Statements on them go to the shard picked by shards.route()/using(),
+    # everything else to the primary database.
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        shard = self.info.get(SHARD_KEY)
+        if bind is None and shard is not None and _is_sharded(mapper, clause):
+            return self._db.engines[shard]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
 
 
-db = SQLAlchemy()
-migrate = Migrate(app, db)
-db.init_app(app)
+def _is_sharded(mapper, clause):
+    if mapper is not None and inspect(mapper).local_table.info.get("sharded"):
+        return True
+    return clause is not None and any(
+        table.info.get("sharded") for table in find_tables(clause, include_crud=True)
+    )
 
-ma = Marshmallow(app)
 
-api = Api(app)
-CORS(app)
+# Extensions are created unbound and attached to an app in create_app(), so
+# importing models/schemas/routes never builds an app, and gunicorn can
+# preload one app in the master and fork workers that share its memory.
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+bcrypt = Bcrypt()
+jwt = JWTManager()
+ma = Marshmallow()
+
+
+class Config:
+    # need to make this private
+    SECRET_KEY = os.environ.get(
+        "SECRET_KEY", "ErrD76SEpKMDMcq71y4WfqnsZRDogwU3yZs6dKr0S2M4tHaA0KksY585UWR3psX"
+    )
+    SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URI", "sqlite:///filmclub.db")
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # flask-migrate pulls in alembic, which only the `flask db` CLI needs
+    MIGRATIONS_ENABLED = True
+    # Seconds before the in-process ratings analytics snapshot is rebuilt
+    ANALYTICS_SNAPSHOT_TTL = 300
+    # Serve hot list/detail schemas through generated dump functions
+    SCHEMA_FAST_DUMP = True
+    # Detail document cache: a per-process LRU in front of a shared store.
+    # "memory://" keeps both tiers in-process; use a redis:// URL when
+    # several workers should share entries and invalidations.
+    CACHE_ENABLED = True
+    CACHE_STORAGE_URI = os.environ.get("CACHE_STORAGE_URI", "memory://")
+    CACHE_LOCAL_MAX_ENTRIES = 2048
+    CACHE_LOCAL_TTL = 30
+    CACHE_SHARED_TTL = 600
+    # Matrix from the last recommendations refresh (default: instance folder)
+    RECOMMENDATIONS_STATE_PATH = os.environ.get("RECOMMENDATIONS_STATE_PATH")
+    # Background jobs: seconds between queue polls, how long a worker may
+    # hold a job before it is presumed dead, and retry backoff
+    JOBS_POLL_INTERVAL = 1.0
+    JOBS_LEASE_SECONDS = 600
+    JOBS_MAX_ATTEMPTS = 5
+    JOBS_BACKOFF_BASE = 10
+    JOBS_BACKOFF_MAX = 3600
+    # Deletes with more posts and ratings than this are purged by a
+    # background job, PURGE_BATCH_SIZE rows per transaction
+    PURGE_INLINE_LIMIT = 1000
+    PURGE_BATCH_SIZE = 5000
+    # Changes served by /changes are kept this long; clients with an older
+    # cursor have to sync again from scratch
+    CHANGES_RETENTION_DAYS = 30
+    # Posts and ratings older than this move to the archive tables
+    ARCHIVE_AFTER_DAYS = 180
+    ARCHIVE_BATCH_SIZE = 5000
+    # Extra databases for club-scoped posts and ratings (see shards.py).
+    # Empty keeps everything in SQLALCHEMY_DATABASE_URI. Run
+    # `flask shards init` after adding one.
+    SHARDS = [
+        uri for uri in os.environ.get("SHARD_DATABASE_URIS", "").split(",") if uri
+    ]
+    # Request profiling (see profiler.py): admins send PROFILE_HEADER to
+    # profile one request; PROFILE_SAMPLE_RATE profiles a random fraction.
+    PROFILE_HEADER = "X-Profile"
+    PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+    PROFILE_INTERVAL = 0.005
+    PROFILE_KEEP = 500
+    # Prometheus /metrics (see metrics.py); needs prometheus_client. Set
+    # METRICS_TOKEN to require it as a bearer token on every scrape.
+    METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "") == "1"
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+    # Server-Timing header with per-phase times on every response; set
+    # TIMING_LOG=1 to also log the same times as a JSON line per request
+    SERVER_TIMING = True
+    TIMING_LOG = os.environ.get("TIMING_LOG", "") == "1"
+    # Login/signup throttling: "memory://" per process, or a redis:// URL to
+    # share buckets between workers. Limits are (burst capacity, seconds to refill).
+    # THROTTLE_ENABLED=0 turns it off, e.g. for loadtest.py.
+    THROTTLE_ENABLED = os.environ.get("THROTTLE_ENABLED", "1") == "1"
+    THROTTLE_STORAGE_URI = os.environ.get("THROTTLE_STORAGE_URI", "memory://")
+    THROTTLE_TRUST_FORWARDED_FOR = False
+    THROTTLE_LIMITS = {
+        "login_ip": (20, 60),
+        "login_username": (5, 300),
+        "signup_ip": (5, 3600),
+    }
+
+
+def create_app(config=None):
+    app = Flask(__name__)
+    # app = Flask(
+    #     __name__,
+    #     static_url_path="",
+    #     static_folder="../client/build",
+    #     template_folder="../client/build",
+    # )
+    app.config.from_object(Config)
+    if config:
+        app.config.update(config)
+    import timing
+
+    timing.init_app(app)
+    app.json.compact = False
+
+    binds = dict(app.config.get("SQLALCHEMY_BINDS") or {})
+    for number, uri in enumerate(app.config["SHARDS"], start=1):
+        binds[f"shard{number}"] = uri
+    app.config["SQLALCHEMY_BINDS"] = binds
+    db.init_app(app)
+    if app.config["MIGRATIONS_ENABLED"]:
+        from flask_migrate import Migrate
+
+        Migrate(app, db)
+    bcrypt.init_app(app)
+    jwt.init_app(app)
+    ma.init_app(app)
+    CORS(app)
+
+    # Routes are recorded on the unbound blueprint and Api in app.py and
+    # only bound to a Flask app here.
+    from app import site, api
+
+    app.register_blueprint(site)
+    api.init_app(app)
+
+    import metrics
+
+    metrics.init_app(app, db)
+
+    from recommendations import cli as recommendations_cli
+    from discovery import cli as discovery_cli
+    from trending import cli as trending_cli
+    from jobs import cli as jobs_cli
+    from archive import cli as archive_cli
+    from shards import cli as shards_cli
+
+    app.cli.add_command(recommendations_cli)
+    app.cli.add_command(discovery_cli)
+    app.cli.add_command(trending_cli)
+    app.cli.add_command(jobs_cli)
+    app.cli.add_command(archive_cli)
+    app.cli.add_command(shards_cli)
+
+    return app
@@ -0,0 +1,94 @@
+from marshmallow import ValidationError
+from sqlalchemy import literal, select, union_all
+from sqlalchemy.exc import DBAPIError
+
+from models import db, User, Club, Movie, ScreeningRoom
+from schemas import get_schema
+
+# Create pipeline
+#
+# POST handlers validate the body once against its plain *PostSchema, check
+# every id it references in a single query, and construct the model from
+# the validated fields. The SQLAlchemy schemas are only used to dump the
+# result. A constraint the database still rejects afterwards (a parent
+# deleted in between, a duplicate) is turned into a 4xx from the error
+# itself, without asking the database what went wrong.
+
+# Body fields holding the id of a live row, and how to name one that is missing
+REFERENCES = {
+    "author_id": (User, "Author"),
+    "club_id": (Club, "Club"),
+    "movie_id": (Movie, "Movie"),
+    "screening_room_id": (ScreeningRoom, "Screening room"),
+}
+
+
+class CreateError(Exception):
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def load(schema_cls, data):
+    """Validated fields of data whose referenced ids all exist.
+
+    Raises CreateError (400 for invalid fields or an id the database cannot
+    hold, 404 for a missing reference).
+    """
+    try:
+        values = get_schema(schema_cls).load(data)
+    except ValidationError as e:
+        raise CreateError(e.messages, 400)
+    try:
+        missing = missing_reference(values)
+    except OverflowError:
+        # sqlite3 refuses ints past 64 bits before running the query
+        raise CreateError("Invalid id", 400)
+    except DBAPIError:
+        # Postgres rejects an id out of range for its column, aborting the
+        # transaction
+        db.session.rollback()
+        raise CreateError("Invalid id", 400)
+    if missing is not None:
+        raise CreateError(f"{REFERENCES[missing][1]} not found", 404)
+    return values
+
+
+def missing_reference(values):
+    """The first field of values naming a row that does not exist, or None."""
+    checks = [
+        (field, model, values[field])
+        for field, (model, _) in REFERENCES.items()
+        if values.get(field) is not None
+    ]
+    if not checks:
+        return None
+    # One UNION ALL round trip for every reference; soft-deleted rows count
+    # as missing
+    stmt = union_all(
+        *(
+            select(literal(field))
+            .select_from(model.__table__)
+            .where(model.__table__.c.id == value, model.deleted_at.is_(None))
+            for field, model, value in checks
+        )
+    )
+    found = set(db.session.scalars(stmt, execution_options={"include_deleted": True}))
+    for field, _, _ in checks:
+        if field not in found:
+            return field
+    return None
+
+
+def integrity_error(error):
+    """(message, status) for an IntegrityError raised by a create."""
+    orig = error.orig
+    code = getattr(orig, "pgcode", None)
+    text = str(orig).lower()
+    if code == "23505" or "unique" in text:
+        return "Already exists", 409
+    if code == "23503" or "foreign key" in text:
+        return "A referenced record no longer exists", 409
+    # Other constraint messages name tables and columns; don't echo them
+    return "Invalid data", 400
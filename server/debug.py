@@ -1,8 +1,10 @@
 #!/usr/bin/env python3
 
-from app import app
+from config import create_app
 from models import db, Movie
 
+app = create_app()
+
 if __name__ == "__main__":
     with app.app_context():
         import ipdb
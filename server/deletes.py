@@ -0,0 +1,236 @@
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import select, update, delete, func
+
+from models import (
+    db,
+    Change,
+    Movie,
+    Club,
+    ScreeningRoom,
+    User,
+    Post,
+    Rating,
+    ArchivedPost,
+    ArchivedRating,
+    club_members,
+)
+import cache
+import discovery
+import jobs
+import search
+import shards
+import trending
+
+# Deleting movies, clubs, rooms and users
+#
+# A delete happens in two steps. First the request stamps deleted_at on the
+# row, and on the rooms of a movie or club. That hides them at once, along
+# with every post and rating under them (see models._hide_deleted). Then
+# purge() deletes those posts and ratings PURGE_BATCH_SIZE rows at a time,
+# one short transaction per batch, and finally the row itself. ON DELETE
+# CASCADE foreign keys remove what is left: rooms, memberships, genre links,
+# neighbors and LSH rows.
+#
+# Deletes with at most PURGE_INLINE_LIMIT posts and ratings are purged in the
+# request. Larger ones are left to a "deletes.purge" job, so a club with
+# millions of posts never holds a worker or a write lock for long.
+#
+# Posts and ratings on other shards have no foreign keys to cascade
+# through, so purge() has to reach every one of them: on the shards of the
+# rooms involved, or on all shards for a user.
+#
+# Sync clients (see /changes) get a delete for everything that goes with
+# the row: mark() records the rooms and memberships, and each purge batch
+# the posts and ratings it removes.
+
+TARGETS = {"movie": Movie, "club": Club, "room": ScreeningRoom, "user": User}
+DEPENDENTS = (Post, ArchivedPost, Rating, ArchivedRating)
+# Archived rows are the same posts and ratings to clients
+CHANGE_TYPES = {
+    Post: "post",
+    ArchivedPost: "post",
+    Rating: "rating",
+    ArchivedRating: "rating",
+}
+
+# purge() reads rows that are already hidden from ORM selects
+INCLUDE_DELETED = {"include_deleted": True}
+
+
+def _room_ids(kind, obj_id):
+    if kind == "user":
+        return []
+    if kind == "room":
+        return [obj_id]
+    column = ScreeningRoom.movie_id if kind == "movie" else ScreeningRoom.club_id
+    return db.session.scalars(
+        select(ScreeningRoom.id).where(column == obj_id),
+        execution_options=INCLUDE_DELETED,
+    ).all()
+
+
+def _dependents(model, kind, obj_id, room_ids):
+    """Where clause for the posts or ratings that go with kind obj_id."""
+    if kind == "user":
+        return model.author_id == obj_id
+    return model.screening_room_id.in_(room_ids)
+
+
+def _shards(kind, room_ids):
+    return shards.keys() if kind == "user" else shards.of_rooms(room_ids)
+
+
+def mark(kind, obj_id, at=None):
+    """Hide kind obj_id (and a movie's or club's rooms) from reads."""
+    at = at or datetime.utcnow()
+    model = TARGETS[kind]
+    db.session.execute(update(model).where(model.id == obj_id).values(deleted_at=at))
+    if kind in ("movie", "club"):
+        column = ScreeningRoom.movie_id if kind == "movie" else ScreeningRoom.club_id
+        room_ids = db.session.scalars(
+            update(ScreeningRoom)
+            .where(column == obj_id, ScreeningRoom.deleted_at.is_(None))
+            .values(deleted_at=at)
+            .returning(ScreeningRoom.id)
+        ).all()
+        Change.record_many("room", "delete", [(room_id, None) for room_id in room_ids])
+    if kind in ("club", "user"):
+        column = club_members.c.club_id if kind == "club" else club_members.c.user_id
+        members = db.session.execute(
+            select(club_members.c.club_id, club_members.c.user_id).where(
+                column == obj_id
+            )
+        ).all()
+        Change.record_many("membership", "delete", members)
+
+
+def _exceeds(kind, obj_id, limit):
+    """Whether more than limit posts and ratings go with kind obj_id."""
+    room_ids = _room_ids(kind, obj_id)
+    total = 0
+    for key in _shards(kind, room_ids):
+        with shards.using(key):
+            for model in DEPENDENTS:
+                # Count no further than needed to answer
+                bounded = (
+                    select(model.id)
+                    .where(_dependents(model, kind, obj_id, room_ids))
+                    .limit(limit + 1 - total)
+                    .subquery()
+                )
+                total += db.session.scalar(
+                    select(func.count()).select_from(bounded),
+                    execution_options=INCLUDE_DELETED,
+                )
+                if total > limit:
+                    return True
+    return False
+
+
+def remove(kind, obj_id):
+    """Mark kind obj_id deleted and purge it now, or queue a purge job.
+
+    Returns the job, or None when everything was deleted inline. Either
+    way the caller commits.
+    """
+    mark(kind, obj_id)
+    if _exceeds(kind, obj_id, current_app.config["PURGE_INLINE_LIMIT"]):
+        return jobs.enqueue(
+            "deletes.purge",
+            {"kind": kind, "id": obj_id},
+            dedupe_key=f"purge:{kind}:{obj_id}",
+        )
+    purge(kind, obj_id, commit=False)
+    return None
+
+
+def _purge_batch(model, kind, obj_id, room_ids, batch_size):
+    rows = db.session.execute(
+        select(model.id, model.screening_room_id)
+        .where(_dependents(model, kind, obj_id, room_ids))
+        .order_by(model.id)
+        .limit(batch_size),
+        execution_options=INCLUDE_DELETED,
+    ).all()
+    ids = [row.id for row in rows]
+    if ids:
+        if model is Post:
+            search.remove_posts(ids)
+        db.session.execute(
+            delete(model)
+            .where(model.id.in_(ids))
+            .execution_options(synchronize_session=False)
+        )
+        Change.record_many(CHANGE_TYPES[model], "delete", [(id, None) for id in ids])
+    return len(ids), {row.screening_room_id for row in rows}
+
+
+def purge(kind, obj_id, batch_size=None, commit=True):
+    """Delete kind obj_id and everything under it in batches.
+
+    With commit, each batch is committed on its own so no transaction
+    holds locks for long. Safe to re-run after a failure part way.
+    """
+    batch_size = batch_size or current_app.config["PURGE_BATCH_SIZE"]
+    own_rooms = _room_ids(kind, obj_id)
+    touched_rooms = set(own_rooms)
+    member_of = []
+    if kind == "user":
+        member_of = db.session.scalars(
+            select(club_members.c.club_id).where(club_members.c.user_id == obj_id)
+        ).all()
+
+    counts = {model.__tablename__: 0 for model in DEPENDENTS}
+    for key in _shards(kind, own_rooms):
+        with shards.using(key):
+            for model in DEPENDENTS:
+                while True:
+                    deleted, rooms = _purge_batch(
+                        model, kind, obj_id, own_rooms, batch_size
+                    )
+                    counts[model.__tablename__] += deleted
+                    touched_rooms |= rooms
+                    if commit:
+                        db.session.commit()
+                    if deleted < batch_size:
+                        break
+
+    touched_rooms.discard(None)
+    club_ids = set(member_of)
+    if touched_rooms:
+        club_ids.update(
+            db.session.scalars(
+                select(ScreeningRoom.club_id)
+                .where(ScreeningRoom.id.in_(touched_rooms))
+                .distinct(),
+                execution_options=INCLUDE_DELETED,
+            )
+        )
+    if kind == "club":
+        club_ids.discard(obj_id)
+    club_ids.discard(None)
+
+    model = TARGETS[kind]
+    db.session.execute(
+        delete(model)
+        .where(model.id == obj_id)
+        .execution_options(synchronize_session=False)
+    )
+
+    if kind == "movie":
+        trending.forget("movie", [obj_id])
+    trending.forget("room", own_rooms)
+    for club_id in member_of:
+        discovery.remove_member(club_id, obj_id)
+    if club_ids:
+        Club.recount(club_ids)
+        Club.touch(*club_ids)
+        cache.invalidate("club", *club_ids)
+    if commit:
+        db.session.commit()
+
+    counts["rooms"] = len(own_rooms)
+    counts["clubs_recounted"] = len(club_ids)
+    return counts
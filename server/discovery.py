@@ -0,0 +1,240 @@
+import hashlib
+from functools import lru_cache
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import select, delete, insert
+
+from models import db, ClubSignature, ClubBucket, club_members
+
+# Club discovery
+#
+# Each club's member set is summarized by a NUM_PERM-slot MinHash
+# signature, cut into LSH_BANDS bands of LSH_ROWS slots. Clubs whose
+# signatures agree on a whole band share that band's bucket row, so the
+# clubs that overlap a user's clubs are found through indexed bucket
+# lookups rather than by comparing against every club. With 16 bands of 4
+# rows, pairs above ~50% Jaccard overlap almost always collide.
+#
+# Joining a club can only lower slots, so it is an O(NUM_PERM) update.
+# Leaving recomputes the club only if the member held one of its minima.
+
+NUM_PERM = 64
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERM // LSH_BANDS
+EMPTY_SLOT = 0xFFFFFFFF
+REBUILD_BATCH_SIZE = 50000
+
+
+@lru_cache(maxsize=None)
+def _coefficients():
+    # Derived from a fixed string rather than an RNG so stored signatures
+    # stay valid across NumPy versions.
+    import numpy as np
+
+    a, b = [], []
+    for i in range(NUM_PERM):
+        digest = hashlib.blake2b(f"club-minhash-{i}".encode(), digest_size=16).digest()
+        a.append(int.from_bytes(digest[:8], "little") | 1)
+        b.append(int.from_bytes(digest[8:], "little"))
+    return np.array(a, dtype=np.uint64), np.array(b, dtype=np.uint64)
+
+
+def member_hashes(user_ids):
+    """(len(user_ids), NUM_PERM) array of 32-bit slot hashes."""
+    import numpy as np
+
+    a, b = _coefficients()
+    x = np.asarray(user_ids, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        # splitmix64 finalizer spreads sequential ids over the whole word,
+        # then multiply-shift gives one independent hash per slot
+        x = x + np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        x = x ^ (x >> np.uint64(31))
+        hashes = (x[:, None] * a + b) >> np.uint64(32)
+    return hashes.astype(np.uint32)
+
+
+def signature(user_ids):
+    import numpy as np
+
+    if len(user_ids) == 0:
+        return np.full(NUM_PERM, EMPTY_SLOT, dtype=np.uint32)
+    return member_hashes(user_ids).min(axis=0)
+
+
+def bucket_keys(sig):
+    raw = sig.astype("<u4").tobytes()
+    width = LSH_ROWS * 4
+    keys = []
+    for band in range(LSH_BANDS):
+        digest = hashlib.blake2b(
+            bytes([band]) + raw[band * width : (band + 1) * width], digest_size=8
+        ).digest()
+        # Keep it positive so it fits a signed BIGINT
+        keys.append(int.from_bytes(digest, "little") >> 1)
+    return keys
+
+
+def _decode(raw):
+    import numpy as np
+
+    return np.frombuffer(raw, dtype="<u4").astype(np.uint32)
+
+
+def _is_empty(sig):
+    return bool((sig == EMPTY_SLOT).all())
+
+
+def _write(entries):
+    """Insert signature and bucket rows for (club_id, signature) pairs."""
+    entries = [(int(club_id), sig) for club_id, sig in entries if not _is_empty(sig)]
+    if not entries:
+        return
+    db.session.execute(
+        insert(ClubSignature),
+        [
+            {"club_id": club_id, "signature": sig.astype("<u4").tobytes()}
+            for club_id, sig in entries
+        ],
+    )
+    db.session.execute(
+        insert(ClubBucket),
+        [
+            {"bucket": key, "club_id": club_id}
+            for club_id, sig in entries
+            for key in set(bucket_keys(sig))
+        ],
+    )
+
+
+def remove_club(club_id):
+    db.session.execute(delete(ClubBucket).where(ClubBucket.club_id == club_id))
+    db.session.execute(delete(ClubSignature).where(ClubSignature.club_id == club_id))
+
+
+def _store(club_id, sig):
+    remove_club(club_id)
+    _write([(club_id, sig)])
+
+
+def _load(club_id):
+    raw = db.session.scalar(
+        select(ClubSignature.signature).where(ClubSignature.club_id == club_id)
+    )
+    return None if raw is None else _decode(raw)
+
+
+def reindex_club(club_id):
+    members = db.session.scalars(
+        select(club_members.c.user_id).where(club_members.c.club_id == club_id)
+    ).all()
+    _store(club_id, signature(members))
+
+
+def add_member(club_id, user_id):
+    import numpy as np
+
+    sig = _load(club_id)
+    if sig is None:
+        # Empty or never indexed; the pending membership is autoflushed
+        reindex_club(club_id)
+        return
+    updated = np.minimum(sig, member_hashes([user_id])[0])
+    if not np.array_equal(updated, sig):
+        _store(club_id, updated)
+
+
+def remove_member(club_id, user_id):
+    sig = _load(club_id)
+    if sig is None or (member_hashes([user_id])[0] == sig).any():
+        reindex_club(club_id)
+
+
+def rebuild():
+    """Recompute every club's signature from club_members."""
+    import numpy as np
+
+    db.session.execute(delete(ClubBucket))
+    db.session.execute(delete(ClubSignature))
+
+    stmt = select(club_members.c.club_id, club_members.c.user_id).order_by(
+        club_members.c.club_id
+    )
+    result = db.session.execute(
+        stmt, execution_options={"yield_per": REBUILD_BATCH_SIZE}
+    )
+    indexed = 0
+    carry = None
+    for rows in result.partitions():
+        clubs = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        users = np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows))
+        starts = np.flatnonzero(np.r_[True, clubs[1:] != clubs[:-1]])
+        ids = clubs[starts]
+        sigs = np.minimum.reduceat(member_hashes(users), starts, axis=0)
+
+        # A club can straddle two partitions
+        finished = []
+        if carry is not None:
+            if carry[0] == ids[0]:
+                sigs[0] = np.minimum(sigs[0], carry[1])
+            else:
+                finished.append(carry)
+        finished.extend(zip(ids[:-1], sigs[:-1]))
+        carry = (ids[-1], sigs[-1])
+        _write(finished)
+        indexed += len(finished)
+
+    if carry is not None:
+        _write([carry])
+        indexed += 1
+    return indexed
+
+
+def suggest(user_id, limit=10):
+    """(club_id, estimated Jaccard) for clubs overlapping the user's clubs."""
+    import numpy as np
+
+    own = db.session.execute(
+        select(ClubSignature.club_id, ClubSignature.signature)
+        .join(club_members, club_members.c.club_id == ClubSignature.club_id)
+        .where(club_members.c.user_id == user_id)
+    ).all()
+    if not own:
+        return []
+    own_ids = [club_id for club_id, _ in own]
+    own_sigs = np.stack([_decode(raw) for _, raw in own])
+    keys = {key for sig in own_sigs for key in bucket_keys(sig)}
+
+    candidates = (
+        select(ClubBucket.club_id)
+        .where(ClubBucket.bucket.in_(keys), ClubBucket.club_id.not_in(own_ids))
+        .distinct()
+    )
+    rows = db.session.execute(
+        select(ClubSignature.club_id, ClubSignature.signature).where(
+            ClubSignature.club_id.in_(candidates)
+        )
+    ).all()
+    if not rows:
+        return []
+
+    ids = np.array([club_id for club_id, _ in rows])
+    sigs = np.stack([_decode(raw) for _, raw in rows])
+    # Fraction of agreeing slots estimates Jaccard; rank by the closest
+    # of the user's clubs
+    similarity = (sigs[:, None, :] == own_sigs[None, :, :]).mean(axis=2).max(axis=1)
+    order = np.lexsort((ids, -similarity))[:limit]
+    return [(int(ids[i]), float(similarity[i])) for i in order]
+
+
+cli = AppGroup("discovery", help="Maintain the club discovery (MinHash/LSH) index.")
+
+
+@cli.command("rebuild")
+def rebuild_command():
+    indexed = rebuild()
+    db.session.commit()
+    click.echo(f"Indexed {indexed} clubs")
@@ -0,0 +1,65 @@
+import gc
+import importlib
+import multiprocessing
+import os
+
+# gunicorn -c gunicorn.conf.py
+
+wsgi_app = "wsgi:app"
+bind = os.environ.get("GUNICORN_BIND", f"0.0.0.0:{os.environ.get('PORT', '5555')}")
+
+# bcrypt hashing and serialization are CPU bound, so processes scale with
+# cores; a couple of threads per worker only cover database/network waits.
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 2))
+worker_class = "gthread"
+
+# Build the app once in the master; workers are forked from it and share
+# its imported modules copy-on-write instead of importing them again.
+preload_app = True
+
+# Recycle workers to cap slow leaks; the jitter keeps them from all
+# restarting at the same moment.
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 100))
+
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+
+# Imported lazily by the app to keep single-process cold starts fast, but
+# worth loading once in the master so every worker shares them.
+SHARED_MODULES = ("numpy",)
+
+
+def on_starting(server):
+    # Samples left by a previous run would be summed into this one's
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        for name in os.listdir(directory):
+            if name.endswith(".db"):
+                os.remove(os.path.join(directory, name))
+
+
+def when_ready(server):
+    for name in SHARED_MODULES:
+        importlib.import_module(name)
+    # Move everything allocated so far out of the collector's reach, so
+    # garbage collection in the workers does not touch (and un-share) it.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Pooled connections opened in the master must not be reused by children
+    from wsgi import app
+    from config import db
+
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
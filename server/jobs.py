@@ -0,0 +1,410 @@
+import json
+import os
+import random
+import signal
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import select, update, func
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Job
+
+# Background jobs
+#
+# Maintenance work (index rebuilds, recounts, model refreshes) is queued as
+# rows in the jobs table and run by `flask jobs worker` processes, so
+# request handlers can enqueue it and answer 202 straight away.
+#
+# Workers claim a job with a conditional UPDATE (status still 'queued'), so
+# two workers can never run the same job. A failed job is re-queued with
+# exponential backoff until max_attempts, and a job whose worker died is
+# re-queued once its lease runs out. A dedupe key allows at most one
+# queued-or-running job per key, enforced by a partial unique index.
+#
+# While a job runs, a heartbeat thread renews its lease, so long jobs (a
+# big purge, an archive pass) are not handed to a second worker. Outcomes
+# are written only while the row is still running under this worker; one
+# that lost its lease anyway drops its result rather than overwrite the
+# new owner's row.
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+HANDLERS = {}
+
+
+def handler(name):
+    """Register a function as the handler for jobs called name."""
+
+    def decorator(f):
+        HANDLERS[name] = f
+        return f
+
+    return decorator
+
+
+class UnknownJobError(Exception):
+    pass
+
+
+def enqueue(name, payload=None, dedupe_key=None, delay=0, max_attempts=None):
+    """Queue a job and return it, or the active job already holding dedupe_key.
+
+    The job is committed by the caller's transaction.
+    """
+    if name not in HANDLERS:
+        raise UnknownJobError(f"Unknown job '{name}'")
+    if dedupe_key is not None:
+        existing = _active(dedupe_key)
+        if existing is not None:
+            return existing
+
+    now = datetime.utcnow()
+    job = Job(
+        name=name,
+        payload=json.dumps(payload or {}),
+        status=QUEUED,
+        dedupe_key=dedupe_key,
+        attempts=0,
+        max_attempts=max_attempts or current_app.config["JOBS_MAX_ATTEMPTS"],
+        run_at=now + timedelta(seconds=delay),
+        created_at=now,
+    )
+    try:
+        with db.session.begin_nested():
+            db.session.add(job)
+    except IntegrityError:
+        # Lost a race with another enqueue of the same key
+        return _active(dedupe_key)
+    return job
+
+
+def _active(dedupe_key):
+    return db.session.scalar(
+        select(Job).where(
+            Job.dedupe_key == dedupe_key, Job.status.in_((QUEUED, RUNNING))
+        )
+    )
+
+
+def describe(job):
+    return {
+        "id": job.id,
+        "name": job.name,
+        "status": job.status,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "dedupe_key": job.dedupe_key,
+        "run_at": job.run_at.isoformat() if job.run_at else None,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "heartbeat_at": job.heartbeat_at.isoformat() if job.heartbeat_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "last_error": job.last_error,
+        "result": json.loads(job.result) if job.result else None,
+    }
+
+
+def backoff(attempts):
+    """Seconds before retry number attempts, doubling with +-25% jitter."""
+    config = current_app.config
+    delay = min(
+        config["JOBS_BACKOFF_BASE"] * 2 ** (attempts - 1), config["JOBS_BACKOFF_MAX"]
+    )
+    return delay * random.uniform(0.75, 1.25)
+
+
+# Worker
+
+
+def requeue_expired():
+    """Put back jobs whose worker has not renewed the lease in time."""
+    lease = timedelta(seconds=current_app.config["JOBS_LEASE_SECONDS"])
+    now = datetime.utcnow()
+    requeued = db.session.execute(
+        update(Job)
+        .where(
+            Job.status == RUNNING,
+            func.coalesce(Job.heartbeat_at, Job.started_at) < now - lease,
+        )
+        .values(status=QUEUED, run_at=now, locked_by=None)
+    ).rowcount
+    db.session.commit()
+    return requeued
+
+
+def claim(worker_id):
+    """Claim the next due job for worker_id, or return None."""
+    while True:
+        now = datetime.utcnow()
+        job_id = db.session.scalar(
+            select(Job.id)
+            .where(Job.status == QUEUED, Job.run_at <= now)
+            .order_by(Job.run_at, Job.id)
+            .limit(1)
+        )
+        if job_id is None:
+            db.session.commit()
+            return None
+        claimed = db.session.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == QUEUED)
+            .values(
+                status=RUNNING,
+                attempts=Job.attempts + 1,
+                started_at=now,
+                heartbeat_at=now,
+                locked_by=worker_id,
+            )
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, job_id, populate_existing=True)
+
+
+class Heartbeat(threading.Thread):
+    """Renews the lease on a running job until stopped, or until the row
+    is no longer running under worker_id."""
+
+    def __init__(self, engine, job_id, worker_id, interval):
+        super().__init__(name=f"job-heartbeat-{job_id}", daemon=True)
+        self.engine = engine
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        jobs = Job.__table__
+        while not self._stopped.wait(self.interval):
+            try:
+                with self.engine.begin() as conn:
+                    renewed = conn.execute(
+                        update(jobs)
+                        .where(
+                            jobs.c.id == self.job_id,
+                            jobs.c.status == RUNNING,
+                            jobs.c.locked_by == self.worker_id,
+                        )
+                        .values(heartbeat_at=datetime.utcnow())
+                    ).rowcount
+            except Exception:
+                # Database busy or unreachable; the next beat tries again
+                continue
+            if not renewed:
+                return
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+def _finish(job_id, worker_id, **values):
+    """Commit a job's outcome if worker_id still holds it, else roll back."""
+    finished = db.session.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.status == RUNNING, Job.locked_by == worker_id)
+        .values(locked_by=None, **values)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not finished:
+        db.session.rollback()
+        return False
+    db.session.commit()
+    return True
+
+
+def run(job, worker_id):
+    """Run a job claimed by worker_id and record its outcome.
+
+    Returns True if it succeeded, False if it failed or worker_id lost
+    the job to another worker meanwhile.
+    """
+    job_id, attempts, max_attempts = job.id, job.attempts, job.max_attempts
+    heartbeat = Heartbeat(
+        db.engine, job_id, worker_id, current_app.config["JOBS_LEASE_SECONDS"] / 4
+    )
+    error = None
+    heartbeat.start()
+    try:
+        result = HANDLERS[job.name](**json.loads(job.payload or "{}"))
+    except Exception:
+        error = traceback.format_exc(limit=5)
+        db.session.rollback()
+    finally:
+        heartbeat.stop()
+
+    if error is None:
+        return _finish(
+            job_id,
+            worker_id,
+            status=SUCCEEDED,
+            result=json.dumps(result, default=str),
+            last_error=None,
+            finished_at=datetime.utcnow(),
+        )
+    if attempts < max_attempts:
+        values = {
+            "status": QUEUED,
+            "run_at": datetime.utcnow() + timedelta(seconds=backoff(attempts)),
+        }
+    else:
+        values = {"status": FAILED, "finished_at": datetime.utcnow()}
+    _finish(job_id, worker_id, last_error=error, **values)
+    return False
+
+
+def work(worker_id, once=False, stop=lambda: False):
+    """Claim and run jobs until stop() is true (or the queue drains if once)."""
+    poll = current_app.config["JOBS_POLL_INTERVAL"]
+    processed = 0
+    last_sweep = 0.0
+    while not stop():
+        if time.monotonic() - last_sweep > poll * 30:
+            requeue_expired()
+            last_sweep = time.monotonic()
+        job = claim(worker_id)
+        if job is None:
+            if once:
+                break
+            time.sleep(poll)
+            continue
+        run(job, worker_id)
+        processed += 1
+        db.session.remove()
+    return processed
+
+
+def _serve(index, once):
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+    signal.signal(signal.SIGINT, lambda *_: stopping.append(True))
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{index}"
+    return work(worker_id, once=once, stop=lambda: bool(stopping))
+
+
+def _worker_process(index, once):
+    # Spawned children build their own app and connection pool
+    from config import create_app
+
+    with create_app({"MIGRATIONS_ENABLED": False}).app_context():
+        _serve(index, once)
+
+
+# Maintenance jobs
+
+
+@handler("search.rebuild_index")
+def rebuild_search_index():
+    import search
+
+    search.rebuild_index()
+
+
+@handler("conditional.touch_embedded")
+def touch_embedded(kind, obj_id):
+    import conditional
+
+    return conditional.touch_embedded(kind, obj_id)
+
+
+@handler("clubs.recount")
+def recount_clubs():
+    from models import Club
+
+    Club.recount()
+
+
+@handler("recommendations.refresh")
+def refresh_recommendations(full=False):
+    import recommendations
+
+    return recommendations.refresh(full=full)
+
+
+@handler("discovery.rebuild")
+def rebuild_discovery():
+    import discovery
+
+    return {"indexed": discovery.rebuild()}
+
+
+@handler("trending.rebuild")
+def rebuild_trending():
+    import trending
+
+    return {"scored": trending.rebuild()}
+
+
+@handler("trending.prune")
+def prune_trending():
+    import trending
+
+    buckets, scores = trending.prune()
+    return {"buckets": buckets, "scores": scores}
+
+
+@handler("changes.prune")
+def prune_changes():
+    from models import Change
+
+    days = current_app.config["CHANGES_RETENTION_DAYS"]
+    return {"deleted": Change.prune(datetime.utcnow() - timedelta(days=days))}
+
+
+@handler("deletes.purge")
+def purge_deleted(kind, id):
+    import deletes
+
+    return deletes.purge(kind, id)
+
+
+@handler("archive.run")
+def run_archive():
+    import archive
+
+    return archive.run()
+
+
+cli = AppGroup("jobs", help="Run and enqueue background jobs.")
+
+
+@cli.command("worker")
+@click.option("-w", "--workers", default=1, show_default=True, help="Processes.")
+@click.option("--once", is_flag=True, help="Exit when no job is due.")
+def worker_command(workers, once):
+    if workers == 1:
+        processed = _serve(0, once)
+        click.echo(f"Processed {processed} jobs")
+        return
+
+    import multiprocessing
+
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=_worker_process, args=(i, once)) for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+@cli.command("enqueue")
+@click.argument("name")
+@click.option("--payload", default="{}", help="JSON keyword arguments.")
+@click.option("--dedupe-key", default=None)
+def enqueue_command(name, payload, dedupe_key):
+    job = enqueue(name, json.loads(payload), dedupe_key=dedupe_key)
+    db.session.commit()
+    click.echo(f"Job {job.id} {job.status}")
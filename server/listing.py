@@ -0,0 +1,94 @@
+import json
+
+from flask import Response, stream_with_context
+
+from models import db, User, Club, ScreeningRoom, all_posts, all_ratings
+import shards
+
+# Streamed summary listings
+#
+# ?view=summary on the big list endpoints selects a few flat columns,
+# maps each row straight to a dict (no ORM objects, no schema) and writes
+# the JSON array out batch by batch from a generator, so memory per request
+# is one batch and the first byte leaves before the last row is read.
+# Selects still go through the session, so soft-deleted rows stay hidden.
+# Posts and ratings are read from both tiers, hot and archived, shard by
+# shard, each in id order.
+
+VIEWS = ("full", "summary")
+BATCH_SIZE = 1000
+# Both tiers of posts and ratings
+POSTS = all_posts()
+RATINGS = all_ratings()
+
+LISTS = {
+    "users": (User.id, User.username, User.email, User.bio, User.location),
+    "clubs": (
+        Club.id,
+        Club.name,
+        Club.description,
+        Club.member_count,
+        Club.room_count,
+        Club.post_count,
+    ),
+    "rooms": (ScreeningRoom.id, ScreeningRoom.club_id, ScreeningRoom.movie_id),
+    "posts": (
+        POSTS.c.id,
+        POSTS.c.content,
+        POSTS.c.author_id,
+        POSTS.c.screening_room_id,
+        POSTS.c.timestamp,
+    ),
+    "ratings": (
+        RATINGS.c.id,
+        RATINGS.c.rating,
+        RATINGS.c.author_id,
+        RATINGS.c.screening_room_id,
+        RATINGS.c.timestamp,
+    ),
+}
+SHARDED = ("posts", "ratings")
+
+
+def _json_value(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def projection(columns):
+    """Function encoding one row of columns as a JSON object."""
+    keys = tuple(column.key for column in columns)
+    encode = json.JSONEncoder(default=_json_value).encode
+    return lambda row: encode(dict(zip(keys, row)))
+
+
+PROJECTIONS = {name: projection(columns) for name, columns in LISTS.items()}
+
+
+def _batches(name):
+    columns = LISTS[name]
+    stmt = db.select(*columns).order_by(columns[0])
+    for key in shards.keys() if name in SHARDED else [None]:
+        with shards.using(key):
+            result = db.session.execute(
+                stmt, execution_options={"yield_per": BATCH_SIZE}
+            )
+            for rows in result.partitions():
+                yield rows
+
+
+def generate(name):
+    project = PROJECTIONS[name]
+    yield "["
+    first = True
+    for rows in _batches(name):
+        chunk = ",".join(project(row) for row in rows)
+        if chunk:
+            yield chunk if first else "," + chunk
+            first = False
+    yield "]\n"
+
+
+def summary_response(name):
+    return Response(stream_with_context(generate(name)), mimetype="application/json")
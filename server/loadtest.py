@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+
+# Open-loop load test against a running server. Requests arrive at a fixed
+# average rate (Poisson arrivals) whatever the server's latency, and each
+# stage of --rates runs for --duration seconds. Latency is measured from
+# the scheduled arrival, so time spent queued behind a saturated server
+# counts. Prints one JSON report.
+#
+#   python loadtest.py --url http://localhost:5555 --user alice:alice \
+#       --rates 5,10,20,40 --duration 30 [--mix movies=4,room=6] [--replay f]
+#
+# --replay takes JSON lines of {"method", "path", "json"?, "route"?},
+# e.g. cut from an access log, sent in order instead of the --mix routes.
+# Login and signup are throttled (THROTTLE_LIMITS) and every request comes
+# from this one address, so the login route will see 429s. They are
+# reported as "throttled", apart from "errors", and do not count toward
+# saturation; run the server with THROTTLE_ENABLED=0 to load logins
+# fully.
+
+import argparse
+import http.cookiejar
+import itertools
+import json
+import math
+import queue
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter, defaultdict
+
+DEFAULT_MIX = "login=1,check_session=5,movies=3,room=6,post=1,rate=2"
+# A stage is saturated once less than this share of the requests offered
+# during its send window has been picked up by the time the window closes
+THROUGHPUT_FLOOR = 0.95
+
+
+class Session:
+    """One user's cookie jar, logged in once during setup."""
+
+    def __init__(self, base_url, username, password, timeout):
+        self.base_url = base_url
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.user_id = None
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        )
+
+    def request(self, method, path, body=None):
+        data = None if body is None else json.dumps(body).encode("utf-8")
+        req = urllib.request.Request(
+            self.base_url + path,
+            data=data,
+            method=method,
+            headers={"Content-Type": "application/json"} if data else {},
+        )
+        try:
+            with self.opener.open(req, timeout=self.timeout) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def login(self):
+        status, body = self.request(
+            "POST", "/login", {"username": self.username, "password": self.password}
+        )
+        if status == 200:
+            self.user_id = json.loads(body)["id"]
+        return status
+
+
+# Mix routes: (method, path, json body) for a session and the target ids
+
+
+def login(session, targets):
+    return (
+        "POST",
+        "/login",
+        {"username": session.username, "password": session.password},
+    )
+
+
+def check_session(session, targets):
+    return "GET", "/check_session", None
+
+
+def movies(session, targets):
+    return "GET", "/movies", None
+
+
+def room(session, targets):
+    return "GET", f"/rooms/{random.choice(targets['rooms'])}", None
+
+
+def post(session, targets):
+    return (
+        "POST",
+        "/posts",
+        {
+            "content": "load test post",
+            "author_id": session.user_id,
+            "screening_room_id": random.choice(targets["rooms"]),
+        },
+    )
+
+
+def rate(session, targets):
+    return (
+        "POST",
+        "/ratings",
+        {
+            "rating": random.randint(1, 5),
+            "author_id": session.user_id,
+            "screening_room_id": random.choice(targets["rooms"]),
+        },
+    )
+
+
+ROUTES = {f.__name__: f for f in (login, check_session, movies, room, post, rate)}
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ROUTES:
+            raise argparse.ArgumentTypeError(
+                f"unknown route '{name}' (choose from {', '.join(ROUTES)})"
+            )
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def parse_rates(text):
+    return [float(rate) for rate in text.split(",")]
+
+
+def mix_requests(mix, sessions, targets):
+    names, weights = list(mix), list(mix.values())
+    while True:
+        name = random.choices(names, weights)[0]
+        session = random.choice(sessions)
+        yield (name, session) + ROUTES[name](session, targets)
+
+
+def replay_requests(path, sessions):
+    with open(path) as f:
+        lines = [json.loads(line) for line in f if line.strip()]
+    for entry in itertools.cycle(lines):
+        yield (
+            entry.get("route") or f"{entry['method']} {entry['path']}",
+            random.choice(sessions),
+            entry["method"],
+            entry["path"],
+            entry.get("json"),
+        )
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    index = max(0, math.ceil(p / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def summarize(latencies, statuses, errors, throttled):
+    values = sorted(latencies)
+    count = len(values)
+    return {
+        "requests": count,
+        "errors": errors,
+        "error_rate": round(errors / count, 4) if count else 0.0,
+        "throttled": throttled,
+        "status": dict(sorted(statuses.items())),
+        "latency_ms": {
+            name: round(value * 1000, 2) if value is not None else None
+            for name, value in (
+                ("p50", percentile(values, 50)),
+                ("p90", percentile(values, 90)),
+                ("p99", percentile(values, 99)),
+                ("max", values[-1] if values else None),
+            )
+        },
+    }
+
+
+def run_stage(requests, rate, duration, concurrency):
+    """Offer rate requests/second for duration seconds; return the stage report."""
+    pending = queue.Queue()
+    lock = threading.Lock()
+    latencies = defaultdict(list)
+    statuses = defaultdict(Counter)
+    errors = Counter()
+    throttled = Counter()
+    started = []
+    finished = []
+
+    def worker():
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            with lock:
+                started.append(time.perf_counter())
+            scheduled, (name, session, method, path, body) = item
+            try:
+                status = session.request(method, path, body)[0]
+            except Exception as e:
+                status = type(e).__name__
+            now = time.perf_counter()
+            with lock:
+                finished.append(now)
+                latencies[name].append(now - scheduled)
+                statuses[name][str(status)] += 1
+                if status == 429:
+                    throttled[name] += 1
+                elif not isinstance(status, int) or status >= 400:
+                    errors[name] += 1
+
+    workers = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in workers:
+        thread.start()
+
+    start = time.perf_counter()
+    next_at = start
+    offered = 0
+    max_backlog = 0
+    while True:
+        next_at += random.expovariate(rate)
+        if next_at - start >= duration:
+            break
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        pending.put((next_at, next(requests)))
+        offered += 1
+        max_backlog = max(max_backlog, pending.qsize())
+    for _ in workers:
+        pending.put(None)
+    for thread in workers:
+        thread.join()
+
+    # Throughput over the send window only, against what was offered in
+    # it: Poisson arrivals rarely offer exactly rate * duration requests,
+    # and the drain afterwards is idle time for a server that kept up.
+    # Requests still queued when the window closes are the ones the server
+    # fell behind on; those already being sent were served as they came.
+    window_end = start + duration
+    completed = sum(1 for at in finished if at <= window_end)
+    report = {
+        "target_rps": rate,
+        "offered": offered,
+        "offered_rps": round(offered / duration, 2),
+        "completed": completed,
+        "achieved_rps": round(completed / duration, 2),
+        "queued_at_end": offered - sum(1 for at in started if at <= window_end),
+        "max_backlog": max_backlog,
+    }
+    report.update(
+        summarize(
+            [v for values in latencies.values() for v in values],
+            sum(statuses.values(), Counter()),
+            sum(errors.values()),
+            sum(throttled.values()),
+        )
+    )
+    report["routes"] = {
+        name: summarize(latencies[name], statuses[name], errors[name], throttled[name])
+        for name in sorted(latencies)
+    }
+    return report
+
+
+def saturated(stage, max_error_rate, p99_budget_ms):
+    reasons = []
+    if stage["queued_at_end"] > stage["offered"] * (1 - THROUGHPUT_FLOOR):
+        reasons.append("throughput")
+    if stage["error_rate"] > max_error_rate:
+        reasons.append("errors")
+    p99 = stage["latency_ms"]["p99"]
+    if p99_budget_ms is not None and p99 is not None and p99 > p99_budget_ms:
+        reasons.append("latency")
+    return reasons
+
+
+def setup(args):
+    sessions = []
+    for credentials in args.user or []:
+        username, _, password = credentials.partition(":")
+        session = Session(args.url, username, password or username, args.timeout)
+        status = session.login()
+        if status != 200:
+            sys.exit(f"login failed for {username}: {status}")
+        sessions.append(session)
+    if not sessions:
+        # Anonymous: only routes that need no account work
+        sessions.append(Session(args.url, None, None, args.timeout))
+
+    status, body = sessions[0].request("GET", "/rooms")
+    if status != 200:
+        sys.exit(f"GET /rooms failed: {status}")
+    targets = {"rooms": [room["id"] for room in json.loads(body)]}
+    if not targets["rooms"]:
+        sys.exit("no screening rooms to load")
+    return sessions, targets
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay a mix of API routes at increasing open-loop rates"
+    )
+    parser.add_argument("--url", default="http://localhost:5555")
+    parser.add_argument(
+        "--user",
+        action="append",
+        help="username:password to log in as (repeatable; password defaults "
+        "to the username, as in seed.py)",
+    )
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    parser.add_argument("--replay", help="JSON lines of requests to send instead")
+    parser.add_argument(
+        "--rates", type=parse_rates, default=[5, 10, 20, 40], help="Requests/second"
+    )
+    parser.add_argument("--duration", type=float, default=30, help="Seconds a stage")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--timeout", type=float, default=10)
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--p99-budget-ms", type=float, default=None)
+    parser.add_argument(
+        "--keep-going", action="store_true", help="Run every rate past saturation"
+    )
+    args = parser.parse_args()
+
+    sessions, targets = setup(args)
+    mix = args.mix
+    if not args.user:
+        mix = {name: w for name, w in mix.items() if name in ("movies", "room")}
+    requests = (
+        replay_requests(args.replay, sessions)
+        if args.replay
+        else mix_requests(mix, sessions, targets)
+    )
+
+    stages = []
+    saturation = None
+    for rate in args.rates:
+        stage = run_stage(requests, rate, args.duration, args.concurrency)
+        stage["saturated"] = saturated(stage, args.max_error_rate, args.p99_budget_ms)
+        stages.append(stage)
+        if stage["saturated"] and saturation is None:
+            saturation = rate
+            if not args.keep_going:
+                break
+
+    json.dump(
+        {
+            "url": args.url,
+            "mix": None if args.replay else mix,
+            "replay": args.replay,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "users": len(sessions) if args.user else 0,
+            "saturation_rps": saturation,
+            "max_sustained_rps": max(
+                (s["achieved_rps"] for s in stages if not s["saturated"]), default=None
+            ),
+            "stages": stages,
+        },
+        sys.stdout,
+        indent=2,
+    )
+    print()
+
+
+if __name__ == "__main__":
+    main()
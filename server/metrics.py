@@ -0,0 +1,222 @@
+import hmac
+import os
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+from flask import Response, current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Prometheus metrics
+#
+# With METRICS_ENABLED, /metrics exposes request latency and counts per
+# flask_restful endpoint, in-flight requests, connection pool usage per
+# database, SQL statement time, bcrypt hashes in flight and detail cache
+# hits and misses. Needs the prometheus_client package.
+#
+# Scrapes must send "Authorization: Bearer <METRICS_TOKEN>". Without a
+# METRICS_TOKEN the endpoint is open, and must then only be reachable from
+# the internal network the scraper runs in.
+#
+# Under gunicorn, set PROMETHEUS_MULTIPROC_DIR to an empty directory
+# before starting: every worker then writes its samples there and a
+# scrape of any worker reports the sum over all of them (gunicorn.conf.py
+# clears the directory and drops the samples of exited workers).
+
+_metrics = None
+
+STATEMENT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+
+def multiprocess():
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def _create():
+    try:
+        import prometheus_client as prom
+    except ImportError:
+        raise RuntimeError(
+            "METRICS_ENABLED is set but the 'prometheus_client' package "
+            "is not installed"
+        )
+    return SimpleNamespace(
+        prom=prom,
+        requests=prom.Counter(
+            "http_requests",
+            "Requests answered, by endpoint and status",
+            ["endpoint", "method", "status"],
+        ),
+        latency=prom.Histogram(
+            "http_request_duration_seconds",
+            "Request latency, by endpoint",
+            ["endpoint", "method"],
+        ),
+        in_flight=prom.Gauge(
+            "http_requests_in_progress",
+            "Requests being handled",
+            multiprocess_mode="livesum",
+        ),
+        pool_checked_out=prom.Gauge(
+            "db_pool_checked_out",
+            "Pooled connections in use, by database",
+            ["database"],
+            multiprocess_mode="livesum",
+        ),
+        pool_overflow=prom.Gauge(
+            "db_pool_overflow",
+            "Connections opened beyond the pool size, by database",
+            ["database"],
+            multiprocess_mode="livesum",
+        ),
+        statements=prom.Histogram(
+            "db_statement_duration_seconds",
+            "SQL statement time, by statement type",
+            ["operation"],
+            buckets=STATEMENT_BUCKETS,
+        ),
+        bcrypt_in_flight=prom.Gauge(
+            "bcrypt_hashes_in_progress",
+            "bcrypt hashes running or waiting for a core",
+            multiprocess_mode="livesum",
+        ),
+        bcrypt=prom.Histogram(
+            "bcrypt_hash_duration_seconds", "Time to hash or check a password"
+        ),
+        cache=prom.Counter(
+            "detail_cache_events",
+            "Detail cache local_hits, shared_hits, misses and invalidations",
+            ["event"],
+        ),
+    )
+
+
+def init_app(app, db):
+    global _metrics
+    if not app.config["METRICS_ENABLED"]:
+        return
+    if _metrics is None:
+        # Collectors are process-wide; later apps share them
+        _metrics = _create()
+        event.listen(Engine, "before_cursor_execute", _statement_started)
+        event.listen(Engine, "after_cursor_execute", _statement_finished)
+        event.listen(Engine, "handle_error", _statement_failed)
+    app.before_request(_request_started)
+    app.after_request(_request_finished)
+    app.teardown_request(_request_done)
+    app.add_url_rule("/metrics", "metrics", expose)
+    with app.app_context():
+        for key, engine in db.engines.items():
+            _watch_pool(key or "primary", engine)
+
+
+# Requests
+
+
+def _request_started():
+    g.metrics_started = time.perf_counter()
+    _metrics.in_flight.inc()
+
+
+def _request_finished(response):
+    started = g.get("metrics_started")
+    if started is not None:
+        endpoint = request.endpoint or "unmatched"
+        _metrics.latency.labels(endpoint, request.method).observe(
+            time.perf_counter() - started
+        )
+        _metrics.requests.labels(
+            endpoint, request.method, str(response.status_code)
+        ).inc()
+    return response
+
+
+def _request_done(exc):
+    if g.pop("metrics_started", None) is not None:
+        _metrics.in_flight.dec()
+
+
+def _authorized():
+    token = current_app.config["METRICS_TOKEN"]
+    if not token:
+        return True
+    sent = request.headers.get("Authorization", "")
+    return hmac.compare_digest(sent.encode(), f"Bearer {token}".encode())
+
+
+def expose():
+    if not _authorized():
+        return Response(
+            "Unauthorized\n", 401, {"WWW-Authenticate": 'Bearer realm="metrics"'}
+        )
+    prom = _metrics.prom
+    if multiprocess():
+        from prometheus_client import multiprocess as mp
+
+        registry = prom.CollectorRegistry()
+        mp.MultiProcessCollector(registry)
+    else:
+        registry = prom.REGISTRY
+    return Response(prom.generate_latest(registry), mimetype=prom.CONTENT_TYPE_LATEST)
+
+
+# Database
+
+
+def _watch_pool(name, engine):
+    pool = engine.pool
+    if not hasattr(pool, "overflow"):
+        # Pools without a fixed size (SQLite's) have nothing to saturate
+        return
+    checked_out = _metrics.pool_checked_out.labels(name)
+    overflow = _metrics.pool_overflow.labels(name)
+
+    @event.listens_for(engine, "checkout")
+    def checkout(dbapi_connection, record, proxy):
+        checked_out.set(pool.checkedout())
+        overflow.set(max(0, pool.overflow()))
+
+    @event.listens_for(engine, "checkin")
+    def checkin(dbapi_connection, record):
+        checked_out.set(pool.checkedout())
+        overflow.set(max(0, pool.overflow()))
+
+
+def _statement_started(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+
+def _statement_finished(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["metrics_started"].pop()
+    operation = statement.lstrip().split(None, 1)[0].lower() if statement else ""
+    _metrics.statements.labels(operation).observe(time.perf_counter() - started)
+
+
+def _statement_failed(context):
+    if context.connection is not None:
+        started = context.connection.info.get("metrics_started")
+        if started:
+            started.pop()
+
+
+# bcrypt and cache
+
+
+@contextmanager
+def bcrypt_hash():
+    if _metrics is None:
+        yield
+        return
+    _metrics.bcrypt_in_flight.inc()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _metrics.bcrypt.observe(time.perf_counter() - started)
+        _metrics.bcrypt_in_flight.dec()
+
+
+def count_cache(name, n=1):
+    if _metrics is not None:
+        _metrics.cache.labels(name).inc(n)
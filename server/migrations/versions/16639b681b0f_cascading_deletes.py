@@ -0,0 +1,75 @@
+"""cascading deletes
+
+Revision ID: 16639b681b0f
+Revises: 74f64680e8b2
+Create Date: 2026-10-19 17:00:03.850105
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '16639b681b0f'
+down_revision = '74f64680e8b2'
+branch_labels = None
+depends_on = None
+
+# Foreign keys that now cascade, by table. Constraints from create_table
+# were unnamed; the naming convention gives SQLite's reflected copies the
+# same names Postgres generated for them.
+CASCADES = {
+    'club_members': [('user_id', 'users'), ('club_id', 'clubs')],
+    'movie_genre': [('movie_id', 'movies'), ('genre_id', 'genres')],
+    'screening_rooms': [('club_id', 'clubs'), ('movie_id', 'movies')],
+    'posts': [('author_id', 'users'), ('screening_room_id', 'screening_rooms')],
+    'ratings': [('author_id', 'users'), ('screening_room_id', 'screening_rooms')],
+    'movie_neighbors': [('movie_id', 'movies'), ('neighbor_id', 'movies')],
+    'club_signatures': [('club_id', 'clubs')],
+    'club_lsh_buckets': [('club_id', 'clubs')],
+}
+NAMING_CONVENTION = {'fk': '%(table_name)s_%(column_0_name)s_fkey'}
+
+# Referencing columns that a cascade (or a purge batch) looks rows up by
+INDEXES = [
+    ('ix_club_members_club_id', 'club_members', 'club_id'),
+    ('ix_movie_genre_genre_id', 'movie_genre', 'genre_id'),
+    ('ix_screening_rooms_club_id', 'screening_rooms', 'club_id'),
+    ('ix_screening_rooms_movie_id', 'screening_rooms', 'movie_id'),
+    ('ix_posts_author_id', 'posts', 'author_id'),
+    ('ix_posts_screening_room_id', 'posts', 'screening_room_id'),
+    ('ix_ratings_screening_room_id', 'ratings', 'screening_room_id'),
+    ('ix_movie_neighbors_neighbor_id', 'movie_neighbors', 'neighbor_id'),
+]
+
+SOFT_DELETED_TABLES = ['movies', 'clubs', 'screening_rooms', 'users']
+
+
+def _replace_foreign_keys(ondelete):
+    for table, keys in CASCADES.items():
+        with op.batch_alter_table(
+            table, naming_convention=NAMING_CONVENTION
+        ) as batch_op:
+            for column, referent in keys:
+                name = f'{table}_{column}_fkey'
+                batch_op.drop_constraint(name, type_='foreignkey')
+                batch_op.create_foreign_key(
+                    name, referent, [column], ['id'], ondelete=ondelete
+                )
+
+
+def upgrade():
+    for table in SOFT_DELETED_TABLES:
+        op.add_column(table, sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    _replace_foreign_keys('CASCADE')
+    for name, table, column in INDEXES:
+        op.create_index(name, table, [column], unique=False)
+
+
+def downgrade():
+    for name, table, column in INDEXES:
+        op.drop_index(name, table_name=table)
+    _replace_foreign_keys(None)
+    for table in SOFT_DELETED_TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('deleted_at')
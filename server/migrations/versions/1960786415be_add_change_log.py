@@ -0,0 +1,34 @@
+"""add change log
+
+Revision ID: 1960786415be
+Revises: 8af4d4c5cd56
+Create Date: 2026-10-19 16:31:27.481858
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1960786415be'
+down_revision = '8af4d4c5cd56'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('changes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('entity_type', sa.String(length=20), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('ref_id', sa.Integer(), nullable=True),
+    sa.Column('op', sa.String(length=10), nullable=False),
+    sa.Column('timestamp', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_changes_entity_type_id', 'changes', ['entity_type', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_changes_entity_type_id', table_name='changes')
+    op.drop_table('changes')
@@ -0,0 +1,41 @@
+"""trending activity
+
+Revision ID: 315916864ab6
+Revises: 67061e91ecc2
+Create Date: 2026-10-19 16:50:44.314267
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '315916864ab6'
+down_revision = '67061e91ecc2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('activity_buckets',
+    sa.Column('entity_type', sa.String(length=10), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('hour', sa.DateTime(), nullable=False),
+    sa.Column('posts', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('ratings', sa.Integer(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('entity_type', 'entity_id', 'hour')
+    )
+    op.create_table('trending_scores',
+    sa.Column('entity_type', sa.String(length=10), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('log_score', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('entity_type', 'entity_id')
+    )
+    op.create_index('ix_trending_scores_entity_type_log_score', 'trending_scores', ['entity_type', 'log_score'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_trending_scores_entity_type_log_score', table_name='trending_scores')
+    op.drop_table('trending_scores')
+    op.drop_table('activity_buckets')
@@ -0,0 +1,37 @@
+"""request profiles
+
+Revision ID: 4ed62b8e76d3
+Revises: bdddc79a0fc5
+Create Date: 2026-10-19 17:22:16.525802
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4ed62b8e76d3'
+down_revision = 'bdddc79a0fc5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('request_profiles',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('method', sa.String(length=10), nullable=False),
+    sa.Column('path', sa.String(length=500), nullable=False),
+    sa.Column('endpoint', sa.String(length=100), nullable=True),
+    sa.Column('status', sa.Integer(), nullable=True),
+    sa.Column('duration_ms', sa.Float(), nullable=False),
+    sa.Column('samples', sa.Integer(), nullable=False),
+    sa.Column('stacks', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_request_profiles_endpoint', 'request_profiles', ['endpoint'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_request_profiles_endpoint', table_name='request_profiles')
+    op.drop_table('request_profiles')
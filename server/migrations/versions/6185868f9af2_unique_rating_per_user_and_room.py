@@ -0,0 +1,41 @@
+"""unique rating per user and room
+
+Revision ID: 6185868f9af2
+Revises: aa5bca1a837f
+Create Date: 2026-10-19 16:29:14.546503
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6185868f9af2'
+down_revision = 'aa5bca1a837f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keep only the most recent rating for each (author, room) pair
+    op.execute(
+        "DELETE FROM ratings WHERE id NOT IN ("
+        "SELECT MAX(id) FROM ratings GROUP BY author_id, screening_room_id"
+        ")"
+    )
+    op.add_column(
+        'ratings',
+        sa.Column('version', sa.Integer(), nullable=False, server_default='1'),
+    )
+    op.create_index(
+        'ix_ratings_author_id_screening_room_id',
+        'ratings',
+        ['author_id', 'screening_room_id'],
+        unique=True,
+    )
+
+
+def downgrade():
+    op.drop_index('ix_ratings_author_id_screening_room_id', table_name='ratings')
+    with op.batch_alter_table('ratings') as batch_op:
+        batch_op.drop_column('version')
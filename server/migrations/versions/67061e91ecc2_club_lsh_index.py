@@ -0,0 +1,38 @@
+"""club lsh index
+
+Revision ID: 67061e91ecc2
+Revises: df075d09758a
+Create Date: 2026-10-19 16:48:10.467238
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '67061e91ecc2'
+down_revision = 'df075d09758a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('club_signatures',
+    sa.Column('club_id', sa.Integer(), nullable=False),
+    sa.Column('signature', sa.LargeBinary(), nullable=False),
+    sa.ForeignKeyConstraint(['club_id'], ['clubs.id'], ),
+    sa.PrimaryKeyConstraint('club_id')
+    )
+    op.create_table('club_lsh_buckets',
+    sa.Column('bucket', sa.BigInteger(), nullable=False),
+    sa.Column('club_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['club_id'], ['clubs.id'], ),
+    sa.PrimaryKeyConstraint('bucket', 'club_id')
+    )
+    op.create_index('ix_club_lsh_buckets_club_id', 'club_lsh_buckets', ['club_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_club_lsh_buckets_club_id', table_name='club_lsh_buckets')
+    op.drop_table('club_lsh_buckets')
+    op.drop_table('club_signatures')
@@ -0,0 +1,44 @@
+"""autoincrement post and rating ids
+
+Revision ID: 7abe859d2368
+Revises: db9217d2d672
+Create Date: 2026-10-19 18:06:37.711924
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '7abe859d2368'
+down_revision = 'db9217d2d672'
+branch_labels = None
+depends_on = None
+
+# Hot tables and the archive tables their rows move to with their ids
+TABLES = (('posts', 'posts_archive'), ('ratings', 'ratings_archive'))
+
+
+def upgrade():
+    # Postgres sequences never hand out an id twice; SQLite rowids restart
+    # from the highest id left in the table, which can be an archived one
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for table, archive in TABLES:
+        with op.batch_alter_table(
+            table, recreate='always', table_kwargs={'sqlite_autoincrement': True}
+        ):
+            pass
+        op.execute(f"DELETE FROM sqlite_sequence WHERE name = '{table}'")
+        op.execute(
+            f"INSERT INTO sqlite_sequence (name, seq) SELECT '{table}', "
+            f"max(coalesce((SELECT max(id) FROM {table}), 0), "
+            f"coalesce((SELECT max(id) FROM {archive}), 0))"
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for table, _ in TABLES:
+        with op.batch_alter_table(table, recreate='always'):
+            pass
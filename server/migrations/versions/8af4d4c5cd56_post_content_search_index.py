@@ -0,0 +1,41 @@
+"""post content search index
+
+Revision ID: 8af4d4c5cd56
+Revises: 6185868f9af2
+Create Date: 2026-10-19 16:30:14.775634
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8af4d4c5cd56'
+down_revision = '6185868f9af2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('ALTER TABLE posts ADD COLUMN search_vector tsvector')
+        op.execute(
+            "UPDATE posts SET search_vector = "
+            "to_tsvector('english', coalesce(content, ''))"
+        )
+        op.execute(
+            'CREATE INDEX ix_posts_search_vector ON posts USING GIN (search_vector)'
+        )
+    else:
+        op.execute('CREATE VIRTUAL TABLE posts_fts USING fts5(content)')
+        op.execute(
+            "INSERT INTO posts_fts (rowid, content) "
+            "SELECT id, coalesce(content, '') FROM posts"
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('DROP INDEX ix_posts_search_vector')
+        op.execute('ALTER TABLE posts DROP COLUMN search_vector')
+    else:
+        op.execute('DROP TABLE posts_fts')
@@ -0,0 +1,52 @@
+"""row versioning
+
+Revision ID: 9f308ee178cd
+Revises: 1960786415be
+Create Date: 2026-10-19 16:32:25.601902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9f308ee178cd'
+down_revision = '1960786415be'
+branch_labels = None
+depends_on = None
+
+
+VERSIONED_TABLES = [
+    'movies',
+    'genres',
+    'roles',
+    'users',
+    'clubs',
+    'screening_rooms',
+    'posts',
+    'ratings',
+]
+
+
+def upgrade():
+    for table in VERSIONED_TABLES:
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=True))
+        if table != 'ratings':
+            # ratings.version already exists from the rating upsert migration
+            op.add_column(
+                table,
+                sa.Column('version', sa.Integer(), nullable=False, server_default='1'),
+            )
+
+    op.execute('UPDATE posts SET updated_at = coalesce(timestamp, CURRENT_TIMESTAMP)')
+    op.execute('UPDATE ratings SET updated_at = coalesce(timestamp, CURRENT_TIMESTAMP)')
+    for table in VERSIONED_TABLES[:-2]:
+        op.execute(f'UPDATE {table} SET updated_at = CURRENT_TIMESTAMP')
+
+
+def downgrade():
+    for table in VERSIONED_TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('updated_at')
+            if table != 'ratings':
+                batch_op.drop_column('version')
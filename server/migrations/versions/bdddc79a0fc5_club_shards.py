@@ -0,0 +1,36 @@
+"""club shards
+
+Revision ID: bdddc79a0fc5
+Revises: f2c8cd250d2b
+Create Date: 2026-10-19 17:14:01.905284
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'bdddc79a0fc5'
+down_revision = 'f2c8cd250d2b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('club_shards',
+    sa.Column('club_id', sa.Integer(), nullable=False),
+    sa.Column('shard', sa.String(length=50), nullable=True),
+    sa.ForeignKeyConstraint(['club_id'], ['clubs.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('club_id')
+    )
+    op.create_table('id_sequences',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('next_id', sa.Integer(), nullable=False),
+    sa.Column('step', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('id_sequences')
+    op.drop_table('club_shards')
@@ -0,0 +1,32 @@
+"""change log transaction ids
+
+Revision ID: bfc20150e04e
+Revises: 4ed62b8e76d3
+Create Date: 2026-10-19 17:47:06.823953
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'bfc20150e04e'
+down_revision = '4ed62b8e76d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('changes', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('txid', sa.BigInteger(), nullable=True))
+        batch_op.create_index('ix_changes_txid_id', ['txid', 'id'], unique=False)
+
+    # Existing changes sort before anything written from now on
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('UPDATE changes SET txid = 0')
+
+
+def downgrade():
+    with op.batch_alter_table('changes', schema=None) as batch_op:
+        batch_op.drop_index('ix_changes_txid_id')
+        batch_op.drop_column('txid')
@@ -0,0 +1,26 @@
+"""job heartbeats
+
+Revision ID: db9217d2d672
+Revises: bfc20150e04e
+Create Date: 2026-10-19 17:52:59.269612
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'db9217d2d672'
+down_revision = 'bfc20150e04e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('jobs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('heartbeat_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('jobs', schema=None) as batch_op:
+        batch_op.drop_column('heartbeat_at')
@@ -0,0 +1,31 @@
+"""movie neighbors
+
+Revision ID: df075d09758a
+Revises: e89c55a7725c
+Create Date: 2026-10-19 16:45:51.285499
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'df075d09758a'
+down_revision = 'e89c55a7725c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('movie_neighbors',
+    sa.Column('movie_id', sa.Integer(), nullable=False),
+    sa.Column('neighbor_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['movie_id'], ['movies.id'], ),
+    sa.ForeignKeyConstraint(['neighbor_id'], ['movies.id'], ),
+    sa.PrimaryKeyConstraint('movie_id', 'neighbor_id')
+    )
+
+
+def downgrade():
+    op.drop_table('movie_neighbors')
@@ -0,0 +1,52 @@
+"""club directory counters
+
+Revision ID: e89c55a7725c
+Revises: 9f308ee178cd
+Create Date: 2026-10-19 16:43:44.476388
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e89c55a7725c'
+down_revision = '9f308ee178cd'
+branch_labels = None
+depends_on = None
+
+
+COUNTERS = ['member_count', 'room_count', 'post_count']
+
+
+def upgrade():
+    for column in COUNTERS:
+        op.add_column(
+            'clubs',
+            sa.Column(column, sa.Integer(), nullable=False, server_default='0'),
+        )
+
+    op.execute(
+        """
+        UPDATE clubs SET
+            member_count = (
+                SELECT count(*) FROM club_members
+                WHERE club_members.club_id = clubs.id
+            ),
+            room_count = (
+                SELECT count(*) FROM screening_rooms
+                WHERE screening_rooms.club_id = clubs.id
+            ),
+            post_count = (
+                SELECT count(*) FROM posts
+                JOIN screening_rooms ON posts.screening_room_id = screening_rooms.id
+                WHERE screening_rooms.club_id = clubs.id
+            )
+        """
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('clubs') as batch_op:
+        for column in reversed(COUNTERS):
+            batch_op.drop_column(column)
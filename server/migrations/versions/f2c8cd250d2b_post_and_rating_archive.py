@@ -0,0 +1,56 @@
+"""post and rating archive
+
+Revision ID: f2c8cd250d2b
+Revises: 16639b681b0f
+Create Date: 2026-10-19 17:05:09.002092
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c8cd250d2b'
+down_revision = '16639b681b0f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('posts_archive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('content', sa.String(), nullable=True),
+    sa.Column('author_id', sa.Integer(), nullable=True),
+    sa.Column('screening_room_id', sa.Integer(), nullable=True),
+    sa.Column('timestamp', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('version', sa.Integer(), server_default='1', nullable=False),
+    sa.ForeignKeyConstraint(['author_id'], ['users.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['screening_room_id'], ['screening_rooms.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_posts_archive_author_id', 'posts_archive', ['author_id'], unique=False)
+    op.create_index('ix_posts_archive_screening_room_id', 'posts_archive', ['screening_room_id'], unique=False)
+    op.create_table('ratings_archive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('author_id', sa.Integer(), nullable=True),
+    sa.Column('screening_room_id', sa.Integer(), nullable=True),
+    sa.Column('rating', sa.Integer(), nullable=True),
+    sa.Column('timestamp', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('version', sa.Integer(), server_default='1', nullable=False),
+    sa.ForeignKeyConstraint(['author_id'], ['users.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['screening_room_id'], ['screening_rooms.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_ratings_archive_author_id', 'ratings_archive', ['author_id'], unique=False)
+    op.create_index('ix_ratings_archive_screening_room_id', 'ratings_archive', ['screening_room_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_ratings_archive_screening_room_id', table_name='ratings_archive')
+    op.drop_index('ix_ratings_archive_author_id', table_name='ratings_archive')
+    op.drop_table('ratings_archive')
+    op.drop_index('ix_posts_archive_screening_room_id', table_name='posts_archive')
+    op.drop_index('ix_posts_archive_author_id', table_name='posts_archive')
+    op.drop_table('posts_archive')
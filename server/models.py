@@ -1,21 +1,90 @@
+import sqlite3
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.ext.hybrid import hybrid_property
-from config import db, bcrypt
+from sqlalchemy.orm import declared_attr, Session, with_loader_criteria
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.dialects import postgresql, sqlite
+from config import db, bcrypt, SHARD_KEY
+import metrics
 import pytz
 
 club_members = db.Table(
     "club_members",
-    db.Column("user_id", db.Integer, db.ForeignKey("users.id"), primary_key=True),
-    db.Column("club_id", db.Integer, db.ForeignKey("clubs.id"), primary_key=True),
+    db.Column(
+        "user_id",
+        db.Integer,
+        db.ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+    ),
+    db.Column(
+        "club_id",
+        db.Integer,
+        db.ForeignKey("clubs.id", ondelete="CASCADE"),
+        primary_key=True,
+    ),
+    db.Index("ix_club_members_club_id", "club_id"),
 )
 
 movie_genre = db.Table(
     "movie_genre",
-    db.Column("movie_id", db.Integer, db.ForeignKey("movies.id"), primary_key=True),
-    db.Column("genre_id", db.Integer, db.ForeignKey("genres.id"), primary_key=True),
+    db.Column(
+        "movie_id",
+        db.Integer,
+        db.ForeignKey("movies.id", ondelete="CASCADE"),
+        primary_key=True,
+    ),
+    db.Column(
+        "genre_id",
+        db.Integer,
+        db.ForeignKey("genres.id", ondelete="CASCADE"),
+        primary_key=True,
+    ),
+    db.Index("ix_movie_genre_genre_id", "genre_id"),
 )
 
 
-class Movie(db.Model):
+@event.listens_for(Engine, "connect")
+def _sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite only enforces foreign keys, ON DELETE CASCADE included, when asked
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+
+class Versioned:
+    # Row version for ETags and optimistic concurrency: the ORM adds
+    # "AND version = :old" to every UPDATE and bumps it, so a concurrent
+    # write raises StaleDataError instead of being silently lost.
+    updated_at = db.Column(db.DateTime, default=db.func.now(), onupdate=db.func.now())
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+
+    @declared_attr
+    def __mapper_args__(cls):
+        return {"version_id_col": cls.version}
+
+    @classmethod
+    def touch(cls, *ids):
+        # Bump version/updated_at when something embedded in this row's
+        # detail document changes without the row itself being written.
+        ids = [i for i in ids if i is not None]
+        if ids:
+            db.session.execute(
+                db.update(cls)
+                .where(cls.id.in_(ids))
+                .values(version=cls.version + 1, updated_at=db.func.now())
+            )
+
+
+class SoftDeleted:
+    # Set when a delete is accepted. The row stays until deletes.purge() has
+    # removed what hangs off it, and ORM selects skip it in the meantime.
+    deleted_at = db.Column(db.DateTime)
+
+
+class Movie(SoftDeleted, Versioned, db.Model):
     __tablename__ = "movies"
 
     id = db.Column(db.Integer, primary_key=True)
@@ -23,8 +92,15 @@ class Movie(db.Model):
     release_date = db.Column(db.String)
     poster_image = db.Column(db.String)
     popularity = db.Column(db.Integer)
-    genres = db.relationship("Genre", secondary="movie_genre", backref="movies")
-    screening_rooms = db.relationship("ScreeningRoom", backref="movie")
+    genres = db.relationship(
+        "Genre",
+        secondary="movie_genre",
+        backref=db.backref("movies", passive_deletes=True),
+        passive_deletes=True,
+    )
+    screening_rooms = db.relationship(
+        "ScreeningRoom", backref="movie", cascade="all, delete", passive_deletes=True
+    )
 
     def __init__(
         self,
@@ -45,24 +121,24 @@ class Movie(db.Model):
 
     @staticmethod
     def calculate_average_rating(movie_id):
-        screening_rooms = ScreeningRoom.query.filter_by(movie_id=movie_id).all()
-
-        total_ratings = 0
-        total_count = 0
-
-        for room in screening_rooms:
-            ratings = Rating.query.filter_by(screening_room_id=room.id).all()
-            for rating in ratings:
-                total_ratings += rating.rating
-                total_count += 1
-
-
-        if total_count > 0:
-            average_rating = total_ratings / total_count
-        else:
-            average_rating = 0
-
-        return average_rating
+        # Archived ratings still count towards the average. Ratings sit on
+        # their club's shard, so each shard sums its own.
+        import shards
+
+        room_ids = db.session.scalars(
+            db.select(ScreeningRoom.id).where(ScreeningRoom.movie_id == movie_id)
+        ).all()
+        ratings = all_ratings()
+        stmt = db.select(
+            db.func.coalesce(db.func.sum(ratings.c.rating), 0),
+            db.func.count(ratings.c.rating),
+        ).where(ratings.c.screening_room_id.in_(room_ids))
+        parts = shards.scatter(
+            lambda: db.session.execute(stmt).one(), shards.of_rooms(room_ids)
+        )
+        total = sum(part[0] for part in parts)
+        count = sum(part[1] for part in parts)
+        return total / count if count else 0
 
     @staticmethod
     def get_posts_for_movie(movie_id):
@@ -76,7 +152,7 @@ class Movie(db.Model):
         return all_posts
 
 
-class Genre(db.Model):
+class Genre(Versioned, db.Model):
     __tablename__ = "genres"
 
     id = db.Column(db.Integer, primary_key=True)
@@ -90,14 +166,14 @@ class Genre(db.Model):
         return f"<Genre {self.name}, id # {self.id}>"
 
 
-class Role(db.Model):
+class Role(Versioned, db.Model):
     __tablename__ = "roles"
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), unique=True, nullable=False)
 
 
-class User(db.Model):
+class User(SoftDeleted, Versioned, db.Model):
     __tablename__ = "users"
 
     id = db.Column(db.Integer, primary_key=True)
@@ -108,9 +184,21 @@ class User(db.Model):
     bio = db.Column(db.String)
     location = db.Column(db.String)
 
-    posts = db.relationship("Post", backref="author", lazy="dynamic")
-
-    ratings = db.relationship("Rating", backref="user", lazy="dynamic")
+    posts = db.relationship(
+        "Post",
+        backref="author",
+        lazy="dynamic",
+        cascade="all, delete",
+        passive_deletes=True,
+    )
+
+    ratings = db.relationship(
+        "Rating",
+        backref="user",
+        lazy="dynamic",
+        cascade="all, delete",
+        passive_deletes=True,
+    )
 
     role_id = db.Column(db.Integer, db.ForeignKey("roles.id"))
     role = db.relationship("Role", backref="user", uselist=False)
@@ -124,11 +212,15 @@ class User(db.Model):
 
     @password_hash.setter
     def password_hash(self, password):
-        password_hash = bcrypt.generate_password_hash(password.encode("utf-8"))
+        with metrics.bcrypt_hash():
+            password_hash = bcrypt.generate_password_hash(password.encode("utf-8"))
         self._password_hash = password_hash.decode("utf-8")
 
     def authenticate(self, password):
-        return bcrypt.check_password_hash(self._password_hash, password.encode("utf-8"))
+        with metrics.bcrypt_hash():
+            return bcrypt.check_password_hash(
+                self._password_hash, password.encode("utf-8")
+            )
 
     def __init__(self, username, email, role_id=1):
         self.username = username
@@ -138,17 +230,53 @@ class User(db.Model):
     def __repr__(self):
         return f"<User {self.username}, id # {self.id}>"
 
+    # The user's posts and ratings, archived and hot, from every shard, for
+    # UserSchema
+
+    def _both_tiers(self, hot, cold):
+        import shards
 
-class Club(db.Model):
+        def read():
+            archived = db.session.scalars(
+                db.select(cold).where(cold.author_id == self.id).order_by(cold.id)
+            ).all()
+            return archived + hot.all()
+
+        return [obj for part in shards.scatter(read) for obj in part]
+
+    @property
+    def all_posts(self):
+        return self._both_tiers(self.posts, ArchivedPost)
+
+    @property
+    def all_ratings(self):
+        return self._both_tiers(self.ratings, ArchivedRating)
+
+
+class Club(SoftDeleted, Versioned, db.Model):
     __tablename__ = "clubs"
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, unique=True, nullable=False)
     description = db.Column(db.String)
 
-    members = db.relationship("User", secondary="club_members", backref="clubs")
+    members = db.relationship(
+        "User",
+        secondary="club_members",
+        backref=db.backref("clubs", passive_deletes=True),
+        passive_deletes=True,
+    )
 
-    screening_rooms = db.relationship("ScreeningRoom", backref="club")
+    screening_rooms = db.relationship(
+        "ScreeningRoom", backref="club", cascade="all, delete", passive_deletes=True
+    )
+
+    # Directory counters. Write endpoints keep them in step with
+    # single-statement "col = col + n" updates, so concurrent writers
+    # never lose an increment and the club list never has to count rows.
+    member_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    room_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    post_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
 
     def __init__(self, name, description=None):
         self.name = name
@@ -158,20 +286,115 @@ class Club(db.Model):
     def __repr__(self):
         return f"<Club {self.name}, id # {self.id}>"
 
-
-class ScreeningRoom(db.Model):
+    @classmethod
+    def adjust_counts(cls, club_id, members=0, rooms=0, posts=0):
+        values = {}
+        if members:
+            values["member_count"] = cls.member_count + members
+        if rooms:
+            values["room_count"] = cls.room_count + rooms
+        if posts:
+            values["post_count"] = cls.post_count + posts
+        if club_id is not None and values:
+            db.session.execute(db.update(cls).where(cls.id == club_id).values(values))
+
+    @classmethod
+    def adjust_post_count(cls, screening_room_id, delta):
+        # Posts belong to a club through their room
+        club_id = (
+            db.select(ScreeningRoom.club_id)
+            .where(ScreeningRoom.id == screening_room_id)
+            .scalar_subquery()
+        )
+        db.session.execute(
+            db.update(cls)
+            .where(cls.id == club_id)
+            .values(post_count=cls.post_count + delta)
+            .execution_options(synchronize_session=False)
+        )
+
+    @classmethod
+    def recount(cls, club_ids=None):
+        """Recompute club counters (all clubs by default) from the source tables."""
+        import shards
+
+        clubs = cls.__table__
+        rooms = ScreeningRoom.__table__
+        stmt = db.update(clubs)
+        if club_ids is not None:
+            stmt = stmt.where(clubs.c.id.in_(club_ids))
+        db.session.execute(
+            stmt.values(
+                member_count=db.select(db.func.count())
+                .where(club_members.c.club_id == clubs.c.id)
+                .scalar_subquery(),
+                room_count=db.select(db.func.count())
+                .where(rooms.c.club_id == clubs.c.id)
+                .scalar_subquery(),
+            )
+        )
+
+        # Posts are on the clubs' shards, so they are counted per room there
+        # and added up by club here. Archived posts stay in the count.
+        scope = db.select(clubs.c.id)
+        room_scope = db.select(rooms.c.id, rooms.c.club_id)
+        if club_ids is not None:
+            scope = scope.where(clubs.c.id.in_(club_ids))
+            room_scope = room_scope.where(rooms.c.club_id.in_(club_ids))
+        post_counts = dict.fromkeys(db.session.scalars(scope), 0)
+        room_clubs = dict(db.session.execute(room_scope).all())
+        for table in (Post.__table__, ArchivedPost.__table__):
+            per_room = db.select(table.c.screening_room_id, db.func.count()).group_by(
+                table.c.screening_room_id
+            )
+            if club_ids is not None:
+                per_room = per_room.where(table.c.screening_room_id.in_(room_clubs))
+            for rows in shards.scatter(lambda: db.session.execute(per_room).all()):
+                for room_id, count in rows:
+                    club_id = room_clubs.get(room_id)
+                    if club_id in post_counts:
+                        post_counts[club_id] += count
+        if post_counts:
+            db.session.execute(
+                db.update(clubs)
+                .where(clubs.c.id == db.bindparam("b_id"))
+                .values(post_count=db.bindparam("b_post_count")),
+                [
+                    {"b_id": club_id, "b_post_count": count}
+                    for club_id, count in post_counts.items()
+                ],
+            )
+
+
+class ScreeningRoom(SoftDeleted, Versioned, db.Model):
     __tablename__ = "screening_rooms"
 
     id = db.Column(db.Integer, primary_key=True)
 
-    club_id = db.Column(db.Integer, db.ForeignKey("clubs.id"))
-    movie_id = db.Column(db.Integer, db.ForeignKey("movies.id"))
+    club_id = db.Column(
+        db.Integer, db.ForeignKey("clubs.id", ondelete="CASCADE"), index=True
+    )
+    movie_id = db.Column(
+        db.Integer, db.ForeignKey("movies.id", ondelete="CASCADE"), index=True
+    )
 
     ## need to validate club and movie IDs exist
 
-    posts = db.relationship("Post", backref="screening_room", lazy="dynamic")
-
-    ratings = db.relationship("Rating", backref="screening_room", lazy="dynamic")
+    posts = db.relationship(
+        "Post",
+        backref="screening_room",
+        lazy="dynamic",
+        cascade="all, delete",
+        passive_deletes=True,
+    )
+
+    ratings = db.relationship(
+        "Rating",
+        backref="screening_room",
+        lazy="dynamic",
+        cascade="all, delete",
+        passive_deletes=True,
+    )
 
     def __init__(
         self,
@@ -185,13 +408,20 @@ class ScreeningRoom(db.Model):
         return f"<Screening Room id # {self.id}>"
 
 
-class Post(db.Model):
+class Post(Versioned, db.Model):
     __tablename__ = "posts"
+    # AUTOINCREMENT: SQLite would otherwise hand out the ids of archived
+    # rows again once the hot table empties
+    __table_args__ = {"info": {"sharded": True}, "sqlite_autoincrement": True}
 
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.String)
-    author_id = db.Column(db.Integer, db.ForeignKey("users.id"))
-    screening_room_id = db.Column(db.Integer, db.ForeignKey("screening_rooms.id"))
+    author_id = db.Column(
+        db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), index=True
+    )
+    screening_room_id = db.Column(
+        db.Integer, db.ForeignKey("screening_rooms.id", ondelete="CASCADE"), index=True
+    )
     timestamp = db.Column(db.DateTime, default=db.func.now())
 
     def __init__(self, content, author_id, screening_room_id):
@@ -207,12 +437,24 @@ class Post(db.Model):
     #     return self.timestamp.astimezone(pst).strftime("%Y-%m-%d %H:%M:%S %Z")
 
 
-class Rating(db.Model):
+class Rating(Versioned, db.Model):
     __tablename__ = "ratings"
+    __table_args__ = (
+        db.Index(
+            "ix_ratings_author_id_screening_room_id",
+            "author_id",
+            "screening_room_id",
+            unique=True,
+        ),
+        {"info": {"sharded": True}, "sqlite_autoincrement": True},
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    author_id = db.Column(db.Integer, db.ForeignKey("users.id"))
-    screening_room_id = db.Column(db.Integer, db.ForeignKey("screening_rooms.id"))
+    # author_id lookups use the unique index above
+    author_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"))
+    screening_room_id = db.Column(
+        db.Integer, db.ForeignKey("screening_rooms.id", ondelete="CASCADE"), index=True
+    )
     rating = db.Column(db.Integer)
     timestamp = db.Column(db.DateTime, default=db.func.now())
 
@@ -224,6 +466,472 @@ class Rating(db.Model):
     def __repr__(self):
         return f"<Rating id # {self.id}>"
 
+    @staticmethod
+    def upsert(author_id, screening_room_id, rating):
+        # One rating per user per room: a repeat vote overwrites the existing
+        # row in a single INSERT ... ON CONFLICT DO UPDATE statement.
+        # Returns (rating_id, created).
+        ratings = Rating.__table__
+        dialect = db.session.get_bind().dialect.name
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+
+        values = {}
+        if current_app.config["SHARDS"]:
+            values["id"] = IdSequence.take("ratings")
+        stmt = insert(ratings).values(
+            author_id=author_id,
+            screening_room_id=screening_room_id,
+            rating=rating,
+            version=1,
+            **values,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ratings.c.author_id, ratings.c.screening_room_id],
+            set_={
+                "rating": stmt.excluded.rating,
+                "timestamp": db.func.now(),
+                "updated_at": db.func.now(),
+                "version": ratings.c.version + 1,
+            },
+        ).returning(ratings.c.id, ratings.c.version)
+
+        row = db.session.execute(stmt).one()
+        # A new vote replaces one that has been archived
+        db.session.execute(
+            db.delete(ArchivedRating).where(
+                ArchivedRating.author_id == author_id,
+                ArchivedRating.screening_room_id == screening_room_id,
+            )
+        )
+        return row.id, row.version == 1
+
     # @property
     # def timestamp_pst(self):
     #     return self.timestamp.astimezone(pst).strftime("%Y-%m-%d %H:%M:%S %Z")
+
+
+class current_txid(FunctionElement):
+    # Id of the writing transaction on Postgres. Elsewhere writes are
+    # serialized, ids already follow commit order, and this is NULL.
+    type = db.BigInteger()
+    inherit_cache = True
+
+
+@compiles(current_txid)
+def _current_txid(element, compiler, **kw):
+    return "NULL"
+
+
+@compiles(current_txid, "postgresql")
+def _current_txid_postgresql(element, compiler, **kw):
+    return "txid_current()"
+
+
+class Change(db.Model):
+    __tablename__ = "changes"
+    __table_args__ = (
+        db.Index("ix_changes_entity_type_id", "entity_type", "id"),
+        db.Index("ix_changes_txid_id", "txid", "id"),
+    )
+
+    # The id of the last change a client has seen is its sync cursor
+    id = db.Column(db.Integer, primary_key=True)
+    entity_type = db.Column(db.String(20), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    # Second key for link rows, e.g. the user_id of a membership
+    ref_id = db.Column(db.Integer)
+    op = db.Column(db.String(10), nullable=False)
+    timestamp = db.Column(db.DateTime, default=db.func.now())
+    txid = db.Column(db.BigInteger, default=current_txid())
+
+    def __init__(self, entity_type, entity_id, op, ref_id=None):
+        self.entity_type = entity_type
+        self.entity_id = entity_id
+        self.op = op
+        self.ref_id = ref_id
+
+    def __repr__(self):
+        return f"<Change {self.op} {self.entity_type} {self.entity_id}, id # {self.id}>"
+
+    @staticmethod
+    def record(entity_type, entity_id, op, ref_id=None):
+        # Added to the current session so the change row commits (or rolls
+        # back) together with the write it describes.
+        db.session.add(Change(entity_type, entity_id, op, ref_id=ref_id))
+
+    @staticmethod
+    def record_many(entity_type, op, keys):
+        """Change.record for each (entity_id, ref_id) of keys, in one insert."""
+        rows = [
+            {
+                "entity_type": entity_type,
+                "entity_id": entity_id,
+                "op": op,
+                "ref_id": ref_id,
+            }
+            for entity_id, ref_id in keys
+        ]
+        if rows:
+            db.session.execute(db.insert(Change), rows)
+
+    @staticmethod
+    def since(cursor, entity_types=None, limit=500):
+        """Changes after cursor, or None when cursor's row has been pruned."""
+        query = Change.query
+        if db.session.get_bind(Change).dialect.name == "postgresql":
+            # Ids are drawn before commit, so concurrent writers commit out
+            # of id order. Go by writing transaction instead, and hold back
+            # everything from the oldest one still running: its rows could
+            # otherwise commit behind a cursor already handed out.
+            horizon = db.session.scalar(
+                db.select(db.func.txid_snapshot_xmin(db.func.txid_current_snapshot()))
+            )
+            query = query.filter(Change.txid < horizon)
+            order = (Change.txid, Change.id)
+        else:
+            order = (Change.id,)
+        if cursor:
+            last = db.session.get(Change, cursor)
+            if last is None:
+                return None
+            query = query.filter(
+                db.tuple_(*order) > db.tuple_(*(getattr(last, c.key) for c in order))
+            )
+        if entity_types:
+            query = query.filter(Change.entity_type.in_(entity_types))
+        return query.order_by(*order).limit(limit).all()
+
+    @staticmethod
+    def prune(before):
+        """Delete changes recorded before before; their cursors must resync."""
+        return db.session.execute(
+            db.delete(Change).where(Change.timestamp < before)
+        ).rowcount
+
+
+class MovieNeighbor(db.Model):
+    __tablename__ = "movie_neighbors"
+
+    # Top-K item-item similarities, rebuilt by recommendations.refresh()
+    movie_id = db.Column(
+        db.Integer, db.ForeignKey("movies.id", ondelete="CASCADE"), primary_key=True
+    )
+    neighbor_id = db.Column(
+        db.Integer,
+        db.ForeignKey("movies.id", ondelete="CASCADE"),
+        primary_key=True,
+        index=True,
+    )
+    score = db.Column(db.Float, nullable=False)
+
+    def __repr__(self):
+        return (
+            f"<MovieNeighbor {self.movie_id} -> {self.neighbor_id} ({self.score:.3f})>"
+        )
+
+
+class ClubSignature(db.Model):
+    __tablename__ = "club_signatures"
+
+    # MinHash signature of the club's member set, maintained by discovery.py
+    club_id = db.Column(
+        db.Integer, db.ForeignKey("clubs.id", ondelete="CASCADE"), primary_key=True
+    )
+    signature = db.Column(db.LargeBinary, nullable=False)
+
+
+class ClubBucket(db.Model):
+    __tablename__ = "club_lsh_buckets"
+    __table_args__ = (db.Index("ix_club_lsh_buckets_club_id", "club_id"),)
+
+    # One row per LSH band; the band number is mixed into the bucket hash
+    bucket = db.Column(db.BigInteger, primary_key=True)
+    club_id = db.Column(
+        db.Integer, db.ForeignKey("clubs.id", ondelete="CASCADE"), primary_key=True
+    )
+
+
+class ActivityBucket(db.Model):
+    __tablename__ = "activity_buckets"
+
+    # Hourly post/rating counts per movie or room, maintained by trending.py
+    entity_type = db.Column(db.String(10), primary_key=True)
+    entity_id = db.Column(db.Integer, primary_key=True)
+    hour = db.Column(db.DateTime, primary_key=True)
+    posts = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    ratings = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+
+class TrendingScore(db.Model):
+    __tablename__ = "trending_scores"
+    __table_args__ = (
+        db.Index(
+            "ix_trending_scores_entity_type_log_score", "entity_type", "log_score"
+        ),
+    )
+
+    entity_type = db.Column(db.String(10), primary_key=True)
+    entity_id = db.Column(db.Integer, primary_key=True)
+    # log of the decayed activity score, measured against trending.EPOCH
+    log_score = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.DateTime)
+
+
+class Job(db.Model):
+    __tablename__ = "jobs"
+    __table_args__ = (
+        db.Index("ix_jobs_status_run_at", "status", "run_at"),
+        # At most one queued/running job per dedupe key
+        db.Index(
+            "uq_jobs_active_dedupe_key",
+            "dedupe_key",
+            unique=True,
+            sqlite_where=db.text("status IN ('queued', 'running')"),
+            postgresql_where=db.text("status IN ('queued', 'running')"),
+        ),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text)
+    status = db.Column(db.String(10), nullable=False, default="queued")
+    dedupe_key = db.Column(db.String(200))
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+    started_at = db.Column(db.DateTime)
+    # Renewed while a worker runs the job; a stale one means a dead worker
+    heartbeat_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    locked_by = db.Column(db.String(100))
+    last_error = db.Column(db.Text)
+    result = db.Column(db.Text)
+
+    def __repr__(self):
+        return f"<Job {self.name} {self.status}, id # {self.id}>"
+
+
+class ArchivedPost(db.Model):
+    __tablename__ = "posts_archive"
+    __table_args__ = {"info": {"sharded": True}}
+
+    # Posts older than ARCHIVE_AFTER_DAYS, moved out of posts by archive.run()
+    # with their ids; read only
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    content = db.Column(db.String)
+    author_id = db.Column(
+        db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), index=True
+    )
+    screening_room_id = db.Column(
+        db.Integer, db.ForeignKey("screening_rooms.id", ondelete="CASCADE"), index=True
+    )
+    timestamp = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+
+    # Same attribute names as Post so PostSchema dumps either
+    author = db.relationship("User", viewonly=True)
+    screening_room = db.relationship("ScreeningRoom", viewonly=True)
+
+    def __repr__(self):
+        return f"<ArchivedPost id # {self.id}>"
+
+
+class ArchivedRating(db.Model):
+    __tablename__ = "ratings_archive"
+    __table_args__ = {"info": {"sharded": True}}
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    author_id = db.Column(
+        db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), index=True
+    )
+    screening_room_id = db.Column(
+        db.Integer, db.ForeignKey("screening_rooms.id", ondelete="CASCADE"), index=True
+    )
+    rating = db.Column(db.Integer)
+    timestamp = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+
+    author = db.relationship("User", viewonly=True)
+    screening_room = db.relationship("ScreeningRoom", viewonly=True)
+
+    def __repr__(self):
+        return f"<ArchivedRating id # {self.id}>"
+
+
+class ClubShard(db.Model):
+    __tablename__ = "club_shards"
+
+    # The SQLALCHEMY_BINDS key of the database holding the club's posts and
+    # ratings, NULL for the primary. Set once, by shards.place().
+    club_id = db.Column(
+        db.Integer, db.ForeignKey("clubs.id", ondelete="CASCADE"), primary_key=True
+    )
+    shard = db.Column(db.String(50))
+
+
+class IdSequence(db.Model):
+    __tablename__ = "id_sequences"
+    __table_args__ = {"info": {"sharded": True}}
+
+    # With SHARDS set, post and rating ids are handed out by a row in the
+    # database they are written to. Every database steps by the same amount
+    # from a different offset, so ids never collide across shards. Seeded
+    # by `flask shards init`.
+    name = db.Column(db.String(50), primary_key=True)
+    next_id = db.Column(db.Integer, nullable=False)
+    step = db.Column(db.Integer, nullable=False)
+
+    @classmethod
+    def take(cls, name, connection=None):
+        """Reserve the next id of sequence name in the routed database."""
+        table = cls.__table__
+        stmt = (
+            db.update(table)
+            .where(table.c.name == name)
+            .values(next_id=table.c.next_id + table.c.step)
+            .returning(table.c.next_id - table.c.step)
+        )
+        next_id = (connection or db.session).execute(stmt).scalar()
+        if next_id is None:
+            raise RuntimeError(
+                f"No '{name}' id sequence in this database; run `flask shards init`"
+            )
+        return next_id
+
+
+@event.listens_for(Post, "before_insert")
+@event.listens_for(Rating, "before_insert")
+def _take_sharded_id(mapper, connection, target):
+    # Each shard would otherwise autoincrement from the same ids
+    if target.id is None and current_app.config["SHARDS"]:
+        target.id = IdSequence.take(mapper.local_table.name, connection)
+
+
+class RequestProfile(db.Model):
+    __tablename__ = "request_profiles"
+
+    # Sampled stacks of one request in collapsed form, see profiler.py
+    id = db.Column(db.Integer, primary_key=True)
+    method = db.Column(db.String(10), nullable=False)
+    path = db.Column(db.String(500), nullable=False)
+    endpoint = db.Column(db.String(100), index=True)
+    status = db.Column(db.Integer)
+    duration_ms = db.Column(db.Float, nullable=False)
+    samples = db.Column(db.Integer, nullable=False)
+    stacks = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<RequestProfile {self.method} {self.path}, id # {self.id}>"
+
+
+def all_posts():
+    """Hot and archived posts as one subquery."""
+    columns = ("id", "content", "author_id", "screening_room_id", "timestamp")
+    return db.union_all(
+        db.select(*(getattr(Post, c) for c in columns)),
+        db.select(*(getattr(ArchivedPost, c) for c in columns)),
+    ).subquery("all_posts")
+
+
+def all_ratings():
+    """Hot and archived ratings as one subquery, for aggregates."""
+    columns = ("id", "author_id", "screening_room_id", "rating", "timestamp")
+    return db.union_all(
+        db.select(*(getattr(Rating, c) for c in columns)),
+        db.select(*(getattr(ArchivedRating, c) for c in columns)),
+    ).subquery("all_ratings")
+
+
+def _under_live_parents(cls):
+    # correlate_except keeps the subqueries whole when the outer query
+    # already joins rooms or users
+    rooms, users = ScreeningRoom.__table__, User.__table__
+    deleted_room = (
+        db.exists()
+        .where(rooms.c.id == cls.screening_room_id, rooms.c.deleted_at.is_not(None))
+        .correlate_except(rooms)
+    )
+    deleted_author = (
+        db.exists()
+        .where(users.c.id == cls.author_id, users.c.deleted_at.is_not(None))
+        .correlate_except(users)
+    )
+    return ~deleted_room & ~deleted_author
+
+
+DELETED_PARENTS_KEY = "deleted_parents"
+
+
+def _deleted_parents(session):
+    # Shards hold no rooms or users to check with EXISTS, so queries routed
+    # to one leave out the ids of deleted ones, read once per transaction
+    cached = session.info.get(DELETED_PARENTS_KEY)
+    if cached is None:
+        cached = tuple(
+            session.scalars(
+                db.select(model.id).where(model.deleted_at.is_not(None)),
+                execution_options={"include_deleted": True},
+            ).all()
+            for model in (ScreeningRoom, User)
+        )
+        session.info[DELETED_PARENTS_KEY] = cached
+    return cached
+
+
+def _live_parent_criteria(session):
+    if session.info.get(SHARD_KEY) is None:
+        return [
+            with_loader_criteria(model, _under_live_parents, include_aliases=True)
+            for model in (Post, Rating, ArchivedPost, ArchivedRating)
+        ]
+    room_ids, user_ids = _deleted_parents(session)
+    criteria = []
+    for model in (Post, Rating, ArchivedPost, ArchivedRating):
+        if room_ids:
+            criteria.append(
+                with_loader_criteria(
+                    model,
+                    db.or_(
+                        model.screening_room_id.is_(None),
+                        model.screening_room_id.not_in(room_ids),
+                    ),
+                )
+            )
+        if user_ids:
+            criteria.append(
+                with_loader_criteria(
+                    model,
+                    db.or_(model.author_id.is_(None), model.author_id.not_in(user_ids)),
+                )
+            )
+    return criteria
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _hide_deleted(execute_state):
+    # Soft-deleted movies, clubs, rooms and users, and the posts and ratings
+    # under them, are left out of ORM selects; deletes.purge() opts out with
+    # the include_deleted execution option.
+    if (
+        not execute_state.is_select
+        or execute_state.is_column_load
+        or execute_state.is_relationship_load
+        or execute_state.execution_options.get("include_deleted", False)
+    ):
+        return
+    execute_state.statement = execute_state.statement.options(
+        with_loader_criteria(
+            SoftDeleted, lambda cls: cls.deleted_at.is_(None), include_aliases=True
+        ),
+        *_live_parent_criteria(execute_state.session),
+    )
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_deleted_parents(session, *args):
+    session.info.pop(DELETED_PARENTS_KEY, None)
@@ -0,0 +1,175 @@
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from flask import current_app, g, request
+from sqlalchemy import delete, insert, select
+
+from models import db, RequestProfile
+
+# Sampling request profiler
+#
+# A request is profiled when an admin sends the PROFILE_HEADER header, or
+# at random for PROFILE_SAMPLE_RATE of requests. While it runs, one sampler
+# thread per process reads the request thread's stack every
+# PROFILE_INTERVAL seconds. The stacks are stored in the request_profiles
+# table in collapsed form ("outer;inner;leaf count" per line), which
+# flamegraph.pl, speedscope and inferno read directly.
+#
+# With the header absent and the rate at 0, the only cost per request is
+# a header lookup; the sampler thread starts with the first profile.
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+class Sampler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stacks = {}
+        self._thread = None
+        self._wake = threading.Event()
+        self.interval = 0.005
+
+    def start(self, thread_id):
+        with self._lock:
+            self._stacks[thread_id] = Counter()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="profiler", daemon=True
+                )
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self, thread_id):
+        with self._lock:
+            return self._stacks.pop(thread_id, None)
+
+    def _run(self):
+        while True:
+            if not self._stacks:
+                # Idle until the next profiled request
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, stacks in self._stacks.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stacks[collapse(frame)] += 1
+            del frames
+            time.sleep(self.interval)
+
+
+sampler = Sampler()
+
+
+def _location(path):
+    if path.startswith(ROOT + os.sep):
+        return os.path.relpath(path, ROOT)
+    marker = "site-packages" + os.sep
+    if marker in path:
+        return path.split(marker, 1)[1]
+    return os.path.basename(path)
+
+
+def collapse(frame):
+    """frame's stack as one collapsed line, outermost frame first."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(
+            f"{code.co_name} ({_location(code.co_filename)}:{code.co_firstlineno})"
+        )
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def wanted(is_admin):
+    """Whether to profile this request; is_admin() is only called for the header."""
+    config = current_app.config
+    if request.headers.get(config["PROFILE_HEADER"]):
+        return is_admin()
+    rate = config["PROFILE_SAMPLE_RATE"]
+    return rate > 0 and random.random() < rate
+
+
+def start():
+    sampler.interval = current_app.config["PROFILE_INTERVAL"]
+    g.profile_started = time.perf_counter()
+    sampler.start(threading.get_ident())
+
+
+def stop(response):
+    """Store the request's samples, if it was profiled, and name the profile."""
+    started = g.pop("profile_started", None)
+    if started is None:
+        return response
+    stacks = sampler.stop(threading.get_ident())
+    duration_ms = (time.perf_counter() - started) * 1000
+    profile_id = save(
+        method=request.method,
+        path=request.full_path.rstrip("?"),
+        endpoint=request.endpoint,
+        status=response.status_code,
+        duration_ms=round(duration_ms, 2),
+        samples=sum(stacks.values()),
+        stacks="\n".join(f"{stack} {n}" for stack, n in stacks.most_common()),
+        created_at=datetime.utcnow(),
+    )
+    response.headers["X-Profile-Id"] = str(profile_id)
+    return response
+
+
+def discard():
+    # A request that failed before stop() still has to leave the sampler
+    if g.pop("profile_started", None) is not None:
+        sampler.stop(threading.get_ident())
+
+
+def save(**values):
+    # Own transaction, on the primary: the request's session may be
+    # committed, rolled back or routed to a shard by now
+    keep = current_app.config["PROFILE_KEEP"]
+    with db.engine.begin() as connection:
+        profile_id = connection.execute(
+            insert(RequestProfile).values(**values)
+        ).inserted_primary_key[0]
+        connection.execute(
+            delete(RequestProfile).where(RequestProfile.id <= profile_id - keep)
+        )
+    return profile_id
+
+
+def describe(profile):
+    return {
+        "id": profile.id,
+        "method": profile.method,
+        "path": profile.path,
+        "endpoint": profile.endpoint,
+        "status": profile.status,
+        "duration_ms": profile.duration_ms,
+        "samples": profile.samples,
+        "created_at": profile.created_at.isoformat(),
+    }
+
+
+def recent(endpoint=None, limit=50):
+    stmt = select(RequestProfile).order_by(RequestProfile.id.desc()).limit(limit)
+    if endpoint:
+        stmt = stmt.where(RequestProfile.endpoint == endpoint)
+    return db.session.scalars(stmt).all()
+
+
+def merged(profiles):
+    """Collapsed stacks of several profiles summed into one flame graph."""
+    totals = Counter()
+    for profile in profiles:
+        for line in (profile.stacks or "").splitlines():
+            stack, _, count = line.rpartition(" ")
+            totals[stack] += int(count)
+    return "\n".join(f"{stack} {n}" for stack, n in totals.most_common())
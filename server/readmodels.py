@@ -0,0 +1,227 @@
+from datetime import datetime
+from typing import NamedTuple, Optional, Tuple
+
+from sqlalchemy import and_, select
+
+from models import (
+    db,
+    Movie,
+    Genre,
+    User,
+    Club,
+    ScreeningRoom,
+    Post,
+    Rating,
+    ArchivedPost,
+    ArchivedRating,
+    movie_genre,
+)
+import shards
+
+# Read models
+#
+# Read-only listings build named tuples straight from selected columns
+# instead of loading mapped instances: no identity map, no attribute
+# instrumentation, no per-object __dict__. Their fields carry the model's
+# attribute names, so PostSchema, RatingSchema and MovieSchema (and their
+# compiled dumpers) dump them as they would the models. The related rows a
+# schema nests are looked up with one IN query per relationship per page,
+# in the primary database, and go through the soft-delete filter like the
+# lazy loads they replace.
+
+
+class UserRef(NamedTuple):
+    id: int
+    username: str
+
+
+class MovieRef(NamedTuple):
+    id: int
+    title: str
+
+
+class RoomRef(NamedTuple):
+    id: int
+    movie: Optional[MovieRef]
+
+
+class ClubRef(NamedTuple):
+    id: int
+    name: str
+
+
+class RoomClubRef(NamedTuple):
+    id: int
+    club: Optional[ClubRef]
+
+
+class GenreRef(NamedTuple):
+    name: str
+
+
+class PostRead(NamedTuple):
+    id: int
+    content: str
+    author_id: int
+    author: Optional[UserRef]
+    screening_room_id: int
+    screening_room: Optional[RoomRef]
+    timestamp: datetime
+
+
+class RatingRead(NamedTuple):
+    # No author: Rating's relationship is named user, which RatingSchema
+    # does not dump
+    id: int
+    rating: int
+    author_id: int
+    screening_room_id: int
+    screening_room: Optional[RoomRef]
+    timestamp: datetime
+
+
+class MovieRead(NamedTuple):
+    id: int
+    title: str
+    release_date: str
+    poster_image: str
+    popularity: int
+    genres: Tuple[GenreRef, ...]
+    screening_rooms: Tuple[RoomClubRef, ...]
+
+
+class ClubSummary(NamedTuple):
+    id: int
+    name: str
+    description: str
+    member_count: int
+
+
+# Columns selected per model, in read model order minus the nested fields
+COLUMNS = {
+    Post: ("id", "content", "author_id", "screening_room_id", "timestamp"),
+    ArchivedPost: ("id", "content", "author_id", "screening_room_id", "timestamp"),
+    Rating: ("id", "rating", "author_id", "screening_room_id", "timestamp"),
+    ArchivedRating: ("id", "rating", "author_id", "screening_room_id", "timestamp"),
+    Movie: ("id", "title", "release_date", "poster_image", "popularity"),
+    Club: ("id", "name", "description", "member_count"),
+}
+
+
+def columns(model):
+    return [getattr(model, name) for name in COLUMNS[model]]
+
+
+def _users(ids):
+    if not ids:
+        return {}
+    rows = db.session.execute(select(User.id, User.username).where(User.id.in_(ids)))
+    return {row.id: UserRef(*row) for row in rows}
+
+
+def _rooms(ids):
+    if not ids:
+        return {}
+    movies = Movie.__table__
+    rows = db.session.execute(
+        select(ScreeningRoom.id, movies.c.id, movies.c.title)
+        .outerjoin(
+            movies,
+            and_(movies.c.id == ScreeningRoom.movie_id, movies.c.deleted_at.is_(None)),
+        )
+        .where(ScreeningRoom.id.in_(ids))
+    )
+    return {
+        room_id: RoomRef(
+            room_id, None if movie_id is None else MovieRef(movie_id, title)
+        )
+        for room_id, movie_id, title in rows
+    }
+
+
+def posts(rows):
+    """PostReads for rows of columns(Post) or columns(ArchivedPost)."""
+    # Authors and rooms live in the primary, whichever shard rows came from
+    with shards.using(None):
+        authors = _users({row.author_id for row in rows})
+        rooms = _rooms({row.screening_room_id for row in rows})
+    return [
+        PostRead(
+            row.id,
+            row.content,
+            row.author_id,
+            authors.get(row.author_id),
+            row.screening_room_id,
+            rooms.get(row.screening_room_id),
+            row.timestamp,
+        )
+        for row in rows
+    ]
+
+
+def ratings(rows):
+    """RatingReads for rows of columns(Rating) or columns(ArchivedRating)."""
+    with shards.using(None):
+        rooms = _rooms({row.screening_room_id for row in rows})
+    return [
+        RatingRead(
+            row.id,
+            row.rating,
+            row.author_id,
+            row.screening_room_id,
+            rooms.get(row.screening_room_id),
+            row.timestamp,
+        )
+        for row in rows
+    ]
+
+
+BUILDERS = {
+    Post: posts,
+    ArchivedPost: posts,
+    Rating: ratings,
+    ArchivedRating: ratings,
+}
+
+
+def build(model, rows):
+    return BUILDERS[model](rows)
+
+
+def movies(*where, limit=None):
+    """MovieReads of the live movies matching where."""
+    stmt = select(*columns(Movie)).where(*where).limit(limit)
+    rows = db.session.execute(stmt).all()
+    ids = [row.id for row in rows]
+    genres = {movie_id: [] for movie_id in ids}
+    rooms = {movie_id: [] for movie_id in ids}
+    if ids:
+        for movie_id, name in db.session.execute(
+            select(movie_genre.c.movie_id, Genre.name)
+            .join(Genre, Genre.id == movie_genre.c.genre_id)
+            .where(movie_genre.c.movie_id.in_(ids))
+        ):
+            genres[movie_id].append(GenreRef(name))
+        clubs = Club.__table__
+        for room_id, movie_id, club_id, name in db.session.execute(
+            select(ScreeningRoom.id, ScreeningRoom.movie_id, clubs.c.id, clubs.c.name)
+            .outerjoin(
+                clubs,
+                and_(clubs.c.id == ScreeningRoom.club_id, clubs.c.deleted_at.is_(None)),
+            )
+            .where(ScreeningRoom.movie_id.in_(ids))
+            .order_by(ScreeningRoom.id)
+        ):
+            club = None if club_id is None else ClubRef(club_id, name)
+            rooms[movie_id].append(RoomClubRef(room_id, club))
+    return [
+        MovieRead(*row, tuple(genres[row.id]), tuple(rooms[row.id])) for row in rows
+    ]
+
+
+def club_summaries(ids):
+    """ClubSummaries of the live clubs among ids, by id."""
+    if not ids:
+        return {}
+    rows = db.session.execute(select(*columns(Club)).where(Club.id.in_(ids)))
+    return {row.id: ClubSummary(*row) for row in rows}
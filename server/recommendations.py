@@ -0,0 +1,279 @@
+import os
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import select, func, delete, insert
+
+from models import db, ScreeningRoom, MovieNeighbor, all_ratings
+import shards
+
+# Item-item collaborative filtering
+#
+# refresh() builds a sparse user x movie ratings matrix, centers each
+# movie's column on its mean and compares movies by cosine similarity,
+# shrunk towards zero when few users rated both. Only the top NEIGHBORS_K
+# positive neighbors of each movie are stored in movie_neighbors, so a
+# user's recommendations are one indexed lookup over the movies they rated.
+#
+# The matrix from the previous run is kept next to the database. A refresh
+# diffs against it and recomputes only the neighbor lists that can have
+# changed: those of movies whose ratings changed, movies that list one of
+# them, and movies a changed movie now beats the weakest neighbor of.
+# SciPy is only needed here, not on the serving path.
+
+NEIGHBORS_K = 20
+SHRINKAGE = 5.0
+BLOCK_SIZE = 512
+RATING_MIDPOINT = 3
+
+
+def state_path():
+    return current_app.config.get("RECOMMENDATIONS_STATE_PATH") or os.path.join(
+        current_app.instance_path, "recommendations.npz"
+    )
+
+
+def load_matrix():
+    """Mean rating per (user, movie) as a CSC matrix indexed by raw ids."""
+    import numpy as np
+    from scipy import sparse
+
+    ratings = all_ratings()
+    stmt = select(
+        ratings.c.author_id, ratings.c.screening_room_id, ratings.c.rating
+    ).where(ratings.c.author_id.is_not(None), ratings.c.rating.is_not(None))
+    room_movies = {
+        room_id: movie_id
+        for room_id, (_, movie_id) in shards.rooms().items()
+        if movie_id is not None
+    }
+    rows = [
+        (author_id, room_movies[room_id], rating)
+        for part in shards.scatter(lambda: db.session.execute(stmt).all())
+        for author_id, room_id, rating in part
+        if room_id in room_movies
+    ]
+    user_ids, movie_ids, ratings = zip(*rows) if rows else ((), (), ())
+    users = np.asarray(user_ids, dtype=np.int64)
+    movies = np.asarray(movie_ids, dtype=np.int64)
+    ratings = np.asarray(ratings, dtype=np.float64)
+    shape = (users.max(initial=0) + 1, movies.max(initial=0) + 1)
+
+    # A movie screened in several rooms can be rated once per room, and
+    # the CSC conversion sums those duplicates; divide by their count.
+    sums = sparse.csc_matrix((ratings, (users, movies)), shape=shape)
+    counts = sparse.csc_matrix((np.ones_like(ratings), (users, movies)), shape=shape)
+    sums.data /= counts.data
+    return sums
+
+
+def item_vectors(X):
+    """Mean-centered, unit-length movie columns plus a rated/not-rated mask."""
+    import numpy as np
+
+    counts = np.diff(X.indptr)
+    sums = np.asarray(X.sum(axis=0)).ravel()
+    means = np.divide(sums, counts, out=np.zeros_like(sums), where=counts > 0)
+
+    V = X.copy()
+    V.data -= np.repeat(means, counts)
+    norms = np.sqrt(np.asarray(V.multiply(V).sum(axis=0)).ravel())
+    scale = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    V.data *= np.repeat(scale, counts)
+    V.eliminate_zeros()
+
+    P = X.copy()
+    P.data[:] = 1.0
+    return V, P
+
+
+def similarity_block(V, P, cols):
+    """Shrunk cosine similarity of every movie against the movies in cols."""
+    S = V.T @ V[:, cols]
+    co_raters = P.T @ P[:, cols]
+    co_raters.data = co_raters.data / (co_raters.data + SHRINKAGE)
+    return S.multiply(co_raters).tocsc()
+
+
+def top_neighbors(S, cols, k=NEIGHBORS_K):
+    import numpy as np
+
+    neighbors = {}
+    for j, movie_id in enumerate(cols):
+        start, end = S.indptr[j], S.indptr[j + 1]
+        ids, scores = S.indices[start:end], S.data[start:end]
+        keep = (scores > 0) & (ids != movie_id)
+        ids, scores = ids[keep], scores[keep]
+        if len(ids) > k:
+            top = np.argpartition(-scores, k)[:k]
+            ids, scores = ids[top], scores[top]
+        order = np.lexsort((ids, -scores))
+        neighbors[int(movie_id)] = list(
+            zip(ids[order].tolist(), scores[order].tolist())
+        )
+    return neighbors
+
+
+def _blocks(values, size=BLOCK_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start : start + size]
+
+
+def _neighbor_floors(n_movies):
+    """Score a movie must beat to enter each full neighbor list (0 if not full)."""
+    import numpy as np
+
+    floors = np.zeros(n_movies)
+    rows = db.session.execute(
+        select(MovieNeighbor.movie_id, func.min(MovieNeighbor.score))
+        .group_by(MovieNeighbor.movie_id)
+        .having(func.count() >= NEIGHBORS_K)
+    )
+    for movie_id, floor in rows:
+        if movie_id < n_movies:
+            floors[movie_id] = floor
+    return floors
+
+
+def _listing(movie_ids):
+    listing = set()
+    for block in _blocks(movie_ids):
+        listing.update(
+            db.session.scalars(
+                select(MovieNeighbor.movie_id)
+                .where(MovieNeighbor.neighbor_id.in_(block))
+                .distinct()
+            )
+        )
+    return listing
+
+
+def _replace_neighbors(neighbors):
+    for block in _blocks(list(neighbors)):
+        db.session.execute(
+            delete(MovieNeighbor).where(MovieNeighbor.movie_id.in_(block))
+        )
+    rows = [
+        {"movie_id": movie_id, "neighbor_id": neighbor_id, "score": score}
+        for movie_id, scored in neighbors.items()
+        for neighbor_id, score in scored
+    ]
+    if rows:
+        db.session.execute(insert(MovieNeighbor), rows)
+    return len(rows)
+
+
+def refresh(full=False):
+    """Bring movie_neighbors up to date with the ratings table."""
+    import numpy as np
+    from scipy import sparse
+
+    X = load_matrix()
+    path = state_path()
+    previous = None
+    if not full and os.path.exists(path):
+        previous = sparse.load_npz(path).tocsc()
+
+    if previous is None:
+        rated = np.flatnonzero(np.diff(X.indptr))
+        dirty = affected = rated
+    else:
+        shape = tuple(max(a, b) for a, b in zip(X.shape, previous.shape))
+        X.resize(shape)
+        previous.resize(shape)
+        diff = (X - previous).tocsc()
+        diff.eliminate_zeros()
+        dirty = np.flatnonzero(np.diff(diff.indptr))
+
+    V, P = item_vectors(X)
+
+    if previous is not None:
+        affected = set(dirty.tolist()) | _listing(dirty.tolist())
+        floors = _neighbor_floors(X.shape[1])
+        for block in _blocks(dirty):
+            best = similarity_block(V, P, block).max(axis=1).toarray().ravel()
+            affected.update(np.flatnonzero(best > floors).tolist())
+        affected = np.array(sorted(affected), dtype=np.int64)
+
+    neighbors = {}
+    for block in _blocks(affected):
+        neighbors.update(top_neighbors(similarity_block(V, P, block), block))
+
+    if previous is None:
+        db.session.execute(delete(MovieNeighbor))
+    stored = _replace_neighbors(neighbors)
+    db.session.commit()
+
+    # Only advance the diff baseline once the neighbors it describes are in
+    tmp_path = path + ".tmp.npz"
+    sparse.save_npz(tmp_path, X.tocsc())
+    os.replace(tmp_path, path)
+
+    return {
+        "full": previous is None,
+        "changed_movies": len(dirty),
+        "updated_movies": len(neighbors),
+        "stored_neighbors": stored,
+    }
+
+
+def recommend(user_id, limit=20):
+    """(movie_id, score) pairs for movies near the ones user_id rated well."""
+    ratings = all_ratings()
+    stmt = select(ratings.c.screening_room_id, ratings.c.rating).where(
+        ratings.c.author_id == user_id, ratings.c.rating.is_not(None)
+    )
+    # The user's ratings can be on any shard; their rooms name the movies
+    votes = [
+        row
+        for part in shards.scatter(lambda: db.session.execute(stmt).all())
+        for row in part
+    ]
+    room_movies = dict(
+        db.session.execute(
+            select(ScreeningRoom.id, ScreeningRoom.movie_id).where(
+                ScreeningRoom.id.in_(list({room_id for room_id, _ in votes}))
+            )
+        ).all()
+    )
+    by_movie = {}
+    for room_id, rating in votes:
+        movie_id = room_movies.get(room_id)
+        if movie_id is not None:
+            by_movie.setdefault(movie_id, []).append(rating)
+    rated = {movie_id: sum(r) / len(r) for movie_id, r in by_movie.items()}
+    if not rated:
+        return []
+
+    # Ratings below the midpoint push similar movies down
+    scores = {}
+    for movie_id, neighbor_id, similarity in db.session.execute(
+        select(
+            MovieNeighbor.movie_id, MovieNeighbor.neighbor_id, MovieNeighbor.score
+        ).where(MovieNeighbor.movie_id.in_(list(rated)))
+    ):
+        if neighbor_id not in rated:
+            scores[neighbor_id] = scores.get(neighbor_id, 0.0) + similarity * (
+                rated[movie_id] - RATING_MIDPOINT
+            )
+    ranked = sorted(
+        ((neighbor_id, score) for neighbor_id, score in scores.items() if score > 0),
+        key=lambda pair: (-pair[1], pair[0]),
+    )
+    return ranked[:limit]
+
+
+cli = AppGroup("recommendations", help="Maintain the item-item recommendation model.")
+
+
+@cli.command("refresh")
+@click.option("--full", is_flag=True, help="Recompute every movie's neighbors.")
+def refresh_command(full):
+    stats = refresh(full=full)
+    click.echo(
+        f"{'Full' if stats['full'] else 'Incremental'} refresh: "
+        f"{stats['changed_movies']} movies changed, "
+        f"{stats['updated_movies']} neighbor lists rewritten, "
+        f"{stats['stored_neighbors']} neighbor rows stored"
+    )
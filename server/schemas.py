@@ -1,7 +1,13 @@
+from functools import lru_cache
+
+from flask import current_app
+
 from models import db, Movie, Genre, User, Role, Club, ScreeningRoom, Post, Rating
 from config import ma
+import timing
 
-from marshmallow import Schema, fields, validate, ValidationError
+from marshmallow import Schema, fields, validate, ValidationError, missing
+from marshmallow.decorators import PRE_DUMP, POST_DUMP
 
 # Marshmallow schemas
 
@@ -47,11 +53,22 @@ class UserSchema(ma.SQLAlchemySchema):
     bio = ma.auto_field()
     location = ma.auto_field()
     clubs = fields.Nested("ClubSchema", many=True)
+    # Read from every shard
     posts = fields.Nested(
-        "PostSchema", many=True, exclude=("author",), cascade="all,delete-orphan"
+        "PostSchema",
+        attribute="all_posts",
+        many=True,
+        exclude=("author",),
+        cascade="all,delete-orphan",
+        dump_only=True,
     )
     ratings = fields.Nested(
-        "RatingSchema", many=True, exclude=("author",), cascade="all,delete-orphan"
+        "RatingSchema",
+        attribute="all_ratings",
+        many=True,
+        exclude=("author",),
+        cascade="all,delete-orphan",
+        dump_only=True,
     )
     role = fields.Nested(
         "RoleSchema",
@@ -226,3 +243,134 @@ class RatingPostSchema(Schema):
         required=True,
         error_messages={"required": "Screening room ID is required"},
     )
+
+
+# Schema registry
+#
+# Building a schema resolves string-referenced nested schemas through the
+# class registry and recomputes only/exclude field sets, so dump-only
+# schemas are built once per (class, many, only, exclude) and shared.
+# Schemas used for load(instance=...) keep per-request instances, since
+# loading stores the target instance on the schema.
+
+
+def _field_set(names):
+    return tuple(sorted(names)) if names else ()
+
+
+@lru_cache(maxsize=None)
+def _cached_schema(schema_cls, many, only, exclude):
+    return schema_cls(many=many, only=only or None, exclude=exclude)
+
+
+def get_schema(schema_cls, many=False, only=None, exclude=None):
+    return _cached_schema(schema_cls, many, _field_set(only), _field_set(exclude))
+
+
+# Compiled dump path
+#
+# For the hot, mostly flat schemas below, the field loop of Schema.dump is
+# unrolled into generated Python source: one attribute read per field,
+# with nested schemas compiled the same way. Output matches Schema.dump.
+
+FAST_DUMP_SCHEMAS = (PostSchema, RatingSchema, MovieSchema)
+
+
+def _attribute_reads(model, path, indent):
+    # Follow "a.b.c" like marshmallow's get_value: an attribute that is
+    # absent, or a None hop along the way, leaves the key out entirely.
+    if len(path) == 1 and model is not None:
+        if not hasattr(model, path[0]):
+            return None, indent
+        return [f"{indent}v = obj.{path[0]}"], indent
+
+    lines = []
+    current = "obj"
+    for depth, part in enumerate(path[:-1]):
+        hop = f"_h{depth}"
+        lines.append(f"{indent}{hop} = getattr({current}, {part!r}, None)")
+        lines.append(f"{indent}if {hop} is not None:")
+        indent += "    "
+        current = hop
+    lines.append(f"{indent}v = getattr({current}, {path[-1]!r}, _missing)")
+    lines.append(f"{indent}if v is not _missing:")
+    return lines, indent + "    "
+
+
+def _compile_schema(schema, helpers):
+    if schema._has_processors(PRE_DUMP) or schema._has_processors(POST_DUMP):
+        name = f"_schema{len(helpers)}"
+        helpers[name] = lambda obj: schema.dump(obj, many=False)
+        return name
+
+    name = f"_dump{len(helpers)}"
+    helpers[name] = None  # reserve the slot before recursing
+    model = getattr(schema.opts, "model", None)
+    lines = [f"def {name}(obj):", "    out = {}"]
+
+    for attr_name, field in schema.dump_fields.items():
+        key = field.data_key if field.data_key is not None else attr_name
+        path = (field.attribute or attr_name).split(".")
+        reads, indent = _attribute_reads(model, path, "    ")
+        if reads is None or isinstance(field, (fields.Method, fields.Function)):
+            # Computed or not a model attribute: let the field read its value
+            field_name = f"_field{len(helpers)}"
+            helpers[field_name] = field
+            helpers[f"{field_name}_get"] = schema.get_attribute
+            lines.append(
+                f"    v = {field_name}.serialize({attr_name!r}, obj, "
+                f"accessor={field_name}_get)"
+            )
+            lines.append("    if v is not _missing:")
+            lines.append(f"        out[{key!r}] = v")
+            continue
+        lines.extend(reads)
+
+        if isinstance(field, fields.Nested):
+            nested = _compile_schema(field.schema, helpers)
+            if field.many:
+                value = f"[{nested}(item) for item in v]"
+            else:
+                value = f"{nested}(v)"
+            lines.append(f"{indent}out[{key!r}] = None if v is None else {value}")
+        elif isinstance(field, fields.DateTime) and (field.format or "iso") == "iso":
+            lines.append(f"{indent}out[{key!r}] = None if v is None else v.isoformat()")
+        elif type(field) is fields.Integer and not field.as_string:
+            lines.append(f"{indent}out[{key!r}] = None if v is None else int(v)")
+        elif type(field) is fields.String:
+            lines.append(f"{indent}out[{key!r}] = None if v is None else str(v)")
+        else:
+            field_name = f"_field{len(helpers)}"
+            helpers[field_name] = field
+            lines.append(
+                f"{indent}out[{key!r}] = {field_name}._serialize(v, {attr_name!r}, obj)"
+            )
+
+    lines.append("    return out")
+    helpers["_missing"] = missing
+    exec(compile("\n".join(lines), f"<dump {type(schema).__name__}>", "exec"), helpers)
+    return name
+
+
+def compile_dumper(schema):
+    helpers = {}
+    dump_one = helpers[_compile_schema(schema, helpers)]
+    if schema.many:
+        return lambda objs: [dump_one(obj) for obj in objs]
+    return dump_one
+
+
+@lru_cache(maxsize=None)
+def _cached_dumper(schema_cls, many, only, exclude, fast):
+    schema = _cached_schema(schema_cls, many, only, exclude)
+    if fast and schema_cls in FAST_DUMP_SCHEMAS:
+        return compile_dumper(schema)
+    return schema.dump
+
+
+def get_dumper(schema_cls, many=False, only=None, exclude=None):
+    fast = current_app.config.get("SCHEMA_FAST_DUMP", True)
+    dumper = _cached_dumper(
+        schema_cls, many, _field_set(only), _field_set(exclude), fast
+    )
+    return timing.timed("dump", dumper)
@@ -0,0 +1,276 @@
+import base64
+import json
+import re
+
+from sqlalchemy import DateTime, bindparam, select, text
+
+from models import db, User, ScreeningRoom, Post
+import shards
+
+# Full-text search over post content
+#
+# SQLite keeps an FTS5 table (posts_fts) keyed by post id; Postgres keeps a
+# tsvector column (posts.search_vector) with a GIN index. Either way the
+# index sits next to the posts it covers, in the primary or in the post's
+# shard, and is written in the same transaction as the post itself by the
+# Posts/PostsById handlers. create_index() adds it to a new shard.
+#
+# A search runs on every shard that can hold a match and merges the pages
+# by (rank, id). Rooms and users live in the primary only, so the club and
+# movie filters and the soft-delete checks are resolved there first and
+# passed to each shard as room and user ids. Ranks come from each
+# database's own statistics, so they are only roughly comparable across
+# shards.
+
+SNIPPET_START = "<mark>"
+SNIPPET_END = "</mark>"
+SNIPPET_TOKENS = 16
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+
+# Statements on the index go where session routes posts
+POSTS_BIND = {"mapper": Post}
+
+
+class SearchQueryError(ValueError):
+    pass
+
+
+def _dialect():
+    return db.session.get_bind(**POSTS_BIND).dialect.name
+
+
+def _execute(stmt, params=None):
+    return db.session.execute(stmt, params, bind_arguments=POSTS_BIND)
+
+
+def create_index(connection):
+    """Create the search index of the posts in connection's database."""
+    if connection.dialect.name == "postgresql":
+        connection.exec_driver_sql(
+            "ALTER TABLE posts ADD COLUMN IF NOT EXISTS search_vector tsvector"
+        )
+        connection.exec_driver_sql(
+            "CREATE INDEX IF NOT EXISTS ix_posts_search_vector "
+            "ON posts USING GIN (search_vector)"
+        )
+    else:
+        connection.exec_driver_sql(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(content)"
+        )
+
+
+def index_post(post_id, content):
+    if _dialect() == "postgresql":
+        _execute(
+            text(
+                "UPDATE posts SET search_vector = "
+                "to_tsvector('english', coalesce(:content, '')) WHERE id = :id"
+            ),
+            {"id": post_id, "content": content},
+        )
+        return
+    _execute(text("DELETE FROM posts_fts WHERE rowid = :id"), {"id": post_id})
+    _execute(
+        text("INSERT INTO posts_fts (rowid, content) VALUES (:id, :content)"),
+        {"id": post_id, "content": content or ""},
+    )
+
+
+def remove_post(post_id):
+    remove_posts([post_id])
+
+
+def remove_posts(post_ids):
+    # On Postgres the tsvector lives on the post row and goes with it
+    if post_ids and _dialect() != "postgresql":
+        _execute(
+            text("DELETE FROM posts_fts WHERE rowid IN :ids").bindparams(
+                bindparam("ids", expanding=True)
+            ),
+            {"ids": list(post_ids)},
+        )
+
+
+def _rebuild_shard_index():
+    if _dialect() == "postgresql":
+        _execute(
+            text(
+                "UPDATE posts SET search_vector = "
+                "to_tsvector('english', coalesce(content, ''))"
+            )
+        )
+        return
+    _execute(text("DELETE FROM posts_fts"))
+    _execute(
+        text(
+            "INSERT INTO posts_fts (rowid, content) "
+            "SELECT id, coalesce(content, '') FROM posts"
+        )
+    )
+
+
+def rebuild_index():
+    shards.scatter(_rebuild_shard_index)
+
+
+def encode_cursor(rank, post_id):
+    raw = json.dumps([rank, post_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor):
+    try:
+        rank, post_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return float(rank), int(post_id)
+    except (ValueError, TypeError):
+        raise SearchQueryError("Invalid cursor")
+
+
+def _fts5_query(q):
+    # Quote every term so user input can never be parsed as FTS5 syntax;
+    # adjacent quoted terms are ANDed together.
+    terms = re.findall(r"\w+", q or "")
+    if not terms:
+        raise SearchQueryError("Search query must contain at least one word")
+    return " ".join(f'"{term}"' for term in terms)
+
+
+def _search_sql(dialect, params):
+    if dialect == "postgresql":
+        select_sql = f"""
+            SELECT p.id, p.author_id, p.screening_room_id, p.timestamp,
+                   ts_headline('english', p.content, query,
+                       'StartSel={SNIPPET_START}, StopSel={SNIPPET_END}, '
+                       'MaxWords={SNIPPET_TOKENS}, MinWords=5') AS snippet,
+                   (-ts_rank_cd(p.search_vector, query))::float8 AS rank
+            FROM posts p
+            CROSS JOIN plainto_tsquery('english', :q) AS query
+            WHERE p.search_vector @@ query
+        """
+        # ts_rank_cd is a real; compare as the double the cursor carries, or
+        # rows tied with the cursor row are skipped or repeated
+        rank_expr = "(-ts_rank_cd(p.search_vector, query))::float8"
+    else:
+        select_sql = f"""
+            SELECT p.id, p.author_id, p.screening_room_id, p.timestamp,
+                   snippet(posts_fts, 0, '{SNIPPET_START}', '{SNIPPET_END}', '…',
+                           {SNIPPET_TOKENS}) AS snippet,
+                   bm25(posts_fts) AS rank
+            FROM posts_fts
+            JOIN posts p ON p.id = posts_fts.rowid
+            WHERE posts_fts MATCH :q
+        """
+        rank_expr = "bm25(posts_fts)"
+
+    conditions = []
+    if "room_ids" in params:
+        conditions.append("p.screening_room_id IN :room_ids")
+    # Skip posts whose room or author is waiting to be purged
+    if "deleted_rooms" in params:
+        conditions.append(
+            "(p.screening_room_id IS NULL "
+            "OR p.screening_room_id NOT IN :deleted_rooms)"
+        )
+    if "deleted_users" in params:
+        conditions.append("(p.author_id IS NULL OR p.author_id NOT IN :deleted_users)")
+    if "after_rank" in params:
+        conditions.append(
+            f"({rank_expr} > :after_rank "
+            f"OR ({rank_expr} = :after_rank AND p.id > :after_id))"
+        )
+    for condition in conditions:
+        select_sql += f" AND {condition}"
+    # Lower rank sorts first on both backends
+    return select_sql + " ORDER BY rank, p.id LIMIT :limit"
+
+
+# Id lists bound into the search statement
+EXPANDING = ("room_ids", "deleted_rooms", "deleted_users")
+
+
+def _search_shard(q, params):
+    dialect = _dialect()
+    stmt = (
+        text(_search_sql(dialect, params))
+        .bindparams(
+            *(bindparam(name, expanding=True) for name in EXPANDING if name in params)
+        )
+        .columns(timestamp=DateTime)
+    )
+    params = dict(params, q=q if dialect == "postgresql" else _fts5_query(q))
+    return _execute(stmt, params).all()
+
+
+def _deleted_ids(model):
+    return db.session.scalars(
+        select(model.id).where(model.deleted_at.is_not(None)),
+        execution_options={"include_deleted": True},
+    ).all()
+
+
+def _room_parents(room_ids):
+    return {
+        room.id: room
+        for room in db.session.execute(
+            select(
+                ScreeningRoom.id, ScreeningRoom.club_id, ScreeningRoom.movie_id
+            ).where(ScreeningRoom.id.in_(room_ids))
+        )
+    }
+
+
+def search_posts(q, club_id=None, movie_id=None, cursor=None, limit=None):
+    limit = min(limit or SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT)
+    # Reject a query without words before reading anything
+    _fts5_query(q)
+    params = {"limit": limit + 1}
+    if cursor:
+        params["after_rank"], params["after_id"] = decode_cursor(cursor)
+
+    # Resolved in the primary, which holds rooms and users
+    on = None
+    if club_id is not None or movie_id is not None:
+        where = []
+        if club_id is not None:
+            where.append(ScreeningRoom.club_id == club_id)
+        if movie_id is not None:
+            where.append(ScreeningRoom.movie_id == movie_id)
+        params["room_ids"] = db.session.scalars(
+            select(ScreeningRoom.id).where(*where)
+        ).all()
+        if not params["room_ids"]:
+            return {"query": q, "results": [], "next_cursor": None}
+        on = shards.of_rooms(params["room_ids"])
+    for name, model in (("deleted_rooms", ScreeningRoom), ("deleted_users", User)):
+        ids = _deleted_ids(model)
+        if ids:
+            params[name] = ids
+
+    parts = shards.scatter(lambda: _search_shard(q, params), on)
+    rows = sorted(
+        (row for part in parts for row in part), key=lambda row: (row.rank, row.id)
+    )
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].rank, rows[-1].id)
+
+    rooms = _room_parents({row.screening_room_id for row in rows})
+    results = []
+    for row in rows:
+        room = rooms.get(row.screening_room_id)
+        results.append(
+            {
+                "id": row.id,
+                "author_id": row.author_id,
+                "screening_room_id": row.screening_room_id,
+                "club_id": room.club_id if room else None,
+                "movie_id": room.movie_id if room else None,
+                "timestamp": row.timestamp.isoformat() if row.timestamp else None,
+                "snippet": row.snippet,
+                "rank": row.rank,
+            }
+        )
+    return {"query": q, "results": results, "next_cursor": next_cursor}
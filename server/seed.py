@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 
-from config import app, db
+from config import create_app, db
 from models import User, Role, Movie, Genre, Club, ScreeningRoom, Post, Rating
+import search
+import discovery
+import trending
 
 # import requests for tMDB API call
 import requests
@@ -15,6 +18,8 @@ TMDB_API_KEY = "97bca4f9bdb5d0ab61dcd0519c4eec58"
 
 fake = Faker()
 
+app = create_app()
+
 with app.app_context():
     # print("Deleting existing data...")
     User.query.delete()
@@ -379,12 +384,26 @@ with app.app_context():
     print("Seeding ratings...")
     rooms_to_post_to = ScreeningRoom.query.all()
     for room in rooms_to_post_to:
-        for _ in range(11):
+        # One rating per user per room
+        for author_id in random.sample(range(1, 12), 8):
             rating = Rating(
                 rating=randint(1, 5),
-                author_id=randint(1, 11),
+                author_id=author_id,
                 screening_room_id=room.id,
             )
             db.session.add(rating)
 
     db.session.commit()
+
+    print("Counting club members, rooms and posts...")
+    Club.recount()
+
+    print("Indexing club memberships...")
+    discovery.rebuild()
+
+    print("Scoring trending movies and rooms...")
+    trending.rebuild()
+
+    print("Rebuilding post search index...")
+    search.rebuild_index()
+    db.session.commit()
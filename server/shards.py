@@ -0,0 +1,257 @@
+from contextlib import contextmanager
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import MetaData, select, delete, insert, func
+
+from config import SHARD_KEY
+from models import (
+    db,
+    Club,
+    ClubShard,
+    ScreeningRoom,
+    Post,
+    Rating,
+    ArchivedPost,
+    ArchivedRating,
+    IdSequence,
+)
+
+# Club-scoped shards
+#
+# Posts and ratings, hot and archived, live in the database of the club
+# their room belongs to: the primary database or one of SHARDS (bound as
+# "shard1", "shard2", ...). Everything else, rooms included, stays in the
+# primary, so a room id is enough to find a shard, and rooms, clubs,
+# movies and users still join to one another.
+#
+# A club is placed on the database holding the fewest clubs when it is
+# created, and stays there; clubs from before sharding stay on the
+# primary. Handlers route() the session to a club's shard before reading
+# or writing its posts and ratings. Reads that span clubs (a user's posts,
+# a movie's ratings, maintenance jobs) run once per shard with scatter()
+# and combine the results.
+#
+# Writes are only atomic per database: the post and its change log row,
+# counters and trending increments commit one after the other. Each
+# database keeps the search index of its own posts (see search.py).
+
+SHARDED_MODELS = (Post, Rating, ArchivedPost, ArchivedRating, IdSequence)
+# Shared step of the id sequences, so at most ID_STEP databases
+ID_STEP = 64
+SEQUENCES = {"posts": (Post, ArchivedPost), "ratings": (Rating, ArchivedRating)}
+
+
+def enabled():
+    return bool(current_app.config["SHARDS"])
+
+
+def keys():
+    """Every database holding posts and ratings, the primary (None) first."""
+    return [None] + [
+        f"shard{n}" for n in range(1, len(current_app.config["SHARDS"]) + 1)
+    ]
+
+
+def route(key):
+    """Send posts and ratings to shard key for the rest of the session."""
+    if key != db.session.info.get(SHARD_KEY):
+        # Pending rows are written where they were created
+        db.session.flush()
+    db.session.info[SHARD_KEY] = key
+    return key
+
+
+@contextmanager
+def using(key):
+    """Send posts and ratings to shard key inside the block."""
+    previous = db.session.info.get(SHARD_KEY)
+    route(key)
+    try:
+        yield key
+        db.session.flush()
+    finally:
+        db.session.info[SHARD_KEY] = previous
+
+
+def scatter(fn, on=None):
+    """fn() run on each shard in on (default: all of them), in order."""
+    results = []
+    for key in keys() if on is None else on:
+        with using(key):
+            results.append(fn())
+    return results
+
+
+# Shard map
+
+
+def _shard_of_rooms():
+    # Rooms of clubs from before sharding have no club_shards row: primary
+    return (
+        select(ClubShard.shard)
+        .select_from(ScreeningRoom)
+        .outerjoin(ClubShard, ClubShard.club_id == ScreeningRoom.club_id)
+    )
+
+
+def of_club(club_id):
+    if not enabled():
+        return None
+    return db.session.scalar(
+        select(ClubShard.shard).where(ClubShard.club_id == club_id)
+    )
+
+
+def of_room(room_id):
+    if not enabled():
+        return None
+    return db.session.scalar(
+        _shard_of_rooms().where(ScreeningRoom.id == room_id),
+        execution_options={"include_deleted": True},
+    )
+
+
+def of_rooms(room_ids):
+    """The shards holding the posts and ratings of room_ids."""
+    if not enabled():
+        return [None]
+    found = set(
+        db.session.scalars(
+            _shard_of_rooms().where(ScreeningRoom.id.in_(room_ids)).distinct(),
+            execution_options={"include_deleted": True},
+        )
+    )
+    return [key for key in keys() if key in found]
+
+
+def route_room(room_id):
+    return route(of_room(room_id))
+
+
+def locate(model, obj_id):
+    """Route to the shard holding model obj_id; None if no shard has it."""
+    if not enabled():
+        return None
+    for key in keys():
+        with using(key):
+            found = db.session.scalar(select(model.id).where(model.id == obj_id))
+        if found is not None:
+            return route(key)
+    return None
+
+
+def place(club_id):
+    """Put a new club on the database that holds the fewest clubs."""
+    if not enabled():
+        return None
+    clubs = Club.__table__
+    counts = dict(
+        db.session.execute(
+            select(ClubShard.shard, func.count())
+            .select_from(clubs)
+            .outerjoin(ClubShard, ClubShard.club_id == clubs.c.id)
+            .where(clubs.c.id != club_id)
+            .group_by(ClubShard.shard)
+        ).all()
+    )
+    key = min(keys(), key=lambda k: counts.get(k, 0))
+    db.session.add(ClubShard(club_id=club_id, shard=key))
+    return key
+
+
+def rooms():
+    """{room_id: (club_id, movie_id)} of live rooms, joined in Python."""
+    return {
+        row.id: (row.club_id, row.movie_id)
+        for row in db.session.execute(
+            select(ScreeningRoom.id, ScreeningRoom.club_id, ScreeningRoom.movie_id)
+        )
+    }
+
+
+def engines():
+    return [db.engines[key] for key in keys()]
+
+
+# Setup
+
+
+def _shard_metadata():
+    # Shards hold no users or rooms for foreign keys to point at;
+    # deletes.purge() removes what a cascade would have
+    metadata = MetaData()
+    for model in SHARDED_MODELS:
+        table = model.__table__.to_metadata(metadata)
+        for constraint in list(table.foreign_key_constraints):
+            table.constraints.discard(constraint)
+        table.foreign_keys.clear()
+        for column in table.columns:
+            column.foreign_keys.clear()
+    return metadata
+
+
+def seed_sequences():
+    """Start every database's id sequences above the highest id in use."""
+    for name, models in SEQUENCES.items():
+        highest = 0
+        for model in models:
+            for value in scatter(
+                lambda: db.session.scalar(
+                    select(func.max(model.id)),
+                    execution_options={"include_deleted": True},
+                )
+            ):
+                highest = max(highest, value or 0)
+        base = (highest // ID_STEP + 1) * ID_STEP
+        for offset, key in enumerate(keys()):
+            with using(key):
+                db.session.execute(delete(IdSequence).where(IdSequence.name == name))
+                db.session.execute(
+                    insert(IdSequence).values(
+                        name=name, next_id=base + offset, step=ID_STEP
+                    )
+                )
+    db.session.commit()
+
+
+cli = AppGroup("shards", help="Set up and inspect club-scoped shards.")
+
+
+@cli.command("init")
+def init_command():
+    import search
+
+    if len(keys()) > ID_STEP:
+        raise click.UsageError(f"At most {ID_STEP - 1} SHARDS are supported")
+    metadata = _shard_metadata()
+    for key in keys()[1:]:
+        metadata.create_all(db.engines[key])
+        with db.engines[key].begin() as connection:
+            search.create_index(connection)
+    if enabled():
+        seed_sequences()
+    click.echo(f"Initialized {len(keys()) - 1} shards")
+
+
+@cli.command("status")
+def status_command():
+    clubs = dict(
+        db.session.execute(
+            select(ClubShard.shard, func.count())
+            .select_from(Club.__table__)
+            .outerjoin(ClubShard, ClubShard.club_id == Club.__table__.c.id)
+            .group_by(ClubShard.shard)
+        ).all()
+    )
+    for key in keys():
+        with using(key):
+            posts, ratings = (
+                db.session.scalar(select(func.count()).select_from(model.__table__))
+                for model in (Post, Rating)
+            )
+        click.echo(
+            f"{key or 'primary'}: {clubs.get(key, 0)} clubs, "
+            f"{posts} posts, {ratings} ratings"
+        )
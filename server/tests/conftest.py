@@ -0,0 +1,129 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+# Modules in server/ import each other by bare name, as under `flask run`
+SERVER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER)
+
+from config import create_app  # noqa: E402
+from models import db, Role, User, Club, Movie, ScreeningRoom  # noqa: E402
+
+CONFIG = {
+    "TESTING": True,
+    "SQLALCHEMY_DATABASE_URI": "sqlite://",
+    "MIGRATIONS_ENABLED": False,
+    "TIMING_LOG": False,
+    "CACHE_STORAGE_URI": "memory://",
+    "SHARDS": [],
+    # Cheapest hashes bcrypt allows; login tests hash on every request
+    "BCRYPT_LOG_ROUNDS": 4,
+}
+
+
+@pytest.fixture
+def app():
+    app = create_app(CONFIG)
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture(scope="session")
+def migrated_db(tmp_path_factory):
+    """A SQLite file migrated to head once, copied by each test using it."""
+    from flask_migrate import upgrade
+
+    path = tmp_path_factory.mktemp("migrated") / "filmclub.db"
+    app = create_app(
+        dict(
+            CONFIG,
+            SQLALCHEMY_DATABASE_URI=f"sqlite:///{path}",
+            MIGRATIONS_ENABLED=True,
+        )
+    )
+    with app.app_context():
+        upgrade(directory=os.path.join(SERVER, "migrations"))
+        db.engine.dispose()
+    return path
+
+
+@pytest.fixture
+def shard_count():
+    """SHARDS for db_app; override in a test module to shard."""
+    return 0
+
+
+@pytest.fixture
+def db_app(migrated_db, tmp_path, shard_count):
+    """An app on its own copy of the migrated schema, and its shards."""
+    path = tmp_path / "filmclub.db"
+    shutil.copy(migrated_db, path)
+    app = create_app(
+        dict(
+            CONFIG,
+            SQLALCHEMY_DATABASE_URI=f"sqlite:///{path}",
+            SHARDS=[
+                f"sqlite:///{tmp_path / f'shard{n}.db'}"
+                for n in range(1, shard_count + 1)
+            ],
+            THROTTLE_ENABLED=False,
+        )
+    )
+    with app.app_context():
+        if shard_count:
+            result = app.test_cli_runner().invoke(args=["shards", "init"])
+            assert result.exit_code == 0, result.output
+        yield app
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+@pytest.fixture
+def client(db_app):
+    return db_app.test_client()
+
+
+@pytest.fixture
+def login(client):
+    def login(user):
+        with client.session_transaction() as session:
+            session["user_id"] = user.id
+
+    return login
+
+
+@pytest.fixture
+def roles(db_app):
+    db.session.add_all([Role(id=1, name="user"), Role(id=2, name="admin")])
+    db.session.commit()
+
+
+@pytest.fixture
+def user(roles):
+    user = User("ingrid", "ingrid@example.com")
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def admin(roles):
+    user = User("admin", "admin@example.com", role_id=2)
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def room(db_app):
+    club = Club("Noir Night")
+    movie = Movie("The Third Man")
+    db.session.add_all([club, movie])
+    db.session.flush()
+    room = ScreeningRoom(club.id, movie.id)
+    db.session.add(room)
+    db.session.commit()
+    return room
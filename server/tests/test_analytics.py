@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+import analytics
+from models import db, Rating, User
+
+
+@pytest.fixture(autouse=True)
+def fresh_snapshot(monkeypatch):
+    # The snapshot is per process; start each test without one
+    monkeypatch.setattr(analytics, "_snapshot", None)
+
+
+def snapshot(movie_ids, ratings, months=None):
+    n = len(ratings)
+    timestamps = [f"2026-{month:02d}-15" for month in months or [1] * n]
+    return analytics.RatingsSnapshot(
+        movie_id=np.array(movie_ids, dtype=np.int64),
+        club_id=np.full(n, analytics.MISSING_ID, dtype=np.int64),
+        author_id=np.arange(n, dtype=np.int64),
+        rating=np.array(ratings, dtype=np.int8),
+        timestamp=np.array(timestamps, dtype="datetime64[s]"),
+    )
+
+
+def test_summarize_counts_averages_and_percentiles():
+    first, second = snapshot([1, 1, 1, 1, 2], [1, 2, 4, 5, 3]).summarize("movie")
+
+    assert first["key"] == 1
+    assert first["count"] == 4
+    assert first["average"] == 3.0
+    assert first["histogram"] == {"1": 1, "2": 1, "3": 0, "4": 1, "5": 1}
+    assert first["percentiles"] == {"p25": 1, "p50": 2, "p75": 4, "p90": 5}
+    assert second["percentiles"] == {"p25": 3, "p50": 3, "p75": 3, "p90": 3}
+
+
+def test_summarize_by_month_and_missing_keys():
+    groups = snapshot([1, 1, 1], [5, 4, 3], months=[1, 1, 3]).summarize("month")
+    assert [(g["key"], g["count"]) for g in groups] == [("2026-01", 2), ("2026-03", 1)]
+
+    (group,) = snapshot([1], [5]).summarize("club")
+    assert group["key"] is None
+
+
+def test_the_endpoint_reads_the_ratings(client, room, user, admin):
+    Rating.upsert(user.id, room.id, 5)
+    Rating.upsert(admin.id, room.id, 2)
+    db.session.commit()
+
+    response = client.get("/analytics/ratings?group_by=club")
+    assert response.status_code == 200
+    assert response.json["total"] == 2
+    (group,) = response.json["groups"]
+    assert group["key"] == room.club_id
+    assert group["average"] == 3.5
+
+
+def test_the_snapshot_is_reused_until_it_goes_stale(db_app, client, room, user):
+    Rating.upsert(user.id, room.id, 5)
+    db.session.commit()
+    assert client.get("/analytics/ratings").json["total"] == 1
+
+    holly = User("holly", "holly@example.com")
+    db.session.add(holly)
+    db.session.flush()
+    Rating.upsert(holly.id, room.id, 1)
+    db.session.commit()
+    assert client.get("/analytics/ratings").json["total"] == 1
+
+    db_app.config["ANALYTICS_SNAPSHOT_TTL"] = 0
+    assert client.get("/analytics/ratings").json["total"] == 2
+
+
+def test_unknown_groupings_are_400(client):
+    assert client.get("/analytics/ratings?group_by=genre").status_code == 400
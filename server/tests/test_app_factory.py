@@ -0,0 +1,44 @@
+import subprocess
+import sys
+
+from config import create_app
+
+from conftest import CONFIG, SERVER
+
+
+def test_apps_do_not_share_config():
+    first = create_app(dict(CONFIG, SCHEMA_FAST_DUMP=False))
+    second = create_app(CONFIG)
+
+    assert first.config["SCHEMA_FAST_DUMP"] is False
+    assert second.config["SCHEMA_FAST_DUMP"] is True
+    assert "moviesbyid" in first.view_functions
+    assert "moviesbyid" in second.view_functions
+
+
+def test_shards_become_binds():
+    app = create_app(dict(CONFIG, SHARDS=["sqlite://", "sqlite://"]))
+    assert set(app.config["SQLALCHEMY_BINDS"]) == {"shard1", "shard2"}
+
+
+def test_migrations_are_optional():
+    assert "migrate" not in create_app(CONFIG).extensions
+    app = create_app(dict(CONFIG, MIGRATIONS_ENABLED=True))
+    assert "migrate" in app.extensions
+
+
+def test_the_production_app_boots_without_heavy_imports():
+    # Only the handlers and commands that need them import these
+    script = (
+        "import sys, wsgi; "
+        "print(sorted(m for m in ('numpy', 'flask_migrate', 'alembic') "
+        "if m in sys.modules))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=SERVER,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    assert output.strip().splitlines()[-1] == "[]"
@@ -0,0 +1,152 @@
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select, update
+
+import archive
+from models import db, User, ScreeningRoom, Post, Rating, ArchivedPost, ArchivedRating
+
+OLD = datetime.utcnow() - timedelta(days=365)
+
+
+def add_post(author, room, content="Harry Lime lives", timestamp=OLD):
+    post = Post(content, author.id, room.id)
+    db.session.add(post)
+    db.session.flush()
+    db.session.execute(
+        update(Post).where(Post.id == post.id).values(timestamp=timestamp)
+    )
+    db.session.commit()
+    return post.id
+
+
+def add_rating(author, room, rating=4, timestamp=OLD):
+    rating_id, _ = Rating.upsert(author.id, room.id, rating)
+    db.session.execute(
+        update(Rating).where(Rating.id == rating_id).values(timestamp=timestamp)
+    )
+    db.session.commit()
+    return rating_id
+
+
+def count(model):
+    return db.session.scalar(select(func.count()).select_from(model))
+
+
+def test_new_posts_do_not_reuse_archived_ids(user, room):
+    first = add_post(user, room)
+    assert archive.run()["posts"] == 1
+    assert count(Post) == 0
+
+    second = add_post(user, room)
+    assert second > first
+    assert archive.run()["posts"] == 1
+    assert count(ArchivedPost) == 2
+
+
+def test_new_ratings_do_not_reuse_archived_ids(user, room, admin):
+    first = add_rating(user, room)
+    assert archive.run()["ratings"] == 1
+
+    second = add_rating(admin, room)
+    assert second > first
+    assert archive.run()["ratings"] == 1
+    assert count(ArchivedRating) == 2
+
+
+def test_run_skips_rows_whose_id_is_already_archived(user, room):
+    taken = add_post(user, room, "already archived")
+    db.session.execute(
+        insert(ArchivedPost).values(
+            id=taken,
+            content="already archived",
+            author_id=user.id,
+            screening_room_id=room.id,
+            timestamp=OLD,
+            version=1,
+        )
+    )
+    db.session.commit()
+    other = add_post(user, room)
+
+    moved = archive.run()
+
+    assert moved["posts"] == 1
+    assert moved["skipped"] == {"posts": 1, "ratings": 0}
+    assert db.session.scalars(select(Post.id)).all() == [taken]
+    assert db.session.get(ArchivedPost, other) is not None
+
+
+def test_recent_rows_stay_hot(user, room):
+    add_post(user, room, timestamp=datetime.utcnow())
+    add_rating(user, room, timestamp=datetime.utcnow())
+    assert archive.run() == {
+        "posts": 0,
+        "ratings": 0,
+        "skipped": {"posts": 0, "ratings": 0},
+    }
+
+
+def test_archiving_changes_the_room_etag(client, user, room):
+    add_post(user, room)
+    response = client.get(f"/rooms/{room.id}")
+    etag = response.headers["ETag"]
+    assert len(response.json["posts"]) == 1
+    user_version = db.session.get(User, user.id).version
+
+    archive.run()
+    db.session.expire_all()
+
+    response = client.get(f"/rooms/{room.id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json["posts"] == []
+    assert db.session.get(ScreeningRoom, room.id).version > 1
+    assert db.session.get(User, user.id).version > user_version
+
+
+def test_archived_rows_stay_in_listings(client, login, admin, user, room):
+    post_id = add_post(user, room)
+    rating_id = add_rating(user, room)
+    recent = add_post(user, room, "recent", timestamp=datetime.utcnow())
+    archive.run()
+
+    assert [post["id"] for post in client.get("/posts").json] == [post_id, recent]
+    assert [rating["id"] for rating in client.get("/ratings").json] == [rating_id]
+    summary = client.get("/posts?view=summary").json
+    assert [post["id"] for post in summary] == [post_id, recent]
+
+    exported = client.get("/export/posts").get_data(as_text=True).splitlines()
+    assert [json.loads(line)["id"] for line in exported] == [post_id, recent]
+    exported = client.get("/export/ratings?format=csv").get_data(as_text=True)
+    assert exported.splitlines()[1].startswith(f"{rating_id},")
+
+    login(admin)
+    document = client.get(f"/users/{user.id}").json
+    assert [post["id"] for post in document["posts"]] == [post_id, recent]
+    assert [rating["id"] for rating in document["ratings"]] == [rating_id]
+
+
+def test_pages_run_newest_first_across_both_tiers(client, user, room):
+    old = [add_post(user, room, f"old {n}") for n in range(3)]
+    archive.run()
+    recent = [
+        add_post(user, room, f"recent {n}", timestamp=datetime.utcnow())
+        for n in range(2)
+    ]
+
+    seen, cursor = [], None
+    url = f"/movies/{room.movie_id}/posts?limit=2"
+    while True:
+        page = client.get(url + (f"&cursor={cursor}" if cursor else "")).json
+        assert len(page["posts"]) <= 2
+        seen += [post["id"] for post in page["posts"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == recent[::-1] + old[::-1]
+
+
+def test_bad_page_cursors_are_400(client, room):
+    url = f"/movies/{room.movie_id}/posts?cursor=not-a-cursor"
+    assert client.get(url).status_code == 400
@@ -0,0 +1,120 @@
+import json
+
+import pytest
+
+import cache
+from cache import DetailCache, LocalBackend
+from models import db
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    return clock
+
+
+def loader(value, calls):
+    def load():
+        calls.append(value)
+        return {"body": value}
+
+    return load
+
+
+def test_local_tier_evicts_least_recently_used():
+    detail = DetailCache(LocalBackend(), max_entries=2)
+    calls = []
+    detail.get_or_load("a", loader("a", calls))
+    detail.get_or_load("b", loader("b", calls))
+    detail.get_or_load("a", loader("a", calls))  # a is now most recent
+    detail.get_or_load("c", loader("c", calls))
+
+    assert list(detail._local) == ["a", "c"]
+    assert detail.stats()["local_entries"] == 2
+    # b falls back to the shared tier without another load
+    assert detail.get_or_load("b", loader("b", calls)) == {"body": "b"}
+    assert calls == ["a", "b", "c"]
+    assert detail.stats()["shared_hits"] == 1
+
+
+def test_entries_expire_from_both_tiers(clock):
+    detail = DetailCache(LocalBackend(), local_ttl=30, shared_ttl=600)
+    calls = []
+    detail.get_or_load("a", loader("a", calls))
+
+    clock.now += 31
+    detail.get_or_load("a", loader("a", calls))
+    assert calls == ["a"]
+    assert detail.stats()["shared_hits"] == 1
+
+    clock.now += 600
+    detail.get_or_load("a", loader("a", calls))
+    assert calls == ["a", "a"]
+
+
+def test_missing_objects_are_not_cached():
+    detail = DetailCache(LocalBackend())
+    calls = []
+
+    def load():
+        calls.append(None)
+        return None
+
+    assert detail.get_or_load("a", load) is None
+    assert detail.get_or_load("a", load) is None
+    assert len(calls) == 2
+
+
+def test_load_racing_an_invalidation_is_not_stored():
+    backend = LocalBackend()
+    detail = DetailCache(backend)
+
+    def stale_load():
+        # A write commits and invalidates while this load is under way
+        detail.delete(["a"])
+        return {"body": "stale"}
+
+    assert detail.get_or_load("a", stale_load) == {"body": "stale"}
+    assert backend.get("a") is None
+    assert "a" not in detail._local
+
+    calls = []
+    assert detail.get_or_load("a", loader("fresh", calls)) == {"body": "fresh"}
+    assert json.loads(backend.get("a")) == {"body": "fresh"}
+
+
+def test_invalidation_waits_for_commit(app):
+    detail = cache.get_cache()
+    calls = []
+    detail.get_or_load("movie:1", loader("old", calls))
+
+    cache.invalidate("movie", 1)
+    db.session.execute(db.text("SELECT 1"))
+    assert detail.get_or_load("movie:1", loader("new", calls)) == {"body": "old"}
+
+    db.session.commit()
+    assert detail.get_or_load("movie:1", loader("new", calls)) == {"body": "new"}
+    assert calls == ["old", "new"]
+
+
+def test_rollback_keeps_entries(app):
+    detail = cache.get_cache()
+    calls = []
+    detail.get_or_load("movie:1", loader("old", calls))
+
+    cache.invalidate("movie", 1)
+    db.session.execute(db.text("SELECT 1"))
+    db.session.rollback()
+    db.session.commit()
+
+    assert detail.get_or_load("movie:1", loader("new", calls)) == {"body": "old"}
+    assert calls == ["old"]
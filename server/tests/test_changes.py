@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from models import db, Change
+
+
+def sync(client, since=0, **args):
+    query = "&".join(f"{key}={value}" for key, value in args.items())
+    return client.get(f"/changes?since={since}&{query}")
+
+
+def test_writes_are_recorded_in_order(client, user, room):
+    movie = client.post("/movies", json={"title": "Odd Man Out"}).json
+    client.patch(f"/movies/{movie['id']}", json={"popularity": 2})
+    client.post(
+        "/posts",
+        json={"content": "Zither", "author_id": user.id, "screening_room_id": room.id},
+    )
+    client.delete(f"/movies/{movie['id']}")
+
+    changes = sync(client).json["changes"]
+    assert [(c["type"], c["op"]) for c in changes] == [
+        ("movie", "create"),
+        ("movie", "update"),
+        ("post", "create"),
+        ("movie", "delete"),
+    ]
+    assert [c["cursor"] for c in changes] == sorted(c["cursor"] for c in changes)
+
+
+def test_the_cursor_pages_and_filters(client, room):
+    for title in ("Odd Man Out", "The Fallen Idol", "Our Man in Havana"):
+        client.post("/movies", json={"title": title})
+
+    page = sync(client, limit=2).json
+    assert len(page["changes"]) == 2 and page["has_more"]
+    page = sync(client, page["cursor"], limit=2).json
+    assert len(page["changes"]) == 1 and not page["has_more"]
+
+    last = page["cursor"]
+    page = sync(client, last).json
+    assert page == {"changes": [], "cursor": last, "has_more": False}
+
+    assert sync(client, types="club").json["changes"] == []
+
+
+def test_a_pruned_cursor_is_gone(client, room):
+    client.post("/movies", json={"title": "Odd Man Out"})
+    cursor = sync(client).json["cursor"]
+    client.post("/movies", json={"title": "The Fallen Idol"})
+    db.session.execute(
+        update(Change).values(timestamp=datetime.utcnow() - timedelta(days=90))
+    )
+    db.session.commit()
+
+    assert Change.prune(datetime.utcnow() - timedelta(days=30)) == 2
+    db.session.commit()
+    assert sync(client, cursor).status_code == 410
+    assert sync(client).json["changes"] == []
+
+
+def test_failed_writes_record_nothing(client):
+    assert client.post("/movies", json={"popularity": "high"}).status_code == 400
+    assert sync(client).json["changes"] == []
@@ -0,0 +1,65 @@
+from sqlalchemy import update
+
+from models import db, Club
+
+
+def counts(client, club_id):
+    (club,) = [c for c in client.get("/clubs?view=summary").json if c["id"] == club_id]
+    return club["member_count"], club["room_count"], club["post_count"]
+
+
+def test_counters_follow_writes(client, user, admin, room):
+    club_id = room.club_id
+    # The fixture's room was inserted directly, without counting it
+    Club.recount()
+    db.session.commit()
+    for member in (user, admin):
+        client.post(f"/clubs/{club_id}/add_user", json={"user_id": member.id})
+    client.post(f"/clubs/{club_id}/remove_user", json={"user_id": admin.id})
+    other = client.post(
+        "/rooms", json={"club_id": club_id, "movie_id": room.movie_id}
+    ).json
+    posts = [
+        client.post(
+            "/posts",
+            json={"content": text, "author_id": user.id, "screening_room_id": room_id},
+        ).json["id"]
+        for text, room_id in (("Zither", room.id), ("Sewers", other["id"]))
+    ]
+    client.delete(f"/posts/{posts[0]}")
+
+    assert counts(client, club_id) == (1, 2, 1)
+
+
+def test_failed_membership_changes_leave_counts_alone(client, user, room):
+    client.post(f"/clubs/{room.club_id}/add_user", json={"user_id": user.id})
+    client.post(f"/clubs/{room.club_id}/add_user", json={"user_id": user.id})
+    client.post(f"/clubs/{room.club_id}/remove_user", json={"user_id": 999})
+
+    assert counts(client, room.club_id)[0] == 1
+
+
+def test_recount_repairs_drifted_counters(client, user, room):
+    client.post(f"/clubs/{room.club_id}/add_user", json={"user_id": user.id})
+    client.post(
+        "/posts",
+        json={"content": "Zither", "author_id": user.id, "screening_room_id": room.id},
+    )
+    db.session.execute(update(Club).values(member_count=7, room_count=0, post_count=-3))
+    db.session.commit()
+
+    Club.recount()
+    db.session.commit()
+    assert counts(client, room.club_id) == (1, 1, 1)
+
+
+def test_the_summary_is_flat(client, room):
+    (club,) = client.get("/clubs?view=summary").json
+    assert set(club) == {
+        "id",
+        "name",
+        "description",
+        "member_count",
+        "room_count",
+        "post_count",
+    }
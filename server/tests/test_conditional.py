@@ -0,0 +1,93 @@
+from sqlalchemy import func, select
+
+import jobs
+from models import db, Club, Job, Movie, Post
+
+
+def get(client, url, etag=None):
+    return client.get(url, headers={"If-None-Match": etag} if etag else {})
+
+
+def run_jobs():
+    # The worker removes the session, detaching the fixtures' objects
+    return jobs.work("test", once=True)
+
+
+def queued():
+    return db.session.scalar(
+        select(func.count()).select_from(Job).where(Job.status == jobs.QUEUED)
+    )
+
+
+def test_unchanged_documents_answer_304(client, room):
+    response = get(client, f"/movies/{room.movie_id}")
+    assert response.status_code == 200
+
+    etag = response.headers["ETag"]
+    assert get(client, f"/movies/{room.movie_id}", etag).status_code == 304
+    assert get(client, f"/movies/{room.movie_id}", '"movies-0-0"').status_code == 200
+
+
+def test_patches_need_the_current_version(client, room):
+    url = f"/movies/{room.movie_id}"
+    etag = get(client, url).headers["ETag"]
+
+    response = client.patch(url, json={"popularity": 3}, headers={"If-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+    response = client.patch(url, json={"popularity": 4}, headers={"If-Match": etag})
+    assert response.status_code == 412
+    assert db.session.get(Movie, room.movie_id).popularity == 3
+
+
+def test_a_rename_touches_embedding_documents_in_a_job(client, user, room):
+    db.session.add(Post("Zither music", user.id, room.id))
+    db.session.commit()
+    room_url, club_url = f"/rooms/{room.id}", f"/clubs/{room.club_id}"
+    room_etag = get(client, room_url).headers["ETag"]
+    club_etag = get(client, club_url).headers["ETag"]
+
+    response = client.patch(f"/movies/{room.movie_id}", json={"title": "Harry Lime"})
+    assert response.status_code == 200
+    assert queued() == 1
+
+    assert run_jobs() == 1
+    response = get(client, room_url, room_etag)
+    assert response.status_code == 200
+    assert response.json["movie"]["title"] == "Harry Lime"
+    assert get(client, club_url, club_etag).status_code == 200
+    assert db.session.scalar(select(Post.version)) > 1
+
+
+def test_a_club_rename_touches_its_movies(client, room):
+    movie_url, club_id = f"/movies/{room.movie_id}", room.club_id
+    movie_etag = get(client, movie_url).headers["ETag"]
+
+    client.patch(f"/clubs/{club_id}", json={"name": "Film Noir Night"})
+    run_jobs()
+
+    assert get(client, movie_url, movie_etag).status_code == 200
+    (job,) = db.session.scalars(select(Job)).all()
+    assert job.status == jobs.SUCCEEDED
+    assert job.result == '{"movies": 1, "rooms": 1}'
+    assert db.session.get(Club, club_id).name == "Film Noir Night"
+
+
+def test_other_changes_queue_nothing(client, room):
+    client.patch(f"/movies/{room.movie_id}", json={"popularity": 7})
+    assert queued() == 0
+
+
+def test_a_username_change_touches_the_rooms_they_posted_in(client, user, room):
+    db.session.add(Post("Zither music", user.id, room.id))
+    db.session.commit()
+    room_url = f"/rooms/{room.id}"
+    room_etag = get(client, room_url).headers["ETag"]
+
+    client.patch(f"/users/{user.id}", json={"username": "holly"})
+    run_jobs()
+
+    response = get(client, room_url, room_etag)
+    assert response.status_code == 200
+    assert response.json["posts"][0]["author"]["username"] == "holly"
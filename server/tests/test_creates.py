@@ -0,0 +1,84 @@
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+
+import creates
+import deletes
+from models import db, Post, ScreeningRoom
+
+
+def post(client, **body):
+    return client.post("/posts", json=body)
+
+
+def test_valid_creates_return_the_new_row(client, user, room):
+    response = post(
+        client, content="Zither", author_id=user.id, screening_room_id=room.id
+    )
+    assert response.status_code == 201
+    assert response.json["author"] == {"id": user.id, "username": "ingrid"}
+    assert response.json["screening_room"] == {"id": room.id}
+
+
+@pytest.mark.parametrize(
+    "body, error",
+    [
+        (
+            {"author_id": 1, "screening_room_id": 1},
+            {"content": ["Post content is required"]},
+        ),
+        ({"content": "", "author_id": 1, "screening_room_id": 1}, None),
+        ({"content": "x", "author_id": "one", "screening_room_id": 1}, None),
+    ],
+)
+def test_invalid_fields_are_400(client, user, room, body, error):
+    response = post(client, **body)
+    assert response.status_code == 400
+    if error:
+        assert response.json["error"] == error
+    assert db.session.scalar(select(func.count()).select_from(Post)) == 0
+
+
+def test_missing_references_are_404(client, user, room):
+    response = post(client, content="Zither", author_id=user.id, screening_room_id=999)
+    assert (response.status_code, response.json) == (
+        404,
+        {"error": "Screening room not found"},
+    )
+    response = client.post("/rooms", json={"club_id": 999, "movie_id": room.movie_id})
+    assert (response.status_code, response.json) == (404, {"error": "Club not found"})
+
+
+def test_deleted_references_are_missing(client, user, room):
+    deletes.mark("room", room.id)
+    db.session.commit()
+    response = post(
+        client, content="Zither", author_id=user.id, screening_room_id=room.id
+    )
+    assert response.status_code == 404
+
+
+def test_ids_too_large_for_the_database_are_400(client, user):
+    response = post(
+        client, content="Zither", author_id=user.id, screening_room_id=2**70
+    )
+    assert (response.status_code, response.json) == (400, {"error": "Invalid id"})
+
+
+def test_ratings_are_range_checked(client, user, room):
+    response = client.post(
+        "/ratings",
+        json={"rating": 6, "author_id": user.id, "screening_room_id": room.id},
+    )
+    assert response.json["error"] == {"rating": ["Rating must be between 1 and 5"]}
+
+
+def test_constraint_errors_become_4xx(room):
+    db.session.add(ScreeningRoom(room.club_id, 999))
+    with pytest.raises(IntegrityError) as caught:
+        db.session.flush()
+    db.session.rollback()
+    assert creates.integrity_error(caught.value) == (
+        "A referenced record no longer exists",
+        409,
+    )
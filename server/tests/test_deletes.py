@@ -0,0 +1,93 @@
+from sqlalchemy import func, select
+
+import deletes
+import jobs
+from models import db, Change, Club, Post, Rating, ScreeningRoom, club_members
+
+
+def count(model, **filters):
+    stmt = select(func.count()).select_from(model).filter_by(**filters)
+    return db.session.scalar(stmt, execution_options=deletes.INCLUDE_DELETED)
+
+
+def fill(client, user, room, posts=2):
+    """A member, posts and a rating in room; returns the post ids."""
+    client.post(f"/clubs/{room.club_id}/add_user", json={"user_id": user.id})
+    Rating.upsert(user.id, room.id, 4)
+    db.session.commit()
+    return [
+        client.post(
+            "/posts",
+            json={
+                "content": f"Reel {n}",
+                "author_id": user.id,
+                "screening_room_id": room.id,
+            },
+        ).json["id"]
+        for n in range(posts)
+    ]
+
+
+def test_small_deletes_finish_in_the_request(client, user, room):
+    fill(client, user, room)
+    club_id = room.club_id
+
+    response = client.delete(f"/clubs/{club_id}")
+    assert response.status_code == 200
+
+    assert count(Club, id=club_id) == 0
+    assert count(ScreeningRoom) == 0
+    assert count(Post) == count(Rating) == 0
+    assert db.session.scalar(select(func.count()).select_from(club_members)) == 0
+
+
+def test_large_deletes_are_hidden_then_purged_by_a_job(db_app, client, user, room):
+    db_app.config.update(PURGE_INLINE_LIMIT=2, PURGE_BATCH_SIZE=2)
+    fill(client, user, room, posts=3)
+    movie_id, room_id = room.movie_id, room.id
+
+    response = client.delete(f"/movies/{movie_id}")
+    assert response.status_code == 202
+    # Requests share the test's session; start from an empty one, as they would
+    db.session.expunge_all()
+    assert client.get(f"/movies/{movie_id}").status_code == 404
+    assert client.get(f"/rooms/{room_id}").status_code == 404
+    assert client.get("/posts").json == []
+    assert count(Post) == 3
+
+    assert jobs.work("worker", once=True) == 1
+    (job,) = db.session.scalars(select(jobs.Job)).all()
+    assert job.status == jobs.SUCCEEDED
+    assert jobs.describe(job)["result"]["posts"] == 3
+    assert count(Post) == count(ScreeningRoom) == 0
+
+
+def test_deleting_a_user_purges_their_posts_everywhere(
+    client, login, admin, user, room
+):
+    fill(client, user, room)
+
+    login(admin)
+    assert client.delete(f"/users/{user.id}").status_code == 200
+    assert count(Post) == count(Rating) == 0
+    (club,) = client.get("/clubs?view=summary").json
+    assert (club["member_count"], club["post_count"]) == (0, 0)
+
+
+def test_sync_clients_see_every_delete(client, user, room):
+    post_ids = fill(client, user, room)
+    room_id = room.id
+    client.delete(f"/rooms/{room_id}")
+
+    deleted = {
+        (change.entity_type, change.entity_id)
+        for change in db.session.scalars(select(Change).filter_by(op="delete"))
+    }
+    assert deleted >= {("room", room_id), *(("post", id) for id in post_ids)}
+
+
+def test_purge_can_be_rerun(user, room):
+    room_id = room.id
+    deletes.mark("room", room_id)
+    assert deletes.purge("room", room_id)["rooms"] == 1
+    assert deletes.purge("room", room_id)["posts"] == 0
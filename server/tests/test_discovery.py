@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+from sqlalchemy import select
+
+import discovery
+from models import db, Club, ClubSignature, User
+
+
+@pytest.fixture
+def people(roles):
+    users = [User(f"viewer{n}", f"viewer{n}@example.com") for n in range(12)]
+    db.session.add_all(users)
+    db.session.commit()
+    return [user.id for user in users]
+
+
+@pytest.fixture
+def clubs(db_app):
+    clubs = [Club(name) for name in ("Noir", "Neo-noir", "Musicals")]
+    db.session.add_all(clubs)
+    db.session.commit()
+    return [club.id for club in clubs]
+
+
+def join(client, club_id, user_ids):
+    for user_id in user_ids:
+        response = client.post(f"/clubs/{club_id}/add_user", json={"user_id": user_id})
+        assert response.status_code == 200
+
+
+def stored():
+    return {
+        club_id: discovery._decode(raw).tolist()
+        for club_id, raw in db.session.execute(
+            select(ClubSignature.club_id, ClubSignature.signature)
+        )
+    }
+
+
+def test_signatures_estimate_jaccard_overlap():
+    first = discovery.signature(list(range(0, 300)))
+    second = discovery.signature(list(range(100, 400)))
+    # 200 shared of 400: Jaccard 0.5
+    assert abs((first == second).mean() - 0.5) < 0.2
+    assert (discovery.signature([1, 2, 3]) == discovery.signature([3, 2, 1])).all()
+
+
+def test_overlapping_clubs_are_suggested(client, people, clubs):
+    noir, neo_noir, musicals = clubs
+    join(client, noir, people[:6])
+    join(client, neo_noir, people[:5])
+    join(client, musicals, people[6:])
+
+    response = client.get(f"/users/{people[5]}/suggested-clubs")
+    (result,) = response.json["results"]
+    assert result["club"]["id"] == neo_noir
+    assert result["similarity"] > 0.5
+    assert client.get("/users/999/suggested-clubs").status_code == 404
+
+
+def test_membership_updates_match_a_rebuild(client, people, clubs):
+    noir, neo_noir, _ = clubs
+    join(client, noir, people[:8])
+    join(client, neo_noir, people[4:])
+    for user_id in people[:3]:
+        client.post(f"/clubs/{noir}/remove_user", json={"user_id": user_id})
+    incremental = stored()
+
+    assert discovery.rebuild() == 2
+    assert stored() == incremental
+
+
+def test_rebuild_joins_clubs_split_across_batches(monkeypatch, client, people, clubs):
+    join(client, clubs[0], people)
+    join(client, clubs[1], people[:3])
+    expected = stored()
+
+    monkeypatch.setattr(discovery, "REBUILD_BATCH_SIZE", 5)
+    assert discovery.rebuild() == 2
+    assert stored() == expected
+
+
+def test_empty_clubs_are_not_indexed(client, people, clubs):
+    join(client, clubs[0], people[:1])
+    client.post(f"/clubs/{clubs[0]}/remove_user", json={"user_id": people[0]})
+    assert stored() == {}
+    assert discovery.suggest(people[0]) == []
+
+
+def test_member_hashes_do_not_change():
+    # Stored signatures are only valid while these stay the same
+    hashes = discovery.member_hashes([1])
+    assert hashes.shape == (1, discovery.NUM_PERM)
+    assert hashes.dtype == np.uint32
+    assert hashes[0][:4].tolist() == [233738029, 4032713903, 1118895555, 1808284645]
@@ -0,0 +1,87 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+import export
+from models import db, Club, Post, Rating
+
+
+def lines(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_posts_export_as_ndjson(client, user, room):
+    db.session.add_all(
+        [Post("Zither", user.id, room.id), Post("Sewers", user.id, room.id)]
+    )
+    db.session.commit()
+
+    response = client.get("/export/posts")
+    assert response.mimetype == "application/x-ndjson"
+    assert (
+        response.headers["Content-Disposition"] == "attachment; filename=posts.ndjson"
+    )
+    rows = lines(response)
+    assert [row["content"] for row in rows] == ["Zither", "Sewers"]
+    assert set(rows[0]) == {
+        "id",
+        "content",
+        "author_id",
+        "screening_room_id",
+        "timestamp",
+    }
+
+
+def test_ratings_export_as_csv(client, user, room):
+    Rating.upsert(user.id, room.id, 4)
+    db.session.commit()
+
+    response = client.get("/export/ratings?format=csv")
+    assert response.mimetype == "text/csv"
+    header, row = csv.reader(io.StringIO(response.get_data(as_text=True)))
+    assert header == ["id", "rating", "author_id", "screening_room_id", "timestamp"]
+    assert row[1:4] == ["4", str(user.id), str(room.id)]
+
+
+def test_memberships_export(client, user, room):
+    club = db.session.get(Club, room.club_id)
+    club.members.append(user)
+    db.session.commit()
+
+    rows = lines(client.get("/export/memberships"))
+    assert rows == [{"club_id": room.club_id, "user_id": user.id}]
+
+
+def test_since_filters_by_timestamp(client, user, room):
+    old, new = Post("Old", user.id, room.id), Post("New", user.id, room.id)
+    db.session.add_all([old, new])
+    db.session.flush()
+    db.session.execute(
+        update(Post)
+        .where(Post.id == old.id)
+        .values(timestamp=datetime.utcnow() - timedelta(days=30))
+    )
+    db.session.commit()
+
+    since = (datetime.utcnow() - timedelta(days=1)).isoformat()
+    rows = lines(client.get(f"/export/posts?since={since}"))
+    assert [row["content"] for row in rows] == ["New"]
+
+
+def test_rows_stream_in_batches(user, room):
+    db.session.add_all(Post(f"Post {n}", user.id, room.id) for n in range(5))
+    db.session.commit()
+
+    batches = [
+        len(rows) for rows in export.stream_rows(export.export_statement("posts"), 2)
+    ]
+    assert batches == [2, 2, 1]
+
+
+def test_bad_exports(client):
+    assert client.get("/export/users").status_code == 404
+    assert client.get("/export/posts?format=xml").status_code == 400
+    assert client.get("/export/memberships?since=2026-01-01").status_code == 400
@@ -0,0 +1,135 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select, update
+
+import jobs
+from models import db, Job
+
+
+@pytest.fixture
+def calls(monkeypatch, db_app):
+    """Register test handlers; returns the payloads they were run with."""
+    calls = []
+
+    def record(**payload):
+        calls.append(payload)
+        return {"ok": True}
+
+    def fail(**payload):
+        calls.append(payload)
+        raise RuntimeError("projector jammed")
+
+    def slow(seconds):
+        time.sleep(seconds)
+        return {}
+
+    monkeypatch.setitem(jobs.HANDLERS, "test.record", record)
+    monkeypatch.setitem(jobs.HANDLERS, "test.fail", fail)
+    monkeypatch.setitem(jobs.HANDLERS, "test.slow", slow)
+    db_app.config.update(JOBS_BACKOFF_BASE=0, JOBS_BACKOFF_MAX=0)
+    return calls
+
+
+def enqueue(name, payload=None, **kwargs):
+    job = jobs.enqueue(name, payload, **kwargs)
+    db.session.commit()
+    return job.id
+
+
+def job(job_id):
+    return db.session.get(Job, job_id, populate_existing=True)
+
+
+def test_a_job_is_claimed_once(calls):
+    job_id = enqueue("test.record", {"reel": 1})
+
+    claimed = jobs.claim("first")
+    assert claimed.id == job_id
+    assert jobs.claim("second") is None
+
+    assert jobs.run(claimed, "first")
+    assert calls == [{"reel": 1}]
+    assert job(job_id).status == jobs.SUCCEEDED
+    assert jobs.describe(job(job_id))["result"] == {"ok": True}
+
+
+def test_failed_jobs_retry_until_max_attempts(calls):
+    job_id = enqueue("test.fail", max_attempts=2)
+
+    assert jobs.work("worker", once=True) == 2
+    assert len(calls) == 2
+    failed = job(job_id)
+    assert failed.status == jobs.FAILED
+    assert failed.attempts == 2
+    assert "projector jammed" in failed.last_error
+
+
+def test_delayed_jobs_wait(calls):
+    enqueue("test.record", delay=60)
+    assert jobs.claim("worker") is None
+
+
+def test_dedupe_keys_hold_one_active_job(calls):
+    first = enqueue("test.record", dedupe_key="reel")
+    assert enqueue("test.record", dedupe_key="reel") == first
+
+    jobs.work("worker", once=True)
+    assert enqueue("test.record", dedupe_key="reel") != first
+
+
+def test_unknown_jobs_are_refused(calls):
+    with pytest.raises(jobs.UnknownJobError):
+        jobs.enqueue("test.missing")
+
+
+def test_jobs_of_dead_workers_are_requeued(db_app, calls):
+    job_id = enqueue("test.record")
+    jobs.claim("dead")
+    db.session.execute(
+        update(Job).values(heartbeat_at=datetime.utcnow() - timedelta(hours=1))
+    )
+    db.session.commit()
+
+    assert jobs.requeue_expired() == 1
+    assert jobs.claim("alive").id == job_id
+    assert job(job_id).attempts == 2
+
+
+def test_heartbeats_keep_long_jobs_leased(db_app, calls):
+    db_app.config["JOBS_LEASE_SECONDS"] = 0.4
+    job_id = enqueue("test.slow", {"seconds": 0.5})
+    claimed = jobs.claim("worker")
+    started = claimed.heartbeat_at
+
+    assert jobs.run(claimed, "worker")
+    assert job(job_id).heartbeat_at > started
+    assert jobs.requeue_expired() == 0
+
+
+def test_a_worker_that_lost_its_lease_drops_its_result(calls):
+    job_id = enqueue("test.record")
+    claimed = jobs.claim("slow")
+    db.session.execute(update(Job).values(locked_by="other"))
+    db.session.commit()
+
+    assert not jobs.run(claimed, "slow")
+    lost = job(job_id)
+    assert lost.status == jobs.RUNNING
+    assert lost.locked_by == "other"
+    assert lost.result is None
+
+
+def test_admins_enqueue_over_http(client, login, user, admin, calls):
+    body = {"name": "test.record", "payload": {"reel": 2}}
+    assert client.post("/jobs", json=body).status_code == 401
+    login(user)
+    assert client.post("/jobs", json=body).status_code == 401
+
+    login(admin)
+    response = client.post("/jobs", json=body)
+    assert response.status_code == 202
+    assert client.get(response.headers["Location"]).json["status"] == jobs.QUEUED
+    assert client.post("/jobs", json={"name": "test.missing"}).status_code == 400
+    assert db.session.scalar(select(Job.name)) == "test.record"
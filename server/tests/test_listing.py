@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+import deletes
+import listing
+from models import db, Post, Rating
+
+
+@pytest.fixture
+def posts(user, room):
+    db.session.add_all(Post(f"Reel {n}", user.id, room.id) for n in range(5))
+    Rating.upsert(user.id, room.id, 3)
+    db.session.commit()
+
+
+def test_summaries_are_flat_rows(client, posts, room):
+    summary = client.get("/posts?view=summary").json
+    assert [post["content"] for post in summary] == [f"Reel {n}" for n in range(5)]
+    assert set(summary[0]) == {
+        "id",
+        "content",
+        "author_id",
+        "screening_room_id",
+        "timestamp",
+    }
+    (rating,) = client.get("/ratings?view=summary").json
+    assert rating["rating"] == 3
+    assert client.get("/rooms?view=summary").json == [
+        {"id": room.id, "club_id": room.club_id, "movie_id": room.movie_id}
+    ]
+
+
+def test_summaries_stream_in_batches(monkeypatch, client, posts):
+    monkeypatch.setattr(listing, "BATCH_SIZE", 2)
+    response = client.get("/posts?view=summary")
+
+    assert response.is_streamed
+    chunks = list(response.response)
+    assert chunks[0] == b"[" and chunks[-1] == b"]\n"
+    assert len(chunks) == 2 + 3
+    assert len(json.loads(b"".join(chunks))) == 5
+
+
+def test_empty_summaries_are_empty_arrays(client, room):
+    response = client.get("/posts?view=summary")
+    assert response.get_data(as_text=True) == "[]\n"
+
+
+def test_summaries_hide_deleted_rows(client, posts, room):
+    deletes.mark("room", room.id)
+    db.session.commit()
+    assert client.get("/rooms?view=summary").json == []
+    assert client.get("/posts?view=summary").json == []
+
+
+def test_users_summary_is_for_admins(client, login, user, admin):
+    assert client.get("/users?view=summary").status_code == 401
+    login(admin)
+    users = client.get("/users?view=summary").json
+    assert [user["username"] for user in users] == ["ingrid", "admin"]
+
+
+def test_unknown_views_are_400(client):
+    assert client.get("/posts?view=compact").status_code == 400
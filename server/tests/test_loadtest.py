@@ -0,0 +1,64 @@
+import itertools
+import time
+
+import loadtest
+
+
+class FakeSession:
+    def __init__(self, status=200, latency=0.0):
+        self.status = status
+        self.latency = latency
+
+    def request(self, method, path, body=None):
+        time.sleep(self.latency)
+        return self.status, b"{}"
+
+
+def requests(session, name="movies"):
+    return itertools.repeat((name, session, "GET", "/movies", None))
+
+
+def stage(session, rate=200, duration=0.5, concurrency=8, name="movies"):
+    report = loadtest.run_stage(requests(session, name), rate, duration, concurrency)
+    report["saturated"] = loadtest.saturated(report, 0.01, None)
+    return report
+
+
+def test_an_idle_server_is_not_saturated():
+    report = stage(FakeSession())
+    assert report["saturated"] == []
+    # At most the last arrival, sent as the window closed
+    assert report["queued_at_end"] <= 1
+    assert report["errors"] == 0
+
+
+def test_a_low_rate_stage_is_not_saturated():
+    # Few, sparse arrivals: the drain after the window must not count
+    report = stage(FakeSession(latency=0.01), rate=10, duration=1)
+    assert "throughput" not in report["saturated"]
+
+
+def test_a_server_falling_behind_is_saturated():
+    report = stage(FakeSession(latency=0.05), rate=100, duration=0.3, concurrency=1)
+    assert "throughput" in report["saturated"]
+    assert report["queued_at_end"] > 0
+
+
+def test_throttled_requests_are_not_errors():
+    report = stage(FakeSession(status=429), name="login")
+    assert report["errors"] == 0
+    assert report["throttled"] == report["requests"] > 0
+    assert report["routes"]["login"]["throttled"] == report["throttled"]
+    assert report["saturated"] == []
+
+
+def test_server_errors_saturate():
+    report = stage(FakeSession(status=500))
+    assert report["error_rate"] == 1.0
+    assert "errors" in report["saturated"]
+
+
+def test_summarize_percentiles():
+    summary = loadtest.summarize([0.003, 0.001, 0.002], {"200": 3}, 0, 0)
+    assert summary["latency_ms"] == {"p50": 2.0, "p90": 3.0, "p99": 3.0, "max": 3.0}
+    assert summary["error_rate"] == 0.0
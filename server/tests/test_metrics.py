@@ -0,0 +1,45 @@
+import shutil
+
+import pytest
+
+from config import create_app
+
+from conftest import CONFIG
+
+
+@pytest.fixture
+def metrics_client(migrated_db, tmp_path):
+    path = tmp_path / "filmclub.db"
+    shutil.copy(migrated_db, path)
+    app = create_app(
+        dict(
+            CONFIG,
+            SQLALCHEMY_DATABASE_URI=f"sqlite:///{path}",
+            METRICS_ENABLED=True,
+            METRICS_TOKEN="s3cret",
+        )
+    )
+    with app.app_context():
+        yield app.test_client()
+
+
+def scrape(client, token):
+    return client.get("/metrics", headers={"Authorization": f"Bearer {token}"})
+
+
+def test_metrics_need_the_token(metrics_client):
+    assert metrics_client.get("/metrics").status_code == 401
+    assert scrape(metrics_client, "wrong").status_code == 401
+
+
+def test_metrics_count_requests(metrics_client):
+    assert metrics_client.get("/movies").status_code == 200
+
+    response = scrape(metrics_client, "s3cret")
+    assert response.status_code == 200
+    assert b'http_requests_total{endpoint="movies"' in response.data
+    assert b"db_statement_duration_seconds" in response.data
+
+
+def test_metrics_are_off_by_default(app):
+    assert "metrics" not in app.view_functions
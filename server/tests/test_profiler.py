@@ -0,0 +1,84 @@
+import sys
+import threading
+import time
+
+import profiler
+from models import db, RequestProfile
+
+
+def profiled(client, url="/movies"):
+    return client.get(url, headers={"X-Profile": "1"})
+
+
+def test_collapse_lists_frames_outermost_first():
+    def inner():
+        return profiler.collapse(sys._getframe())
+
+    frames = inner().split(";")
+    assert frames[-1].startswith("inner (tests/test_profiler.py:")
+    assert frames[-2].startswith("test_collapse_lists_frames_outermost_first (")
+
+
+def test_admins_can_profile_a_request(db_app, client, login, admin):
+    db_app.config["PROFILE_INTERVAL"] = 0.001
+    login(admin)
+
+    response = profiled(client)
+    profile = db.session.get(RequestProfile, int(response.headers["X-Profile-Id"]))
+    assert (profile.method, profile.path, profile.status) == ("GET", "/movies", 200)
+    assert profile.endpoint == "movies"
+    if profile.samples:
+        stack, _, count = profile.stacks.splitlines()[0].rpartition(" ")
+        assert int(count) >= 1 and ";" in stack
+
+    listed = client.get("/profiles").json
+    assert [entry["id"] for entry in listed] == [profile.id]
+    assert client.get(f"/profiles/{profile.id}").mimetype == "text/plain"
+
+
+def test_others_are_not_profiled(client, login, user):
+    assert "X-Profile-Id" not in profiled(client).headers
+    login(user)
+    assert "X-Profile-Id" not in profiled(client).headers
+    assert client.get("/profiles").status_code == 401
+
+
+def test_requests_are_sampled_at_the_configured_rate(db_app, client):
+    db_app.config["PROFILE_SAMPLE_RATE"] = 1.0
+    assert "X-Profile-Id" in client.get("/movies").headers
+    db_app.config["PROFILE_SAMPLE_RATE"] = 0
+    assert "X-Profile-Id" not in client.get("/movies").headers
+
+
+def test_only_the_newest_profiles_are_kept(db_app, client):
+    db_app.config.update(PROFILE_SAMPLE_RATE=1.0, PROFILE_KEEP=2)
+    ids = [int(client.get("/movies").headers["X-Profile-Id"]) for _ in range(4)]
+    assert [p.id for p in profiler.recent()] == ids[:1:-1]
+
+
+def test_merged_profiles_sum_their_stacks():
+    profiles = [
+        RequestProfile(stacks="a;b 2\na;c 1"),
+        RequestProfile(stacks="a;b 3"),
+    ]
+    assert profiler.merged(profiles) == "a;b 5\na;c 1"
+
+
+def test_the_sampler_reads_the_profiled_thread():
+    sampler = profiler.Sampler()
+    sampler.interval = 0.001
+    done = threading.Event()
+
+    def busy():
+        sampler.start(threading.get_ident())
+        while not done.is_set():
+            sum(range(1000))
+
+    thread = threading.Thread(target=busy)
+    thread.start()
+    time.sleep(0.1)
+    done.set()
+    thread.join()
+    stacks = sampler.stop(thread.ident)
+    assert sum(stacks.values()) > 0
+    assert all("busy (tests/test_profiler.py:" in stack for stack in stacks)
@@ -0,0 +1,71 @@
+import os
+
+from flask_migrate import upgrade
+from sqlalchemy import func, select, text
+
+from config import create_app
+from models import db, Rating
+
+from conftest import CONFIG, SERVER
+
+MIGRATIONS = os.path.join(SERVER, "migrations")
+
+
+def rate(client, user, room, rating):
+    return client.post(
+        "/ratings",
+        json={"rating": rating, "author_id": user.id, "screening_room_id": room.id},
+    )
+
+
+def test_a_repeat_vote_overwrites_the_first(client, user, room):
+    first = rate(client, user, room, 3)
+    assert first.status_code == 201
+    assert first.json["created"] is True
+
+    second = rate(client, user, room, 5)
+    assert second.status_code == 200
+    assert second.json["created"] is False
+    assert second.json["id"] == first.json["id"]
+    assert second.json["rating"] == 5
+
+    assert db.session.scalar(select(func.count()).select_from(Rating)) == 1
+    assert db.session.get(Rating, first.json["id"]).version == 2
+
+
+def test_upsert_reports_whether_it_created(user, admin, room):
+    rating_id, created = Rating.upsert(user.id, room.id, 2)
+    assert created
+    assert Rating.upsert(user.id, room.id, 4) == (rating_id, False)
+    other_id, created = Rating.upsert(admin.id, room.id, 4)
+    assert created and other_id != rating_id
+
+
+def test_the_migration_keeps_the_latest_duplicate(tmp_path):
+    app = create_app(
+        dict(
+            CONFIG,
+            SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'filmclub.db'}",
+            MIGRATIONS_ENABLED=True,
+        )
+    )
+    with app.app_context():
+        upgrade(directory=MIGRATIONS, revision="aa5bca1a837f")
+        # Votes from before the unique index, three by one user
+        for author_id, rating in ((1, 1), (1, 2), (1, 3), (2, 4)):
+            db.session.execute(
+                text(
+                    "INSERT INTO ratings (rating, author_id, screening_room_id)"
+                    " VALUES (:rating, :author_id, 1)"
+                ),
+                {"rating": rating, "author_id": author_id},
+            )
+        db.session.commit()
+
+        upgrade(directory=MIGRATIONS, revision="6185868f9af2")
+        rows = db.session.execute(
+            text("SELECT author_id, rating FROM ratings ORDER BY author_id")
+        ).all()
+        assert [tuple(row) for row in rows] == [(1, 3), (2, 4)]
+        db.session.remove()
+        db.engine.dispose()
@@ -0,0 +1,48 @@
+import pytest
+from sqlalchemy import select
+
+import readmodels
+from models import db, Genre, Movie, Post, Rating
+from schemas import PostSchema, RatingSchema, MovieSchema, get_dumper
+
+
+@pytest.fixture
+def rows(user, room):
+    movie = db.session.get(Movie, room.movie_id)
+    movie.genres.append(Genre(1, "Noir"))
+    db.session.add(Post("Cuckoo clocks", user.id, room.id))
+    Rating.upsert(user.id, room.id, 5)
+    db.session.commit()
+
+
+def read(model):
+    rows = db.session.execute(select(*readmodels.columns(model))).all()
+    return readmodels.build(model, rows)
+
+
+@pytest.mark.parametrize("model, schema", [(Post, PostSchema), (Rating, RatingSchema)])
+@pytest.mark.parametrize("fast", [True, False])
+def test_read_models_dump_like_their_models(db_app, rows, model, schema, fast):
+    db_app.config["SCHEMA_FAST_DUMP"] = fast
+    dump = get_dumper(schema, many=True)
+
+    assert dump(read(model)) == dump(db.session.scalars(select(model)).all())
+    assert dump(read(model)) == schema(many=True).dump(
+        db.session.scalars(select(model))
+    )
+
+
+@pytest.mark.parametrize("fast", [True, False])
+def test_movie_read_models_dump_like_movies(db_app, rows, fast):
+    db_app.config["SCHEMA_FAST_DUMP"] = fast
+    dump = get_dumper(MovieSchema, many=True)
+
+    movies = db.session.scalars(select(Movie)).all()
+    assert dump(readmodels.movies()) == dump(movies)
+    assert dump(readmodels.movies()) == MovieSchema(many=True).dump(movies)
+
+
+def test_rating_reads_have_no_author(rows):
+    (rating,) = get_dumper(RatingSchema, many=True)(read(Rating))
+    assert "author" not in rating
+    assert rating["author_id"] is not None
@@ -0,0 +1,106 @@
+import pytest
+from sqlalchemy import select
+
+import recommendations
+from models import db, Club, Movie, MovieNeighbor, Rating, ScreeningRoom, User
+
+
+@pytest.fixture
+def state(db_app, tmp_path):
+    db_app.config["RECOMMENDATIONS_STATE_PATH"] = str(tmp_path / "state.npz")
+
+
+@pytest.fixture
+def rooms(db_app):
+    """{title: room id}, one room per movie."""
+    club = Club("Matinee")
+    movies = [Movie(title) for title in ("Brief Encounter", "Odd Man Out", "Zulu")]
+    db.session.add_all([club, *movies])
+    db.session.flush()
+    rooms = {movie.title: ScreeningRoom(club.id, movie.id) for movie in movies}
+    db.session.add_all(rooms.values())
+    db.session.commit()
+    return {title: room.id for title, room in rooms.items()}
+
+
+@pytest.fixture
+def people(roles):
+    users = [User(f"viewer{n}", f"viewer{n}@example.com") for n in range(5)]
+    db.session.add_all(users)
+    db.session.commit()
+    return [user.id for user in users]
+
+
+def rate(votes, rooms):
+    for user_id, title, rating in votes:
+        Rating.upsert(user_id, rooms[title], rating)
+    db.session.commit()
+
+
+def neighbors():
+    return sorted(
+        db.session.execute(
+            select(MovieNeighbor.movie_id, MovieNeighbor.neighbor_id)
+        ).all()
+    )
+
+
+def movie_id(title):
+    return db.session.scalar(select(Movie.id).where(Movie.title == title))
+
+
+# Viewers who love one of the first two movies love the other and dislike
+# the third, and the other way round
+TASTES = [
+    (0, "Brief Encounter", 5),
+    (0, "Odd Man Out", 5),
+    (0, "Zulu", 1),
+    (1, "Brief Encounter", 4),
+    (1, "Odd Man Out", 5),
+    (1, "Zulu", 2),
+    (2, "Brief Encounter", 1),
+    (2, "Odd Man Out", 2),
+    (2, "Zulu", 5),
+]
+
+
+def test_similar_movies_are_recommended(state, rooms, people):
+    rate([(people[n], title, rating) for n, title, rating in TASTES], rooms)
+    rate([(people[3], "Brief Encounter", 5)], rooms)
+
+    stats = recommendations.refresh()
+    assert stats["full"]
+    assert stats["changed_movies"] == 3
+
+    scored = recommendations.recommend(people[3])
+    assert [movie for movie, _ in scored] == [movie_id("Odd Man Out")]
+
+
+def test_the_endpoint_lists_movies(client, state, rooms, people):
+    rate([(people[n], title, rating) for n, title, rating in TASTES], rooms)
+    rate([(people[3], "Odd Man Out", 5)], rooms)
+    recommendations.refresh()
+
+    (result,) = client.get(f"/users/{people[3]}/recommendations").json["results"]
+    assert result["movie"]["title"] == "Brief Encounter"
+    assert result["score"] > 0
+    assert client.get("/users/999/recommendations").status_code == 404
+
+
+def test_incremental_refresh_matches_a_full_one(state, rooms, people):
+    rate([(people[n], title, rating) for n, title, rating in TASTES[:6]], rooms)
+    recommendations.refresh()
+    rate([(people[n], title, rating) for n, title, rating in TASTES[6:]], rooms)
+    rate([(people[4], "Zulu", 4), (people[4], "Odd Man Out", 1)], rooms)
+
+    stats = recommendations.refresh()
+    assert not stats["full"]
+    incremental = neighbors()
+
+    recommendations.refresh(full=True)
+    assert neighbors() == incremental
+
+
+def test_users_without_ratings_get_nothing(state, rooms, people):
+    recommendations.refresh()
+    assert recommendations.recommend(people[0]) == []
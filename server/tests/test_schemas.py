@@ -0,0 +1,66 @@
+import pytest
+
+import schemas
+from models import db, Genre, Movie, Post, Rating
+from schemas import (
+    ClubSchema,
+    MovieSchema,
+    PostSchema,
+    RatingSchema,
+    compile_dumper,
+    get_dumper,
+    get_schema,
+)
+
+
+@pytest.fixture
+def rows(user, room):
+    movie = db.session.get(Movie, room.movie_id)
+    movie.genres.append(Genre(1, "Noir"))
+    db.session.add(Post("Cuckoo clocks", user.id, room.id))
+    Rating.upsert(user.id, room.id, 5)
+    db.session.commit()
+
+
+@pytest.mark.parametrize(
+    "schema_cls, model",
+    [(PostSchema, Post), (RatingSchema, Rating), (MovieSchema, Movie)],
+)
+def test_compiled_dumpers_match_schema_dump(rows, schema_cls, model):
+    objects = db.session.query(model).all()
+    schema = schema_cls(many=True)
+    assert compile_dumper(schema)(objects) == schema.dump(objects)
+
+
+def test_compiled_dumpers_follow_only_and_exclude(rows):
+    post = db.session.query(Post).one()
+    for kwargs in ({"only": ("id", "movie")}, {"exclude": ("author", "timestamp")}):
+        schema = PostSchema(**kwargs)
+        assert compile_dumper(schema)(post) == schema.dump(post)
+
+
+def test_missing_hops_leave_the_key_out(rows):
+    post = Post("Detached", 1, None)
+    schema = PostSchema()
+    assert compile_dumper(schema)(post) == schema.dump(post)
+    assert "movie" not in compile_dumper(schema)(post)
+
+
+def test_schemas_and_dumpers_are_built_once(app):
+    assert get_schema(PostSchema, many=True) is get_schema(PostSchema, many=True)
+    assert get_schema(PostSchema, only=["id", "content"]) is get_schema(
+        PostSchema, only=["content", "id"]
+    )
+    get_dumper(PostSchema, many=True)
+    get_dumper(PostSchema, many=True)
+    assert schemas._cached_dumper.cache_info().hits >= 1
+
+
+def test_other_schemas_use_schema_dump(app):
+    assert schemas._cached_dumper(ClubSchema, False, (), (), True) == (
+        get_schema(ClubSchema).dump
+    )
+    # SCHEMA_FAST_DUMP off
+    assert schemas._cached_dumper(PostSchema, False, (), (), False) == (
+        get_schema(PostSchema).dump
+    )
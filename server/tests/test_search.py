@@ -0,0 +1,56 @@
+def post(client, user, room, content):
+    response = client.post(
+        "/posts",
+        json={"content": content, "author_id": user.id, "screening_room_id": room.id},
+    )
+    assert response.status_code == 201, response.json
+    return response.json["id"]
+
+
+def search(client, query):
+    return client.get(f"/posts/search?{query}")
+
+
+def test_search_marks_the_matching_words(client, user, room):
+    post_id = post(client, user, room, "The cuckoo clock speech on the wheel")
+
+    (result,) = search(client, "q=cuckoo").json["results"]
+    assert result["id"] == post_id
+    assert "<mark>cuckoo</mark>" in result["snippet"]
+    assert result["club_id"] == room.club_id
+    assert result["movie_id"] == room.movie_id
+
+
+def test_search_follows_edits_and_deletes(client, user, room):
+    post_id = post(client, user, room, "Zither music")
+    client.patch(f"/posts/{post_id}", json={"content": "Sewer chase"})
+
+    assert search(client, "q=zither").json["results"] == []
+    assert [r["id"] for r in search(client, "q=sewer").json["results"]] == [post_id]
+
+    client.delete(f"/posts/{post_id}")
+    assert search(client, "q=sewer").json["results"] == []
+
+
+def test_search_pages_by_rank(client, user, room):
+    posts = {post(client, user, room, f"ferris wheel number {n}") for n in range(3)}
+
+    seen, cursor = [], ""
+    while cursor is not None:
+        page = search(client, f"q=ferris&limit=2&cursor={cursor}").json
+        assert len(page["results"]) <= 2
+        seen += [result["id"] for result in page["results"]]
+        cursor = page["next_cursor"]
+    assert sorted(seen) == sorted(posts)
+
+
+def test_search_input_is_never_query_syntax(client, user, room):
+    post_id = post(client, user, room, "Lime OR near the wheel, NEAR(Holly)")
+
+    found = search(client, 'q="Lime" OR NEAR(').json["results"]
+    assert [result["id"] for result in found] == [post_id]
+
+
+def test_bad_searches_are_400(client, room):
+    assert search(client, "q=*!?").status_code == 400
+    assert search(client, "q=lime&cursor=not-a-cursor").status_code == 400
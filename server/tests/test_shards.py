@@ -0,0 +1,93 @@
+import pytest
+from sqlalchemy import select
+
+import shards
+from models import db, Movie, ClubShard, Post
+
+
+@pytest.fixture
+def shard_count():
+    return 1
+
+
+@pytest.fixture
+def movie(db_app):
+    movie = Movie("Stalker")
+    db.session.add(movie)
+    db.session.commit()
+    return movie
+
+
+@pytest.fixture
+def rooms(client, movie):
+    """{shard key: room id}, one club and room on each database."""
+    rooms = {}
+    for name in ("Zone", "Room"):
+        club = client.post("/clubs", json={"name": name, "description": name}).json
+        room = client.post(
+            "/rooms", json={"club_id": club["id"], "movie_id": movie.id}
+        ).json
+        rooms[shards.of_club(club["id"])] = room["id"]
+    return rooms
+
+
+def post(client, user, room_id, content):
+    response = client.post(
+        "/posts",
+        json={"content": content, "author_id": user.id, "screening_room_id": room_id},
+    )
+    assert response.status_code == 201, response.json
+    return response.json["id"]
+
+
+def stored_on(key, post_id):
+    with shards.using(key):
+        return db.session.scalar(select(Post.id).where(Post.id == post_id))
+
+
+def test_new_clubs_go_to_the_emptiest_database(rooms):
+    assert set(rooms) == {None, "shard1"}
+    assert db.session.scalar(select(ClubShard.shard).where(ClubShard.shard == "shard1"))
+
+
+def test_posts_are_stored_with_their_club(client, user, rooms):
+    post_id = post(client, user, rooms["shard1"], "A room where wishes come true")
+
+    assert stored_on("shard1", post_id) == post_id
+    assert stored_on(None, post_id) is None
+    assert client.get(f"/posts/{post_id}").json["id"] == post_id
+
+
+def test_search_finds_posts_on_every_shard(client, user, rooms):
+    on_shard = post(client, user, rooms["shard1"], "zebra crossing the zone")
+    on_primary = post(client, user, rooms[None], "a zebra in the room")
+
+    found = client.get("/posts/search?q=zebra").json["results"]
+    assert sorted(result["id"] for result in found) == sorted([on_shard, on_primary])
+
+    club_id = next(r for r in found if r["id"] == on_shard)["club_id"]
+    found = client.get(f"/posts/search?q=zebra&club={club_id}").json["results"]
+    assert [result["id"] for result in found] == [on_shard]
+
+
+def test_search_pages_across_shards(client, user, rooms):
+    expected = {
+        post(client, user, rooms[key], f"zebra number {n}")
+        for key in rooms
+        for n in range(2)
+    }
+    seen, cursor = [], None
+    while True:
+        url = "/posts/search?q=zebra&limit=1"
+        page = client.get(url + (f"&cursor={cursor}" if cursor else "")).json
+        seen += [result["id"] for result in page["results"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert sorted(seen) == sorted(expected)
+
+
+def test_search_skips_posts_of_deleted_rooms(client, user, rooms):
+    post(client, user, rooms["shard1"], "zebra")
+    assert client.delete(f"/rooms/{rooms['shard1']}").status_code in (200, 202)
+    assert client.get("/posts/search?q=zebra").json["results"] == []
@@ -0,0 +1,89 @@
+import pytest
+
+from models import db, User
+from throttle import MemoryBucketStore
+
+
+@pytest.fixture
+def throttled_app(db_app):
+    db_app.config["THROTTLE_ENABLED"] = True
+    db_app.config["THROTTLE_LIMITS"] = {
+        "login_ip": (3, 60),
+        "login_username": (2, 300),
+        "signup_ip": (1, 3600),
+    }
+    return db_app
+
+
+@pytest.fixture
+def orson(roles):
+    user = User("orson", "orson@example.com")
+    user.password_hash = "cuckoo"
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def login(client, password, ip="10.0.0.1", username="orson"):
+    return client.post(
+        "/login",
+        json={"username": username, "password": password},
+        environ_base={"REMOTE_ADDR": ip},
+    )
+
+
+def test_buckets_refill_over_time():
+    store = MemoryBucketStore()
+    assert store.take("k", 2, 1.0, now=0) == (True, 0.0)
+    assert store.take("k", 2, 1.0, now=0) == (True, 0.0)
+    assert store.take("k", 2, 1.0, now=0) == (False, 1.0)
+    assert store.take("k", 2, 1.0, now=1.5)[0]
+
+
+def test_least_recently_used_buckets_are_evicted():
+    store = MemoryBucketStore(max_keys=1)
+    store.take("a", 1, 1.0, now=0)
+    store.take("b", 1, 1.0, now=0)
+    assert store.take("a", 1, 1.0, now=0)[0]
+
+
+def test_logins_per_ip_are_limited(throttled_app, client, orson):
+    for n in range(3):
+        assert login(client, "wrong", username=f"user{n}").status_code == 401
+
+    response = login(client, "cuckoo")
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert login(client, "cuckoo", ip="10.0.0.2").status_code == 200
+
+
+def test_only_failed_logins_count_against_an_account(throttled_app, client, orson):
+    for n in range(3):
+        assert login(client, "cuckoo", ip=f"10.0.1.{n}").status_code == 200
+    assert login(client, "wrong", ip="10.0.2.1").status_code == 401
+    assert login(client, "wrong", ip="10.0.2.2").status_code == 401
+
+    # Even the right password, from anywhere, until the bucket refills
+    assert login(client, "cuckoo", ip="10.0.2.3").status_code == 429
+    stats = client.application.extensions["throttle"].stats()
+    assert stats["login_username"] == {"allowed": 5, "rejected": 1, "refunded": 3}
+
+
+def test_an_ip_rejection_does_not_drain_the_account(throttled_app, client, orson):
+    for _ in range(3):
+        login(client, "cuckoo")
+    assert login(client, "wrong").status_code == 429
+    assert login(client, "wrong").status_code == 429
+
+    assert login(client, "cuckoo", ip="10.0.0.2").status_code == 200
+
+
+def test_signups_per_ip_are_limited(throttled_app, client, roles):
+    body = {"username": "holly", "email": "holly@example.com", "password": "x"}
+    assert client.post("/signup", json=body).status_code == 201
+    assert client.post("/signup", json=body).status_code == 429
+
+
+def test_throttling_can_be_turned_off(db_app, client, orson):
+    for _ in range(30):
+        assert login(client, "wrong").status_code == 401
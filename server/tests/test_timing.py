@@ -0,0 +1,58 @@
+import json
+import logging
+import re
+
+import timing
+from config import create_app
+
+from conftest import CONFIG
+
+
+def server_timing(response):
+    """{phase: (ms, desc)} from a Server-Timing header."""
+    phases = {}
+    for entry in response.headers["Server-Timing"].split(", "):
+        name, *params = entry.split(";")
+        values = dict(param.split("=", 1) for param in params)
+        phases[name] = (float(values["dur"]), values.get("desc"))
+    return phases
+
+
+def test_responses_report_each_phase(client, room):
+    phases = server_timing(client.get("/movies?q=Third"))
+
+    assert list(phases) == [*timing.PHASES, "total"]
+    ms, desc = phases["db"]
+    assert re.fullmatch(r'"[1-9]\d* queries"', desc)
+    assert phases["total"][0] >= ms
+
+
+def test_timings_can_be_logged(monkeypatch, db_app, client, room, caplog):
+    db_app.config["TIMING_LOG"] = True
+    logger = db_app.logger.getChild("timing")
+    # Running the migrations (fileConfig in env.py) disabled existing loggers
+    monkeypatch.setattr(logger, "disabled", False)
+    with caplog.at_level(logging.INFO, logger=logger.name):
+        client.get(f"/rooms/{room.id}")
+
+    (record,) = [r for r in caplog.records if r.name.endswith(".timing")]
+    line = json.loads(record.getMessage())
+    assert (line["method"], line["endpoint"], line["status"]) == (
+        "GET",
+        "screeningroomsbyid",
+        200,
+    )
+    assert set(line["ms"]) == {*timing.PHASES, "total"}
+
+
+def test_server_timing_can_be_turned_off():
+    app = create_app(dict(CONFIG, SERVER_TIMING=False))
+    with app.app_context():
+        response = app.test_client().delete("/logout")
+    assert "Server-Timing" not in response.headers
+
+
+def test_phases_outside_requests_are_not_timed():
+    with timing.phase("db"):
+        pass
+    assert timing.timed("dump", lambda x: x + 1)(1) == 2
@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+import trending
+from models import db, Club, Movie, Post, ScreeningRoom
+
+NOW = datetime(2026, 10, 19, 12, 30)
+
+
+@pytest.fixture
+def rooms(room):
+    """Two rooms showing the same movie, and one showing another."""
+    other = Movie("Odd Man Out")
+    db.session.add(other)
+    db.session.flush()
+    second = ScreeningRoom(room.club_id, room.movie_id)
+    third = ScreeningRoom(room.club_id, other.id)
+    db.session.add_all([second, third])
+    db.session.commit()
+    return [room.id, second.id, third.id]
+
+
+def record(room_id, hours_ago=0, kind="post"):
+    trending.record(kind, room_id, at=NOW - timedelta(hours=hours_ago))
+
+
+def scores(entity_type):
+    return {entry["id"]: entry for entry in trending.top(entity_type, now=NOW)}
+
+
+def test_scores_halve_every_half_life(rooms):
+    record(rooms[0], hours_ago=trending.HALF_LIFE_HOURS)
+    record(rooms[0])
+    record(rooms[1], kind="rating")
+    db.session.commit()
+
+    room_scores = scores("room")
+    assert room_scores[rooms[0]]["score"] == pytest.approx(1.5)
+    assert room_scores[rooms[1]]["score"] == pytest.approx(0.5)
+    movie_id = db.session.get(ScreeningRoom, rooms[0]).movie_id
+    assert scores("movie")[movie_id]["score"] == pytest.approx(2.0)
+
+
+def test_recent_activity_ranks_first(rooms):
+    for _ in range(3):
+        record(rooms[0], hours_ago=3 * trending.HALF_LIFE_HOURS)
+    record(rooms[2])
+    db.session.commit()
+
+    ranked = trending.top("room", now=NOW)
+    assert [entry["id"] for entry in ranked] == [rooms[2], rooms[0]]
+
+
+def test_counts_cover_the_window_only(rooms):
+    record(rooms[0], hours_ago=trending.WINDOW_HOURS + 1)
+    record(rooms[0], hours_ago=2)
+    record(rooms[0], hours_ago=1, kind="rating")
+    db.session.commit()
+
+    entry = scores("room")[rooms[0]]
+    assert (entry["posts"], entry["ratings"]) == (1, 1)
+
+
+def test_prune_drops_old_buckets_and_faded_scores(rooms):
+    record(rooms[0], hours_ago=30 * trending.HALF_LIFE_HOURS)
+    record(rooms[1])
+    db.session.commit()
+
+    # The movie both rooms show is still trending through the new post
+    buckets, faded = trending.prune(now=NOW)
+    assert (buckets, faded) == (2, 1)
+    assert set(scores("room")) == {rooms[1]}
+
+
+def test_rebuild_matches_recorded_scores(user, rooms):
+    for room_id, hours_ago in ((rooms[0], 5), (rooms[0], 50), (rooms[2], 1)):
+        post = Post("Zither", user.id, room_id)
+        db.session.add(post)
+        db.session.flush()
+        at = NOW - timedelta(hours=hours_ago)
+        db.session.execute(update(Post).where(Post.id == post.id).values(timestamp=at))
+        record(room_id, hours_ago)
+    db.session.commit()
+    recorded = scores("room"), scores("movie")
+
+    assert trending.rebuild(now=NOW) == 4
+    rebuilt = scores("room"), scores("movie")
+    for before, after in zip(recorded, rebuilt):
+        assert set(before) == set(after)
+        for entity_id, entry in before.items():
+            assert after[entity_id]["score"] == pytest.approx(entry["score"])
+            assert after[entity_id]["posts"] == entry["posts"]
+
+
+def test_the_endpoint_names_rooms(client, user, rooms):
+    client.post(
+        "/posts",
+        json={"content": "Zither", "author_id": user.id, "screening_room_id": rooms[2]},
+    )
+    (entry,) = client.get("/trending/rooms").json["results"]
+    assert entry["room"]["id"] == rooms[2]
+    assert entry["movie"]["title"] == "Odd Man Out"
+    assert entry["club"]["name"] == db.session.get(Club, entry["club"]["id"]).name
@@ -0,0 +1,226 @@
+import math
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from functools import wraps
+
+from flask import current_app, request, make_response
+
+# Token-bucket throttling for the credential endpoints
+#
+# Login and signup spend a bcrypt hash per request, so they are rate
+# limited per client IP and per username *before* any database lookup or
+# hashing happens. Buckets live in a pluggable store: an in-process dict
+# for tests and single-worker runs, or Redis when several workers need to
+# share limits.
+#
+# A rule can charge only some outcomes: the login username bucket takes a
+# token up front, as every rule does, and hands it back when the login
+# succeeds, so only failed attempts against an account count towards it.
+
+
+class MemoryBucketStore:
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, refill_rate, now):
+        """Take one token; return (allowed, seconds until a token is free)."""
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_rate)
+            if tokens >= 1:
+                tokens -= 1
+                retry_after = 0.0
+            else:
+                retry_after = (1 - tokens) / refill_rate
+            self._buckets[key] = (tokens, now)
+            # Least recently used buckets go first; an evicted bucket simply
+            # starts full again, which is the same as a long-idle client.
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return retry_after == 0.0, retry_after
+
+    def refund(self, key, capacity, refill_rate, now):
+        """Give back a token taken by take()."""
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_rate + 1)
+            self._buckets[key] = (tokens, now)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class RedisBucketStore:
+    TAKE_SCRIPT = """
+        local capacity = tonumber(ARGV[1])
+        local rate = tonumber(ARGV[2])
+        local now = tonumber(ARGV[3])
+        local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+        local tokens = tonumber(bucket[1]) or capacity
+        local ts = tonumber(bucket[2]) or now
+        tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+        local retry = 0
+        if tokens >= 1 then
+            tokens = tokens - 1
+        else
+            retry = (1 - tokens) / rate
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+        redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+        return tostring(retry)
+    """
+    REFUND_SCRIPT = """
+        local capacity = tonumber(ARGV[1])
+        local rate = tonumber(ARGV[2])
+        local now = tonumber(ARGV[3])
+        local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+        local tokens = tonumber(bucket[1]) or capacity
+        local ts = tonumber(bucket[2]) or now
+        tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate + 1)
+        redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+        redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+    """
+
+    def __init__(self, url, prefix="throttle:"):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError(
+                "THROTTLE_STORAGE_URI points at Redis but the 'redis' package "
+                "is not installed"
+            )
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+        self._take = self._client.register_script(self.TAKE_SCRIPT)
+        self._refund = self._client.register_script(self.REFUND_SCRIPT)
+
+    def take(self, key, capacity, refill_rate, now):
+        retry_after = float(
+            self._take(keys=[self.prefix + key], args=[capacity, refill_rate, now])
+        )
+        return retry_after == 0.0, retry_after
+
+    def refund(self, key, capacity, refill_rate, now):
+        self._refund(keys=[self.prefix + key], args=[capacity, refill_rate, now])
+
+    def clear(self):
+        for key in self._client.scan_iter(self.prefix + "*"):
+            self._client.delete(key)
+
+
+def create_store(uri):
+    if uri.startswith("memory://"):
+        return MemoryBucketStore()
+    if uri.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBucketStore(uri)
+    raise ValueError(f"Unsupported THROTTLE_STORAGE_URI '{uri}'")
+
+
+class Limiter:
+    def __init__(self, store):
+        self.store = store
+        self._counts = defaultdict(lambda: {"allowed": 0, "rejected": 0, "refunded": 0})
+        self._lock = threading.Lock()
+
+    def hit(self, rule, key):
+        capacity, period = current_app.config["THROTTLE_LIMITS"][rule]
+        allowed, retry_after = self.store.take(
+            f"{rule}:{key}", capacity, capacity / period, time.time()
+        )
+        with self._lock:
+            self._counts[rule]["allowed" if allowed else "rejected"] += 1
+        return allowed, retry_after
+
+    def refund(self, rule, key):
+        capacity, period = current_app.config["THROTTLE_LIMITS"][rule]
+        self.store.refund(f"{rule}:{key}", capacity, capacity / period, time.time())
+        with self._lock:
+            self._counts[rule]["refunded"] += 1
+
+    def stats(self):
+        with self._lock:
+            return {rule: dict(counts) for rule, counts in self._counts.items()}
+
+
+def get_limiter():
+    limiter = current_app.extensions.get("throttle")
+    if limiter is None:
+        limiter = Limiter(create_store(current_app.config["THROTTLE_STORAGE_URI"]))
+        current_app.extensions["throttle"] = limiter
+    return limiter
+
+
+# Key functions
+
+
+def client_ip():
+    if current_app.config.get("THROTTLE_TRUST_FORWARDED_FOR"):
+        forwarded = request.headers.get("X-Forwarded-For", "")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.remote_addr or "unknown"
+
+
+def json_field(name):
+    def key():
+        data = request.get_json(silent=True)
+        value = data.get(name) if isinstance(data, dict) else None
+        return str(value).strip().lower() if value else None
+
+    return key
+
+
+def _status(rv):
+    if isinstance(rv, tuple):
+        return rv[1] if len(rv) > 1 and isinstance(rv[1], int) else 200
+    return getattr(rv, "status_code", 200)
+
+
+def failed(rv):
+    """Charge only for responses refusing the request (4xx)."""
+    return 400 <= _status(rv) < 500
+
+
+def throttled(*rules):
+    """Reject with 429 once any (rule, key_func[, charge]) bucket is empty.
+
+    Rules are checked in order and stop at the first rejection, so a
+    blocked IP does not also drain the username bucket it was guessing.
+    A rule with charge keeps its token only when charge(response) is true.
+    """
+
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not current_app.config["THROTTLE_ENABLED"]:
+                return f(*args, **kwargs)
+            limiter = get_limiter()
+            conditional = []
+            for rule, key_func, *charge in rules:
+                key = key_func()
+                if key is None:
+                    continue
+                allowed, retry_after = limiter.hit(rule, key)
+                if not allowed:
+                    for taken_rule, taken_key, _ in conditional:
+                        limiter.refund(taken_rule, taken_key)
+                    return make_response(
+                        {"msg": "Too many attempts, try again later"},
+                        429,
+                        {"Retry-After": str(max(1, math.ceil(retry_after)))},
+                    )
+                if charge:
+                    conditional.append((rule, key, charge[0]))
+            rv = f(*args, **kwargs)
+            for rule, key, charge in conditional:
+                if not charge(rv):
+                    limiter.refund(rule, key)
+            return rv
+
+        return decorated_function
+
+    return decorator
@@ -0,0 +1,133 @@
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+from flask import Request, current_app, g, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+from flask_restful import reqparse
+from flask_restful.representations.json import output_json as restful_output_json
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Request phase timers
+#
+# Each request adds up the time spent in a handful of phases: parsing the
+# body and query string, auth checks, SQL statements, schema dumps and
+# JSON encoding. They are sent back as a Server-Timing header, which
+# browser devtools show per request, and, with TIMING_LOG on, logged as one
+# JSON line on the app logger's "timing" child, through whatever handlers
+# the app logger has. Phases can overlap: the SQL run by an auth check
+# counts towards both auth and db.
+
+PHASES = ("parse", "auth", "db", "dump", "encode")
+
+
+@contextmanager
+def phase(name):
+    if not has_request_context() or "timings" not in g:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        g.timings[name] += time.perf_counter() - started
+
+
+def timed(name, f):
+    """f wrapped so that its calls count towards phase name."""
+
+    def wrapper(*args, **kwargs):
+        with phase(name):
+            return f(*args, **kwargs)
+
+    return wrapper
+
+
+class TimedRequest(Request):
+    # request.json and reqparse's json location both come through here
+    def get_json(self, *args, **kwargs):
+        with phase("parse"):
+            return super().get_json(*args, **kwargs)
+
+
+class RequestParser(reqparse.RequestParser):
+    def parse_args(self, *args, **kwargs):
+        with phase("parse"):
+            return super().parse_args(*args, **kwargs)
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    # jsonify() and dicts passed to make_response()
+    def dumps(self, obj, **kwargs):
+        with phase("encode"):
+            return super().dumps(obj, **kwargs)
+
+
+def output_json(data, code, headers=None):
+    # Dicts returned from flask_restful Resources
+    with phase("encode"):
+        return restful_output_json(data, code, headers)
+
+
+def _statement_started(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and "timings" in g:
+        conn.info["timing_started"] = time.perf_counter()
+
+
+def _statement_finished(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop("timing_started", None)
+    if started is not None and has_request_context() and "timings" in g:
+        g.timings["db"] += time.perf_counter() - started
+        g.statements += 1
+
+
+def init_app(app):
+    if not app.config["SERVER_TIMING"]:
+        return
+    app.request_class = TimedRequest
+    app.json = TimedJSONProvider(app)
+    app.before_request(_start)
+    app.after_request(_finish)
+    if not event.contains(Engine, "before_cursor_execute", _statement_started):
+        event.listen(Engine, "before_cursor_execute", _statement_started)
+        event.listen(Engine, "after_cursor_execute", _statement_finished)
+    logger = _logger(app)
+    if app.config["TIMING_LOG"] and logger.level == logging.NOTSET:
+        logger.setLevel(logging.INFO)
+
+
+def _logger(app):
+    return app.logger.getChild("timing")
+
+
+def _start():
+    g.timings = dict.fromkeys(PHASES, 0.0)
+    g.statements = 0
+    g.timing_started = time.perf_counter()
+
+
+def _finish(response):
+    if "timings" not in g:
+        return response
+    total = time.perf_counter() - g.timing_started
+    ms = {name: round(seconds * 1000, 2) for name, seconds in g.timings.items()}
+    ms["total"] = round(total * 1000, 2)
+    entries = [f"{name};dur={value}" for name, value in ms.items()]
+    entries[PHASES.index("db")] += f';desc="{g.statements} queries"'
+    response.headers["Server-Timing"] = ", ".join(entries)
+    if current_app.config["TIMING_LOG"]:
+        _logger(current_app).info(
+            json.dumps(
+                {
+                    "method": request.method,
+                    "path": request.path,
+                    "endpoint": request.endpoint,
+                    "status": response.status_code,
+                    "queries": g.statements,
+                    "ms": ms,
+                }
+            )
+        )
+    return response
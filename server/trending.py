@@ -0,0 +1,269 @@
+import math
+import sqlite3
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import event, select, delete, insert, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+
+from models import db, ScreeningRoom, Post, Rating, ActivityBucket, TrendingScore
+import shards
+
+# Trending movies and rooms
+#
+# Each new post or rating is counted against its room and the room's movie
+# twice. First, in an hourly bucket, which gives exact sliding-window totals.
+# Second, as an increment to an exponentially decayed score.
+#
+# The decayed score sum(w * 2^-((now - t) / H)) is stored as
+# log(sum(w * 2^((t - EPOCH) / H))). That differs from the real score only by
+# a factor every row shares. So an increment is a single-row upsert, the
+# values never overflow, and ordering by the stored column is ordering by
+# current score: the top k come straight off an index.
+
+EPOCH = datetime(2024, 1, 1)
+# Stored scores depend on these; run `flask trending rebuild` after changing
+HALF_LIFE_HOURS = 24
+WEIGHTS = {"post": 1.0, "rating": 0.5}
+WINDOW_HOURS = 7 * 24
+# prune drops scores that have decayed below this
+PRUNE_BELOW = 1e-3
+REBUILD_BATCH_SIZE = 5000
+
+
+@event.listens_for(Engine, "connect")
+def _sqlite_math_functions(dbapi_connection, connection_record):
+    # ln/exp are only built into SQLite when compiled with math functions
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    try:
+        dbapi_connection.execute("SELECT ln(1), exp(0)")
+    except sqlite3.OperationalError:
+        dbapi_connection.create_function("ln", 1, math.log, deterministic=True)
+        dbapi_connection.create_function("exp", 1, math.exp, deterministic=True)
+
+
+def _hour(at):
+    return at.replace(minute=0, second=0, microsecond=0)
+
+
+def _growth(at):
+    """log of the common factor a score has grown by between EPOCH and at."""
+    return (at - EPOCH).total_seconds() / 3600.0 * math.log(2) / HALF_LIFE_HOURS
+
+
+def _log_add_exp(a, b):
+    # log(e^a + e^b), shifted by the larger term so neither side overflows
+    greatest = func.greatest if _dialect() == "postgresql" else func.max
+    return greatest(a, b) + func.ln(1 + func.exp(-func.abs(a - b)))
+
+
+def _dialect():
+    return db.session.get_bind().dialect.name
+
+
+def _upsert():
+    return postgresql.insert if _dialect() == "postgresql" else sqlite.insert
+
+
+def _window_start(now):
+    return _hour(now) - timedelta(hours=WINDOW_HOURS - 1)
+
+
+def record(kind, screening_room_id, at=None):
+    """Count a post or rating written to screening_room_id."""
+    if screening_room_id is None:
+        return
+    at = at or datetime.utcnow()
+    movie_id = db.session.scalar(
+        select(ScreeningRoom.movie_id).where(ScreeningRoom.id == screening_room_id)
+    )
+    targets = [("room", screening_room_id)]
+    if movie_id is not None:
+        targets.append(("movie", movie_id))
+
+    buckets = ActivityBucket.__table__
+    column = "posts" if kind == "post" else "ratings"
+    stmt = _upsert()(buckets).values(
+        [
+            {"entity_type": t, "entity_id": i, "hour": _hour(at), column: 1}
+            for t, i in targets
+        ]
+    )
+    db.session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[buckets.c.entity_type, buckets.c.entity_id, buckets.c.hour],
+            set_={column: buckets.c[column] + stmt.excluded[column]},
+        )
+    )
+
+    scores = TrendingScore.__table__
+    increment = math.log(WEIGHTS[kind]) + _growth(at)
+    stmt = _upsert()(scores).values(
+        [
+            {"entity_type": t, "entity_id": i, "log_score": increment, "updated_at": at}
+            for t, i in targets
+        ]
+    )
+    db.session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[scores.c.entity_type, scores.c.entity_id],
+            set_={
+                "log_score": _log_add_exp(scores.c.log_score, stmt.excluded.log_score),
+                "updated_at": stmt.excluded.updated_at,
+            },
+        )
+    )
+
+
+def top(entity_type, limit=10, now=None):
+    """The limit highest current scores with their windowed counts."""
+    now = now or datetime.utcnow()
+    rows = db.session.execute(
+        select(TrendingScore.entity_id, TrendingScore.log_score)
+        .where(TrendingScore.entity_type == entity_type)
+        .order_by(TrendingScore.log_score.desc(), TrendingScore.entity_id)
+        .limit(limit)
+    ).all()
+    ids = [row.entity_id for row in rows]
+
+    counts = {
+        row.entity_id: (row.posts, row.ratings)
+        for row in db.session.execute(
+            select(
+                ActivityBucket.entity_id,
+                func.sum(ActivityBucket.posts).label("posts"),
+                func.sum(ActivityBucket.ratings).label("ratings"),
+            )
+            .where(
+                ActivityBucket.entity_type == entity_type,
+                ActivityBucket.entity_id.in_(ids),
+                ActivityBucket.hour >= _window_start(now),
+            )
+            .group_by(ActivityBucket.entity_id)
+        )
+    }
+
+    offset = _growth(now)
+    return [
+        {
+            "id": row.entity_id,
+            "score": math.exp(row.log_score - offset),
+            "posts": int(counts.get(row.entity_id, (0, 0))[0]),
+            "ratings": int(counts.get(row.entity_id, (0, 0))[1]),
+        }
+        for row in rows
+    ]
+
+
+def forget(entity_type, ids):
+    """Drop the buckets and score of deleted movies or rooms."""
+    ids = list(ids)
+    if not ids:
+        return
+    for model in (ActivityBucket, TrendingScore):
+        db.session.execute(
+            delete(model).where(
+                model.entity_type == entity_type, model.entity_id.in_(ids)
+            )
+        )
+
+
+def prune(now=None):
+    """Drop buckets outside the window and scores that have decayed away."""
+    now = now or datetime.utcnow()
+    buckets = db.session.execute(
+        delete(ActivityBucket).where(ActivityBucket.hour < _window_start(now))
+    ).rowcount
+    scores = db.session.execute(
+        delete(TrendingScore).where(
+            TrendingScore.log_score < _growth(now) + math.log(PRUNE_BELOW)
+        )
+    ).rowcount
+    return buckets, scores
+
+
+def rebuild(now=None):
+    """Recompute buckets and scores from post and rating timestamps."""
+    now = now or datetime.utcnow()
+    window_start = _window_start(now)
+    counts = defaultdict(lambda: [0, 0])
+    increments = defaultdict(list)
+    # Posts and ratings are on the rooms' shards; rooms are matched here
+    rooms = shards.rooms()
+
+    def tally(kind, model):
+        stmt = select(model.screening_room_id, model.timestamp).where(
+            model.timestamp.is_not(None)
+        )
+        result = db.session.execute(
+            stmt, execution_options={"yield_per": REBUILD_BATCH_SIZE}
+        )
+        for rows in result.partitions():
+            for room_id, at in rows:
+                if room_id not in rooms:
+                    continue
+                movie_id = rooms[room_id][1]
+                increment = math.log(WEIGHTS[kind]) + _growth(at)
+                for target in (("room", room_id), ("movie", movie_id)):
+                    if target[1] is None:
+                        continue
+                    increments[target].append(increment)
+                    if at >= window_start:
+                        slot = 0 if kind == "post" else 1
+                        counts[target + (_hour(at),)][slot] += 1
+
+    for kind, model in (("post", Post), ("rating", Rating)):
+        shards.scatter(lambda: tally(kind, model))
+
+    db.session.execute(delete(ActivityBucket))
+    db.session.execute(delete(TrendingScore))
+    if counts:
+        db.session.execute(
+            insert(ActivityBucket),
+            [
+                {
+                    "entity_type": entity_type,
+                    "entity_id": entity_id,
+                    "hour": hour,
+                    "posts": posts,
+                    "ratings": ratings,
+                }
+                for (entity_type, entity_id, hour), (posts, ratings) in counts.items()
+            ],
+        )
+    if increments:
+        rows = []
+        for (entity_type, entity_id), values in increments.items():
+            peak = max(values)
+            rows.append(
+                {
+                    "entity_type": entity_type,
+                    "entity_id": entity_id,
+                    "log_score": peak
+                    + math.log(sum(math.exp(v - peak) for v in values)),
+                    "updated_at": now,
+                }
+            )
+        db.session.execute(insert(TrendingScore), rows)
+    return len(increments)
+
+
+cli = AppGroup("trending", help="Maintain trending movie and room scores.")
+
+
+@cli.command("rebuild")
+def rebuild_command():
+    scored = rebuild()
+    db.session.commit()
+    click.echo(f"Scored {scored} movies and rooms")
+
+
+@cli.command("prune")
+def prune_command():
+    buckets, scores = prune()
+    db.session.commit()
+    click.echo(f"Dropped {buckets} expired buckets and {scores} faded scores")
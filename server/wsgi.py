@@ -0,0 +1,7 @@
+#!/usr/bin/env python3
+
+from config import create_app
+
+# Production entry point, served by gunicorn (see gunicorn.conf.py).
+# Migrations are run through `flask db`, so alembic stays off this path.
+app = create_app({"MIGRATIONS_ENABLED": False})